@@ -1,7 +1,65 @@
+import importlib
+from typing import TYPE_CHECKING
+
 __version__ = "0.8.2"
 
-__all__ = ["login", "login_with_password", "Session", "DataGrid", "Cube"]
+__all__ = [
+    "login",
+    "login_with_password",
+    "Session",
+    "AsyncSession",
+    "DataGrid",
+    "Cube",
+]
+
+# The public names are imported from their submodules on first use,
+# so that ``import apteco`` doesn't load the API client, pandas or numpy.
+_LAZY_ATTRS = {
+    "login": "session",
+    "login_with_password": "session",
+    "Session": "session",
+    "AsyncSession": "async_session",
+    "DataGrid": "datagrid",
+    "Cube": "cube",
+}
+
+# Submodules are also imported on first use, e.g. ``apteco.session``
+# after just ``import apteco``.
+_SUBMODULES = {
+    "async_session",
+    "cache",
+    "common",
+    "connection",
+    "cube",
+    "datagrid",
+    "deferred",
+    "exceptions",
+    "query",
+    "session",
+    "statistics",
+    "tables",
+    "variables",
+}
+
+if TYPE_CHECKING:
+    from .async_session import AsyncSession
+    from .cube import Cube
+    from .datagrid import DataGrid
+    from .session import Session, login, login_with_password
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        # importing a submodule also adds it to this module's globals
+        return importlib.import_module(f".{name}", __name__)
+    try:
+        module_name = _LAZY_ATTRS[name]
+    except KeyError:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'") from None
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
 
-from .session import login, login_with_password, Session
-from .datagrid import DataGrid
-from .cube import Cube
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS) | _SUBMODULES)
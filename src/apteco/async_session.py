@@ -0,0 +1,215 @@
+"""Asynchronous API requests for counts, data grids and cubes.
+
+An :class:`AsyncSession` wraps a :class:`Session`, using its credentials,
+tables and variables, but sends its requests with aiohttp
+so they don't block the event loop.
+aiohttp is an optional dependency, only imported when a request is made.
+
+"""
+
+import json
+import ssl
+from urllib.parse import quote
+
+import certifi
+
+from apteco.cache import deserialize_json
+from apteco.common import aa
+from apteco.cube import Cube
+from apteco.datagrid import DataGrid
+
+ASYNC_CONNECTION_LIMIT = 100
+
+
+class AsyncSession:
+    """Session for making API requests with asyncio.
+
+    The HTTP connections are separate from those of the wrapped session,
+    with their own limits.
+    They are opened on the first request, which must be made
+    from a running event loop, and all requests must use the same loop.
+
+    Attributes:
+        session (Session): session whose credentials and system metadata are used
+        limit (int): maximum number of connections open at once
+        limit_per_host (int): maximum number of connections open at once
+            to the API server, or 0 for no limit other than ``limit``
+        timeout (float or tuple): timeout for each request in seconds,
+            either a single number, or a ``(connect, read)`` tuple,
+            or ``None`` for no timeout
+
+    """
+
+    def __init__(
+        self,
+        session: "Session",
+        *,
+        limit: int = ASYNC_CONNECTION_LIMIT,
+        limit_per_host: int = 0,
+        timeout=None,
+    ):
+        """
+
+        Args:
+            session (Session): session to make requests for
+            limit (int): maximum number of connections open at once
+                (default is 100)
+            limit_per_host (int): maximum number of connections open at once
+                to the API server (default is 0, for no limit other than ``limit``)
+            timeout (float or tuple): timeout for each request in seconds,
+                either a single number or a ``(connect, read)`` tuple
+                (default is ``None``, for no timeout)
+
+        """
+        from apteco.connection import validate_connection_options
+
+        for name, value, minimum in [
+            ("limit", limit, 1),
+            ("limit_per_host", limit_per_host, 0),
+        ]:
+            if not isinstance(value, int) or isinstance(value, bool) or value < minimum:
+                raise ValueError(f"{name} must be an integer of at least {minimum}")
+        self.session = session
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = validate_connection_options(timeout=timeout).timeout
+        self._client_session = None
+
+    async def count(self, clause) -> int:
+        """Return the number of records in the selection.
+
+        Args:
+            clause: clause (or table) to count
+
+        Returns:
+            int: number of records in the selection
+
+        """
+        return await clause.count_async(self)
+
+    async def datagrid(
+        self, columns, selection=None, table=None, max_rows=1000, *, export_codes=False
+    ):
+        """Create a data grid, fetching its data asynchronously.
+
+        Takes the same arguments as :class:`DataGrid`,
+        except that sharding isn't supported.
+
+        Returns:
+            DataGrid: data grid with its data
+
+        """
+        return await DataGrid.fetch_async(
+            columns, selection, table, max_rows, session=self, export_codes=export_codes
+        )
+
+    async def cube(
+        self, dimensions, measures=None, selection=None, table=None, *, sparse=False
+    ):
+        """Create a cube, fetching its data asynchronously.
+
+        Takes the same arguments as :class:`Cube`.
+
+        Returns:
+            Cube: cube with its data
+
+        """
+        return await Cube.fetch_async(
+            dimensions, measures, selection, table, session=self, sparse=sparse
+        )
+
+    async def close(self):
+        """Close the HTTP connections opened by this session."""
+        if self._client_session is not None:
+            await self._client_session.close()
+            self._client_session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _post(self, controller: str, endpoint: str, body, response_type: str):
+        """Send a request to the API and return its deserialized response.
+
+        Args:
+            controller (str): part of the URL path naming the API controller,
+                e.g. ``"Queries"``
+            endpoint (str): final part of the URL path, e.g. ``"CountSync"``
+            body: apteco-api model object to send as the request body
+            response_type (str): name of the apteco-api model class
+                for the response, e.g. ``"QueryResult"``
+
+        Returns:
+            apteco-api model object of type ``response_type``
+
+        Raises:
+            aa.ApiException: if the API returns an error response
+
+        """
+        api_client = self.session.api_client
+        url = (
+            f"{self.session.base_url}/{quote(self.session.data_view, safe='')}"
+            f"/{controller}/{quote(self.session.system, safe='')}/{endpoint}"
+        )
+        headers = {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.session.access_token}",
+            "User-Agent": api_client.user_agent,
+        }
+        data = json.dumps(api_client.sanitize_for_serialization(body))
+        client_session = self._get_client_session()
+        async with client_session.post(url, data=data, headers=headers) as response:
+            text = await response.text()
+            if not 200 <= response.status <= 299:
+                exc = aa.ApiException(status=response.status, reason=response.reason)
+                exc.body = text
+                raise exc
+        return deserialize_json(api_client, text, response_type)
+
+    def _get_client_session(self):
+        """Return the aiohttp session, creating it on first use."""
+        if self._client_session is None:
+            try:
+                import aiohttp
+            except ImportError as exc:
+                raise ImportError(
+                    "aiohttp is required to make asynchronous requests:"
+                    " install it with `pip install aiohttp`"
+                ) from exc
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ssl=self._create_ssl_context(),
+            )
+            self._client_session = aiohttp.ClientSession(
+                connector=connector, timeout=self._create_client_timeout(aiohttp)
+            )
+        return self._client_session
+
+    def _create_ssl_context(self):
+        """Create an SSL context matching the wrapped session's configuration.
+
+        Returns ``False`` if SSL certificates aren't being verified.
+
+        """
+        configuration = self.session.api_client.configuration
+        if not configuration.verify_ssl:
+            return False
+        ssl_context = ssl.create_default_context(
+            cafile=configuration.ssl_ca_cert or certifi.where()
+        )
+        if configuration.cert_file:
+            ssl_context.load_cert_chain(configuration.cert_file, configuration.key_file)
+        return ssl_context
+
+    def _create_client_timeout(self, aiohttp):
+        """Convert the timeout setting into an aiohttp timeout."""
+        if self.timeout is None:
+            return aiohttp.ClientTimeout(total=None)
+        if isinstance(self.timeout, tuple):
+            connect, read = self.timeout
+            return aiohttp.ClientTimeout(total=None, connect=connect, sock_read=read)
+        return aiohttp.ClientTimeout(total=self.timeout)
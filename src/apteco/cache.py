@@ -0,0 +1,676 @@
+"""Caches used by py-apteco sessions to avoid repeating API requests."""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Any, Iterable, List, Optional
+
+from apteco.common import aa
+from apteco.exceptions import ApiResultsError
+
+METADATA_CACHE_VERSION = 1
+
+COUNT_CACHE_MAXSIZE = 1024
+COUNT_CACHE_TTL = 300
+VAR_CODE_CACHE_MAX_CODES = 1_000_000
+VAR_CODES_PER_PAGE = 1000
+BUILD_DATE_CHECK_INTERVAL = 60
+
+CachedMetadata = namedtuple("CachedMetadata", ["raw_tables", "raw_variables"])
+CacheStats = namedtuple(
+    "CacheStats", ["hits", "misses", "evictions", "expirations", "size", "maxsize"]
+)
+
+
+class _JSONData:
+    """Stand-in for an API response so stored data can go through the client."""
+
+    def __init__(self, data: str):
+        self.data = data
+
+
+def serialize_models(api_client: "aa.ApiClient", models: List) -> List[dict]:
+    """Convert apteco-api model objects into JSON-compatible data.
+
+    The data has the same shape as it does in API responses,
+    so it can be turned back into models with :func:`deserialize_models`.
+
+    """
+    return api_client.sanitize_for_serialization(models)
+
+
+def deserialize_models(api_client: "aa.ApiClient", data: List[dict], model_name: str):
+    """Convert JSON-compatible data back into apteco-api model objects.
+
+    Args:
+        api_client (aa.ApiClient): client to handle deserialization
+        data (List[dict]): data as returned by :func:`serialize_models`
+        model_name (str): name of the apteco-api model class, e.g. ``"Variable"``
+
+    Returns:
+        list: apteco-api model objects
+
+    """
+    return api_client.deserialize(_JSONData(json.dumps(data)), f"list[{model_name}]")
+
+
+def deserialize_json(api_client: "aa.ApiClient", text: str, model_name: str):
+    """Convert JSON text from an API response into an apteco-api model object.
+
+    Args:
+        api_client (aa.ApiClient): client to handle deserialization
+        text (str): JSON text of the response body
+        model_name (str): name of the apteco-api model class,
+            e.g. ``"QueryResult"``
+
+    Returns:
+        apteco-api model object
+
+    """
+    return api_client.deserialize(_JSONData(text), model_name)
+
+
+class MetadataCache:
+    """On-disk store of FastStats system metadata.
+
+    Holds the raw tables and variables data for a system,
+    so that a new session can be created without downloading it again.
+    Entries are keyed by API base URL, DataView and system name,
+    and are only used if the system build date still matches
+    the one recorded when the entry was saved.
+
+    Attributes:
+        directory (Path): directory where the cache files are stored
+
+    """
+
+    def __init__(self, directory):
+        """
+
+        Args:
+            directory (str or PathLike): directory to store the cache files in
+                (created if it doesn't already exist)
+
+        """
+        self.directory = Path(directory).expanduser()
+
+    def load(self, session: "Session") -> Optional[CachedMetadata]:
+        """Load metadata for the session's system, if it is present and current.
+
+        Args:
+            session (Session): API session to load metadata for
+
+        Returns:
+            CachedMetadata: raw tables and variables for the system,
+            or ``None`` if there was no usable entry in the cache
+
+        """
+        path = self._path(session)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, JSONDecodeError) as exc:
+            logging.warning(f"Could not read metadata cache file '{path}': {exc}")
+            return None
+        if (
+            entry.get("version") != METADATA_CACHE_VERSION
+            or entry.get("key") != self._key(session)
+            or entry.get("build_date") != self._build_date(session)
+        ):
+            return None
+        try:
+            return CachedMetadata(
+                deserialize_models(session.api_client, entry["tables"], "Table"),
+                deserialize_models(session.api_client, entry["variables"], "Variable"),
+            )
+        except (KeyError, TypeError, ValueError) as exc:
+            logging.warning(f"Could not load metadata cache file '{path}': {exc}")
+            return None
+
+    def save(
+        self,
+        session: "Session",
+        raw_tables: List["aa.Table"],
+        raw_variables: List["aa.Variable"],
+    ):
+        """Save metadata for the session's system, replacing any existing entry.
+
+        Args:
+            session (Session): API session the metadata belongs to
+            raw_tables (List[aa.Table]): raw tables data from the API
+            raw_variables (List[aa.Variable]): raw variables data from the API
+
+        """
+        entry = {
+            "version": METADATA_CACHE_VERSION,
+            "key": self._key(session),
+            "build_date": self._build_date(session),
+            "tables": serialize_models(session.api_client, raw_tables),
+            "variables": serialize_models(session.api_client, raw_variables),
+        }
+        path = self._path(session)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(entry, f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as exc:
+            logging.warning(f"Could not write metadata cache file '{path}': {exc}")
+
+    @staticmethod
+    def _key(session: "Session") -> List[str]:
+        """Return the values identifying the session's system."""
+        return [session.base_url, session.data_view, session.system]
+
+    @staticmethod
+    def _build_date(session: "Session") -> str:
+        """Return the build date of the session's system as a string."""
+        return session.system_info.build_date.isoformat()
+
+    def _path(self, session: "Session") -> Path:
+        """Return the path of the cache file for the session's system."""
+        digest = hashlib.sha256("\n".join(self._key(session)).encode()).hexdigest()
+        return self.directory / f"metadata-{digest[:32]}.json"
+
+
+def fingerprint_models(api_client: "aa.ApiClient", *models) -> str:
+    """Return a fingerprint identifying the content of apteco-api model objects.
+
+    Models with the same attribute values always give the same fingerprint,
+    regardless of the order their attributes were set in.
+
+    Args:
+        api_client (aa.ApiClient): client to handle serialization
+        *models: apteco-api model objects (or other JSON-compatible data)
+
+    Returns:
+        str: hexadecimal SHA-256 digest of the canonical JSON for the models
+
+    """
+    canonical = json.dumps(
+        serialize_models(api_client, list(models)),
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def fetch_build_date(session: "Session") -> datetime:
+    """Fetch the current build date of the session's FastStats system.
+
+    Unlike :meth:`Session._fetch_system_info`,
+    this doesn't update the system info stored on the session.
+
+    Args:
+        session (Session): API session to fetch the build date with
+
+    Returns:
+        datetime: date and time the FastStats system was last built
+
+    """
+    systems_controller = aa.FastStatsSystemsApi(session.api_client)
+    result = systems_controller.fast_stats_systems_get_fast_stats_system(
+        session.data_view, session.system
+    )  # type: aa.FastStatsSystemDetail
+    return result.fast_stats_build_date
+
+
+class _SystemCache:
+    """Base class for in-memory caches of data from a FastStats system.
+
+    Entries are held in least-recently-used order.
+    Every so often the FastStats system build date is checked,
+    and the whole cache is cleared if it has changed.
+
+    """
+
+    _description = "cache"
+
+    def __init__(self, build_date_check_interval: float):
+        if not build_date_check_interval >= 0:
+            raise ValueError("build_date_check_interval must be a non-negative number")
+        self.build_date_check_interval = build_date_check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._build_date = None
+        self._build_date_checked_at = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def clear(self):
+        """Remove all entries from the cache (the statistics are kept)."""
+        with self._lock:
+            self._clear_entries()
+
+    def _clear_entries(self):
+        self._entries.clear()
+
+    def _check_build_date(self, session: "Session"):
+        """Clear the cache if the system has been rebuilt.
+
+        The build date is only fetched from the API again
+        if it hasn't been checked within the check interval.
+        The request is made without holding the lock,
+        so lookups from other threads aren't blocked while it is waiting.
+
+        """
+        with self._lock:
+            now = time.monotonic()
+            checked_at = self._build_date_checked_at
+            if (
+                checked_at is not None
+                and now - checked_at < self.build_date_check_interval
+            ):
+                return
+            self._build_date_checked_at = now
+        if checked_at is None:
+            build_date = session.system_info.build_date
+        else:
+            build_date = fetch_build_date(session)
+        with self._lock:
+            if build_date != self._build_date:
+                if self._build_date is not None:
+                    logging.info(
+                        f"FastStats system build date changed from {self._build_date}"
+                        f" to {build_date}, clearing {self._description}."
+                    )
+                self._clear_entries()
+                self._build_date = build_date
+
+
+class CountCache(_SystemCache):
+    """In-memory store of selection count results.
+
+    Entries are keyed by a fingerprint of the query sent to the API,
+    together with the API base URL, DataView and system name.
+    The least recently used entry is evicted once the cache is full,
+    and entries expire once they are older than the time-to-live.
+    Every so often the FastStats system build date is checked,
+    and the whole cache is cleared if it has changed.
+
+    A cache should only be shared between sessions
+    connected to the same FastStats system.
+    It is safe to use from several threads at once.
+
+    Attributes:
+        maxsize (int): maximum number of entries to hold
+        ttl (float): number of seconds entries are kept for,
+            or ``None`` to keep them until evicted
+        build_date_check_interval (float): minimum number of seconds
+            between checks of the system build date
+
+    """
+
+    _description = "count cache"
+
+    def __init__(
+        self,
+        maxsize: int = COUNT_CACHE_MAXSIZE,
+        ttl: Optional[float] = COUNT_CACHE_TTL,
+        build_date_check_interval: float = BUILD_DATE_CHECK_INTERVAL,
+    ):
+        """
+
+        Args:
+            maxsize (int): maximum number of entries to hold
+                (default is 1024)
+            ttl (float): number of seconds entries are kept for,
+                or ``None`` to keep them until evicted (default is 300)
+            build_date_check_interval (float): minimum number of seconds
+                between checks of the system build date (default is 60)
+
+        """
+        if not isinstance(maxsize, int) or isinstance(maxsize, bool) or maxsize < 1:
+            raise ValueError("maxsize must be an integer greater than 0")
+        if ttl is not None and not ttl > 0:
+            raise ValueError("ttl must be a number greater than 0, or None")
+        super().__init__(build_date_check_interval)
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+    def key(self, session: "Session", query: "aa.Query") -> tuple:
+        """Return the cache key for a query on the session's system.
+
+        Args:
+            session (Session): API session the query is for
+            query (aa.Query): query to be counted
+
+        Returns:
+            tuple: key identifying the system and the query
+
+        """
+        return (
+            session.base_url,
+            session.data_view,
+            session.system,
+            fingerprint_models(session.api_client, query),
+        )
+
+    def get(self, key: tuple, session: "Session") -> Optional[Any]:
+        """Return the cached result for a key, or ``None`` if there isn't one.
+
+        Args:
+            key (tuple): key returned by :meth:`key`
+            session (Session): API session the query is for,
+                used to check the system build date
+
+        Returns:
+            result stored for the key, or ``None`` if it isn't cached
+            or has expired
+
+        """
+        self._check_build_date(session)
+        with self._lock:
+            try:
+                stored_at, result = self._entries[key]
+            except KeyError:
+                self._misses += 1
+                return None
+            if self.ttl is not None and time.monotonic() - stored_at >= self.ttl:
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return result
+
+    def put(self, key: tuple, result: Any, session: "Session"):
+        """Store a result in the cache, evicting the oldest entry if full.
+
+        Args:
+            key (tuple): key returned by :meth:`key`
+            result: result to store for the key
+            session (Session): API session the query is for,
+                used to check the system build date
+
+        """
+        self._check_build_date(session)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    @property
+    def stats(self) -> CacheStats:
+        """Hit and miss statistics and current size of the cache."""
+        with self._lock:
+            return CacheStats(
+                self._hits,
+                self._misses,
+                self._evictions,
+                self._expirations,
+                len(self._entries),
+                self.maxsize,
+            )
+
+
+class SelectorValues(Mapping):
+    """Codes and descriptions of the categories of a selector variable.
+
+    This is a read-only mapping from each code to its description,
+    in the order the categories are returned by the API.
+
+    """
+
+    __slots__ = ("_by_code", "_by_desc", "_counts")
+
+    def __init__(self, var_codes: Iterable["aa.VarCode"]):
+        """
+
+        Args:
+            var_codes (Iterable[aa.VarCode]): categories from the API
+
+        """
+        self._by_code = {}
+        self._by_desc = {}
+        self._counts = {}
+        for var_code in var_codes:
+            self._by_code[var_code.code] = var_code.description
+            self._by_desc[var_code.description] = var_code.code
+            self._counts[var_code.code] = var_code.count
+
+    def __getitem__(self, code: str) -> str:
+        return self._by_code[code]
+
+    def __iter__(self):
+        return iter(self._by_code)
+
+    def __len__(self):
+        return len(self._by_code)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._by_code!r})"
+
+    @property
+    def codes(self) -> List[str]:
+        """Codes of the categories."""
+        return list(self._by_code)
+
+    @property
+    def descriptions(self) -> List[str]:
+        """Descriptions of the categories."""
+        return list(self._by_code.values())
+
+    def code_for(self, description: str) -> str:
+        """Return the code of the category with the given description.
+
+        Raises:
+            KeyError: if no category has this description
+
+        """
+        return self._by_desc[description]
+
+    def has_description(self, description: str) -> bool:
+        """Return whether a category has the given description."""
+        return description in self._by_desc
+
+    def count_for(self, code: str) -> Optional[int]:
+        """Return the number of records in the category with the given code.
+
+        This is the count across the whole system when it was built,
+        or ``None`` if the API didn't give one.
+
+        Raises:
+            KeyError: if no category has this code
+
+        """
+        return self._counts[code]
+
+
+def fetch_selector_values(
+    session: "Session", variable_name: str, per_page: int = VAR_CODES_PER_PAGE
+) -> SelectorValues:
+    """Fetch the categories of a selector variable from the API.
+
+    The first page is fetched on its own to find the total number of categories,
+    then the remaining pages are fetched concurrently and reassembled in order.
+
+    Args:
+        session (Session): API session to fetch the categories with
+        variable_name (str): name of the selector variable
+        per_page (int): number of categories to request in each page
+
+    Returns:
+        SelectorValues: codes and descriptions of the variable's categories
+
+    Raises:
+        ApiResultsError: if the number of categories returned
+            doesn't match the total given by the API
+
+    """
+    systems_controller = aa.FastStatsSystemsApi(session.api_client)
+
+    def get_page(offset):
+        return systems_controller.fast_stats_systems_get_fast_stats_variable_codes(
+            session.data_view,
+            session.system,
+            variable_name,
+            offset=offset,
+            count=per_page,
+        )  # type: aa.PagedResultsVarCode
+
+    first_page = get_page(0)
+    page_size = first_page.count  # API may return fewer than requested
+    if page_size > 0:
+        offsets = range(
+            first_page.offset + page_size, first_page.total_count, page_size
+        )
+    else:
+        offsets = range(0)
+    with ThreadPoolExecutor(max_workers=session.max_workers) as executor:
+        other_pages = list(executor.map(get_page, offsets))
+    var_codes = [c for page in [first_page] + other_pages for c in page.list]
+    if len(var_codes) != first_page.total_count:
+        raise ApiResultsError(
+            f"API stated there are {first_page.total_count} categories"
+            f" for the variable '{variable_name}' but {len(var_codes)} were returned."
+        )
+    return SelectorValues(var_codes)
+
+
+def get_selector_values(session: "Session", variable_name: str) -> SelectorValues:
+    """Return the categories of a selector variable.
+
+    The session's var code cache is used if it has one,
+    otherwise the categories are fetched from the API.
+
+    Args:
+        session (Session): API session for the variable's system
+        variable_name (str): name of the selector variable
+
+    Returns:
+        SelectorValues: codes and descriptions of the variable's categories
+
+    """
+    var_code_cache = getattr(session, "var_code_cache", None)
+    if var_code_cache is None:
+        return fetch_selector_values(session, variable_name)
+    return var_code_cache.get(session, variable_name)
+
+
+class VarCodeCache(_SystemCache):
+    """In-memory store of the categories of selector variables.
+
+    The categories for a variable are fetched from the API
+    the first time they are needed, and kept for later use.
+    The cache is limited by the total number of categories it holds:
+    the least recently used variables are evicted to stay within this.
+    Every so often the FastStats system build date is checked,
+    and the whole cache is cleared if it has changed.
+
+    A cache should only be shared between sessions
+    connected to the same FastStats system.
+    It is safe to use from several threads at once.
+
+    Attributes:
+        max_codes (int): maximum total number of categories to hold
+        build_date_check_interval (float): minimum number of seconds
+            between checks of the system build date
+
+    """
+
+    _description = "var code cache"
+
+    def __init__(
+        self,
+        max_codes: int = VAR_CODE_CACHE_MAX_CODES,
+        build_date_check_interval: float = BUILD_DATE_CHECK_INTERVAL,
+    ):
+        """
+
+        Args:
+            max_codes (int): maximum total number of categories to hold
+                (default is 1,000,000); variables with more categories
+                than this are never cached
+            build_date_check_interval (float): minimum number of seconds
+                between checks of the system build date (default is 60)
+
+        """
+        if (
+            not isinstance(max_codes, int)
+            or isinstance(max_codes, bool)
+            or max_codes < 1
+        ):
+            raise ValueError("max_codes must be an integer greater than 0")
+        super().__init__(build_date_check_interval)
+        self.max_codes = max_codes
+        self._size = 0
+
+    def get(self, session: "Session", variable_name: str) -> SelectorValues:
+        """Return the categories of a selector variable.
+
+        Args:
+            session (Session): API session to fetch the categories with
+                if they aren't already cached
+            variable_name (str): name of the selector variable
+
+        Returns:
+            SelectorValues: codes and descriptions of the variable's categories
+
+        """
+        key = (session.base_url, session.data_view, session.system, variable_name)
+        self._check_build_date(session)
+        with self._lock:
+            values = self._entries.get(key)
+            if values is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return values
+            self._misses += 1
+        # fetch outside the lock so other variables can be looked up meanwhile
+        values = fetch_selector_values(session, variable_name)
+        if len(values) <= self.max_codes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = values
+                    self._size += len(values)
+                while self._size > self.max_codes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+                    self._evictions += 1
+        return values
+
+    @property
+    def stats(self) -> CacheStats:
+        """Hit and miss statistics and current size of the cache.
+
+        The size is the total number of categories held.
+
+        """
+        with self._lock:
+            return CacheStats(
+                self._hits,
+                self._misses,
+                self._evictions,
+                self._expirations,
+                self._size,
+                self.max_codes,
+            )
+
+    def _clear_entries(self):
+        self._entries.clear()
+        self._size = 0
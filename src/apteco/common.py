@@ -1,5 +1,63 @@
+import importlib.util
+import sys
+import threading
+import types
 from enum import Enum
 
+_lazy_load_lock = threading.RLock()
+
+
+def lazy_import(name):
+    """Import a module, deferring loading it until one of its attributes is used.
+
+    The module is added to ``sys.modules`` as normal,
+    so it isn't loaded a second time if it is imported elsewhere.
+    If it has already been imported, it is returned unchanged.
+
+    The module is loaded while holding a lock,
+    so it can be first used from several threads at once
+    (``importlib.util.LazyLoader`` isn't thread-safe before Python 3.12).
+
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    module.__class__ = _LazyModule
+    return module
+
+
+class _LazyModule(types.ModuleType):
+    """Module which is loaded the first time one of its attributes is used."""
+
+    def __getattribute__(self, attr):
+        with _lazy_load_lock:
+            # another thread may have loaded it while this one was waiting
+            if type(self) is _LazyModule:
+                self.__class__ = _LoadingModule
+                try:
+                    self.__spec__.loader.exec_module(self)
+                finally:
+                    self.__class__ = types.ModuleType
+        return getattr(self, attr)
+
+
+class _LoadingModule(types.ModuleType):
+    """Module which is being loaded by the thread holding the lock."""
+
+    def __getattribute__(self, attr):
+        # wait for the module to finish loading, unless this thread is loading it
+        with _lazy_load_lock:
+            return types.ModuleType.__getattribute__(self, attr)
+
+
+# apteco_api imports every API class and model when it is loaded,
+# so defer this until it is first used (e.g. when logging in).
+# Modules in this package use this rather than ``import apteco_api as aa``,
+# since an import statement would trigger the loading straight away.
+aa = lazy_import("apteco_api")
+
 
 class VariableType(str, Enum):
     SELECTOR = "Selector"
@@ -0,0 +1,209 @@
+"""HTTP connection settings for the API clients used by sessions.
+
+The apteco-api client sends its requests through a urllib3 pool manager
+(or a proxy manager, if the client is configured to use a proxy).
+The functions here replace that pool manager with one built from
+:class:`ConnectionOptions`, so the pool size, keep-alive behaviour,
+request timeouts and TLS context can be tuned.
+The client's own pool manager is kept when the default settings are used.
+
+"""
+
+import ssl
+from collections import namedtuple
+from numbers import Real
+from typing import Optional
+
+import certifi
+import urllib3
+from urllib3.util.ssl_ import create_urllib3_context
+
+from apteco.common import aa
+
+NUM_POOLS = 4
+DEFAULT_POOL_MAXSIZE = 4
+
+ConnectionOptions = namedtuple(
+    "ConnectionOptions",
+    ["pool_maxsize", "keep_alive", "timeout", "reuse_tls_context"],
+    defaults=[None, True, None, True],
+)
+ConnectionOptions.__doc__ = """Settings for the HTTP connections to the API.
+
+Attributes:
+    pool_maxsize (int): maximum number of connections to keep open
+        to the API server, or ``None`` to use the apteco-api default
+    keep_alive (bool): whether to keep connections open between requests
+        so they can be reused
+    timeout (float or tuple): timeout for each request in seconds,
+        either a single number, or a ``(connect, read)`` tuple;
+        ``None`` means requests never time out
+    reuse_tls_context (bool): whether all connections share one TLS context,
+        so certificates are loaded once rather than for every new connection
+
+"""
+
+
+def validate_connection_options(
+    pool_maxsize=None, keep_alive=True, timeout=None, reuse_tls_context=True
+) -> ConnectionOptions:
+    """Check connection settings and return them as ``ConnectionOptions``.
+
+    Raises:
+        ValueError: if any of the settings is invalid
+
+    """
+    if pool_maxsize is not None and (
+        not isinstance(pool_maxsize, int)
+        or isinstance(pool_maxsize, bool)
+        or pool_maxsize < 1
+    ):
+        raise ValueError("pool_maxsize must be an integer greater than 0")
+    for name, value in [
+        ("keep_alive", keep_alive),
+        ("reuse_tls_context", reuse_tls_context),
+    ]:
+        if not isinstance(value, bool):
+            raise ValueError(f"{name} must be True or False")
+    if timeout is not None:
+        parts = timeout if isinstance(timeout, tuple) else (timeout,)
+        if (
+            len(parts) != (2 if isinstance(timeout, tuple) else 1)
+            or not all(_is_valid_timeout(part) for part in parts)
+            or all(part is None for part in parts)
+        ):
+            raise ValueError(
+                "timeout must be a number greater than 0"
+                " or a (connect, read) tuple of these"
+            )
+    return ConnectionOptions(pool_maxsize, keep_alive, timeout, reuse_tls_context)
+
+
+def _is_valid_timeout(value) -> bool:
+    """Return whether value is usable as a connect or read timeout."""
+    if value is None:
+        return True
+    return isinstance(value, Real) and not isinstance(value, bool) and value > 0
+
+
+class DefaultTimeoutMixin:
+    """Mixin for urllib3 pool managers to apply a default timeout to requests.
+
+    The apteco-api REST client always passes a timeout to urllib3,
+    using ``None`` when no timeout was given for the request,
+    which would override a timeout set on the pool itself.
+
+    Attributes:
+        default_timeout (urllib3.Timeout): timeout used for requests
+            made without one, or ``None`` for no timeout
+
+    """
+
+    def __init__(self, *args, default_timeout=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_timeout = default_timeout
+
+    def urlopen(self, method, url, redirect=True, **kw):
+        if kw.get("timeout") is None and self.default_timeout is not None:
+            kw["timeout"] = self.default_timeout
+        return super().urlopen(method, url, redirect=redirect, **kw)
+
+
+class SessionPoolManager(DefaultTimeoutMixin, urllib3.PoolManager):
+    """Pool manager which applies a default timeout to requests."""
+
+
+class SessionProxyManager(DefaultTimeoutMixin, urllib3.ProxyManager):
+    """Proxy manager which applies a default timeout to requests."""
+
+
+def create_pool_manager(
+    configuration: "aa.Configuration", options: ConnectionOptions
+) -> SessionPoolManager:
+    """Create a pool manager for an API client.
+
+    Args:
+        configuration (aa.Configuration): configuration of the API client,
+            for its SSL certificate, proxy and retry settings
+        options (ConnectionOptions): connection settings to apply
+
+    Returns:
+        SessionPoolManager: pool manager to send the client's requests,
+            or a ``SessionProxyManager`` if the client uses a proxy
+
+    """
+    cert_reqs = ssl.CERT_REQUIRED if configuration.verify_ssl else ssl.CERT_NONE
+    ca_certs = configuration.ssl_ca_cert or certifi.where()
+    pool_args = {"cert_reqs": cert_reqs}
+    if options.reuse_tls_context:
+        ssl_context = create_urllib3_context(cert_reqs=cert_reqs)
+        if configuration.verify_ssl:
+            ssl_context.load_verify_locations(cafile=ca_certs)
+        if configuration.cert_file:
+            ssl_context.load_cert_chain(configuration.cert_file, configuration.key_file)
+        pool_args["ssl_context"] = ssl_context
+    else:
+        pool_args["ca_certs"] = ca_certs
+        pool_args["cert_file"] = configuration.cert_file
+        pool_args["key_file"] = configuration.key_file
+    if configuration.assert_hostname is not None:
+        pool_args["assert_hostname"] = configuration.assert_hostname
+    if configuration.retries is not None:
+        pool_args["retries"] = configuration.retries
+    if options.pool_maxsize is not None:
+        maxsize = options.pool_maxsize
+    else:
+        maxsize = configuration.connection_pool_maxsize or DEFAULT_POOL_MAXSIZE
+    if configuration.proxy:
+        return SessionProxyManager(
+            proxy_url=configuration.proxy,
+            proxy_headers=configuration.proxy_headers,
+            num_pools=NUM_POOLS,
+            maxsize=maxsize,
+            default_timeout=_to_urllib3_timeout(options.timeout),
+            **pool_args,
+        )
+    return SessionPoolManager(
+        num_pools=NUM_POOLS,
+        maxsize=maxsize,
+        default_timeout=_to_urllib3_timeout(options.timeout),
+        **pool_args,
+    )
+
+
+def _to_urllib3_timeout(timeout) -> Optional[urllib3.Timeout]:
+    """Convert a timeout from ``ConnectionOptions`` into a urllib3 timeout."""
+    if timeout is None:
+        return None
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return urllib3.Timeout(connect=connect, read=read)
+    return urllib3.Timeout(total=timeout)
+
+
+def configure_api_client(api_client: "aa.ApiClient", options: ConnectionOptions):
+    """Apply connection settings to an API client.
+
+    The client's own pool manager is only replaced
+    if any of the settings differ from the defaults.
+
+    Args:
+        api_client (aa.ApiClient): API client to configure
+        options (ConnectionOptions): connection settings to apply
+
+    """
+    if options == ConnectionOptions():
+        return
+    old_pool_manager = api_client.rest_client.pool_manager
+    api_client.rest_client.pool_manager = create_pool_manager(
+        api_client.configuration, options
+    )
+    old_pool_manager.clear()
+    if not options.keep_alive:
+        api_client.set_default_header("Connection", "close")
+
+
+def close_api_client(api_client: "aa.ApiClient"):
+    """Close the connections and thread pool held by an API client."""
+    api_client.rest_client.pool_manager.clear()
+    api_client.close()
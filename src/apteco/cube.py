@@ -1,23 +1,282 @@
 import itertools
 
-import apteco_api as aa
-import numpy as np
-import pandas as pd
+# numpy and pandas are imported in the methods that use them,
+# to keep `import apteco` fast
+from apteco.common import VariableType, aa
+from apteco.deferred import DeferredResult
+from apteco.exceptions import ApiResultsError
 
-from apteco.common import VariableType
 
+def _parse_measure(rows: list) -> "np.ndarray":
+    """Parse the tab-delimited rows of a measure result into a float64 array.
+
+    The rows are joined and split into cells in one go,
+    and the cells are converted directly to floats.
+    If any cell isn't a number, the cells are converted with ``pd.to_numeric()``
+    instead, which turns those cells into ``NaN``.
+
+    Args:
+        rows (list): tab-delimited rows of cell values, as strings
+
+    Returns:
+        np.ndarray: one-dimensional float64 array of the cell values
+
+    """
+    import numpy as np
+    import pandas as pd
+
+    cells = "\t".join(rows).split("\t")
+    try:
+        return np.array(cells, dtype=np.float64)
+    except ValueError:
+        return pd.to_numeric(np.array(cells, dtype=object), errors="coerce").astype(
+            np.float64
+        )
+
+
+# number of cells to parse at once when building a sparse cube,
+# so the full cube never has to be held as a dense array
+SPARSE_BATCH_CELLS = 2**20
+
+
+class SparseCubeData:
+    """Non-empty cells of a cube, stored as coordinates and values (COO format).
+
+    A cell is empty if its value is 0 for every measure.
+    The cells are in the same order as in the flattened dense cube.
+
+    Attributes:
+        shape (tuple): size of each dimension of the cube
+        coords (np.ndarray): 2-dimensional array of integer coordinates,
+            with one row for each dimension and one column for each cell
+        values (list): float64 array of the cell values for each measure
+
+    """
+
+    __slots__ = ("shape", "coords", "values")
+
+    def __init__(self, shape: tuple, coords: "np.ndarray", values: list):
+        self.shape = shape
+        self.coords = coords
+        self.values = values
+
+    @classmethod
+    def from_flat(cls, shape: tuple, indices: list, values: list):
+        """Create sparse data from the non-empty cells of each measure.
+
+        Args:
+            shape (tuple): size of each dimension of the cube
+            indices (list): sorted int array of the flat indices
+                of the non-empty cells for each measure
+            values (list): float64 array of the values of those cells
+                for each measure
+
+        Returns:
+            SparseCubeData: sparse data with the cells that are non-empty
+                for any measure
+
+        """
+        import numpy as np
+
+        if len(indices) == 1:
+            flat = indices[0]
+        else:
+            flat = np.unique(np.concatenate(indices))
+        all_values = []
+        for measure_indices, measure_values in zip(indices, values):
+            if len(measure_indices) == len(flat):
+                all_values.append(measure_values)
+                continue
+            # cells that are only non-empty for other measures are 0 for this one
+            filled = np.zeros(len(flat), dtype=np.float64)
+            filled[np.searchsorted(flat, measure_indices)] = measure_values
+            all_values.append(filled)
+        coords = np.array(np.unravel_index(flat, shape), dtype=_coords_dtype(shape))
+        return cls(shape, coords.reshape(len(shape), len(flat)), all_values)
+
+    @classmethod
+    def from_dense(cls, data: list):
+        """Create sparse data from the dense array for each measure."""
+        import numpy as np
+
+        shape = data[0].shape
+        non_empty = np.logical_or.reduce([d.ravel() != 0 for d in data])
+        flat = np.flatnonzero(non_empty)
+        return cls.from_flat(shape, [flat] * len(data), [d.ravel()[flat] for d in data])
+
+    def to_dense(self) -> list:
+        """Return a dense float64 array for each measure."""
+        import numpy as np
+
+        dense_data = []
+        for measure_values in self.values:
+            dense = np.zeros(self.shape, dtype=np.float64)
+            dense[tuple(self.coords)] = measure_values
+            dense_data.append(dense)
+        return dense_data
+
+    def __getitem__(self, key: tuple):
+        """Select a slice of each dimension, keeping only the cells within it.
+
+        Args:
+            key (tuple): a slice for each dimension
+
+        Returns:
+            SparseCubeData: sparse data for the sliced cube,
+                with coordinates relative to the slices
+
+        """
+        import numpy as np
+
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) != len(self.shape) or not all(isinstance(k, slice) for k in key):
+            raise TypeError(
+                "Sparse cube data must be indexed with a slice for each dimension"
+            )
+        keep = np.ones(self.coords.shape[1], dtype=bool)
+        new_positions = []
+        for k, size, dim_coords in zip(key, self.shape, self.coords):
+            # map each position in the dimension to its position in the slice
+            positions = np.full(size, -1, dtype=np.intp)
+            selected = np.arange(size)[k]
+            positions[selected] = np.arange(len(selected))
+            new_positions.append(positions)
+            keep &= positions[dim_coords] >= 0
+        shape = tuple(len(range(*k.indices(size))) for k, size in zip(key, self.shape))
+        coords = np.array(
+            [p[c[keep]] for p, c in zip(new_positions, self.coords)],
+            dtype=_coords_dtype(shape),
+        ).reshape(len(shape), -1)
+        values = [v[keep] for v in self.values]
+        if any(k.step is not None and k.step < 0 for k in key):
+            # reversed dimensions change the order of the cells
+            order = np.argsort(np.ravel_multi_index(coords, shape), kind="stable")
+            coords = coords[:, order]
+            values = [v[order] for v in values]
+        return SparseCubeData(shape, coords, values)
+
+    def __len__(self):
+        """Return the number of non-empty cells."""
+        return self.coords.shape[1]
+
+
+def _coords_dtype(shape: tuple) -> "np.dtype":
+    """Return the smallest integer type that can hold coordinates for ``shape``."""
+    import numpy as np
+
+    return np.min_scalar_type(max(max(shape, default=1) - 1, 0))
+
+
+def _parse_sparse_measures(measure_results: list, shape: tuple) -> SparseCubeData:
+    """Parse the rows of each measure result, keeping only the non-empty cells.
+
+    The rows are parsed in batches of about ``SPARSE_BATCH_CELLS`` cells,
+    so only the non-empty cells of the cube are held in memory.
+
+    Args:
+        measure_results (list): measure results from the API
+        shape (tuple): size of each dimension of the cube
+
+    Returns:
+        SparseCubeData: non-empty cells of the cube
+
+    Raises:
+        ApiResultsError: if the rows don't have the number of cells
+            given by the shape of the cube
+
+    """
+    import numpy as np
+
+    row_length = shape[-1]
+    row_count = int(np.prod(shape[:-1]))
+    batch_rows = max(1, SPARSE_BATCH_CELLS // max(row_length, 1))
+    indices = []
+    values = []
+    for mr in measure_results:
+        if len(mr.rows) != row_count:
+            raise ApiResultsError(
+                f"API returned {len(mr.rows)} rows for the measure '{mr.id}'"
+                f" but the cube has {row_count} rows."
+            )
+        for row in mr.rows:
+            cells = row.count("\t") + 1
+            if cells != row_length:
+                raise ApiResultsError(
+                    f"API returned a row with {cells} cells for the measure"
+                    f" '{mr.id}' but the cube has {row_length} cells in each row."
+                )
+        measure_indices = [np.empty(0, dtype=np.intp)]
+        measure_values = [np.empty(0, dtype=np.float64)]
+        for start in range(0, len(mr.rows), batch_rows):
+            batch = _parse_measure(mr.rows[start : start + batch_rows])
+            non_empty = np.flatnonzero(batch)  # NaN isn't 0, so is kept
+            measure_indices.append(non_empty + start * row_length)
+            measure_values.append(batch[non_empty])
+        indices.append(np.concatenate(measure_indices))
+        values.append(np.concatenate(measure_values))
+    return SparseCubeData.from_flat(shape, indices, values)
+
+
+class Cube(DeferredResult):
+    _result_attributes = ("_data", "_sizes", "_headers", "_measure_names")
 
-class Cube:
     def __init__(
-        self, dimensions, measures=None, selection=None, table=None, *, session=None
+        self,
+        dimensions,
+        measures=None,
+        selection=None,
+        table=None,
+        *,
+        session=None,
+        sparse=False,
+        lazy=False,
+    ):
+        self._set_inputs(dimensions, measures, selection, table, session, sparse)
+        self._init_result(lazy)
+
+    @classmethod
+    async def fetch_async(
+        cls,
+        dimensions,
+        measures=None,
+        selection=None,
+        table=None,
+        *,
+        session=None,
+        sparse=False,
+    ):
+        """Create a cube, fetching its data without blocking the event loop.
+
+        Takes the same arguments as creating a ``Cube`` directly,
+        except that ``session`` must be an ``AsyncSession``.
+
+        Returns:
+            Cube: cube with its data
+
+        """
+        if session is None:
+            raise ValueError("You must provide a valid session (none was given).")
+        cube = cls.__new__(cls)
+        cube._set_inputs(
+            dimensions, measures, selection, table, session.session, sparse
+        )
+        cube_result = await session._post(
+            "Cubes", "CalculateSync", cube._create_cube(), "CubeResult"
+        )
+        cube._set_result(cube._process_cube(cube_result, cube.sparse))
+        return cube
+
+    def _set_inputs(
+        self, dimensions, measures, selection, table, session, sparse=False
     ):
         self.dimensions = dimensions
         self.measures = measures
         self.selection = selection
         self.table = table
         self.session = session
+        self.sparse = sparse
         self._check_inputs()
-        self._data, self._sizes, self._headers, self._measure_names = self._get_data()
 
     def _check_inputs(self):
         if self.session is None:
@@ -27,6 +286,8 @@ class Cube:
                 "You must specify at least one variable"
                 " to use as a dimension on the cube (none was given)."
             )
+        if not isinstance(self.sparse, bool):
+            raise ValueError("sparse must be True or False")
         self._check_table()
         self._check_dimensions()
         self._check_measures()
@@ -80,14 +341,18 @@ class Cube:
             (d, f"dimension '{d.name}' (table: {d.table.name})")
             for d in self.dimensions
         ]
-        m_elements = [(m, f"measure '{m._name}' (table: {m.table.name})") for m in self.measures]
+        m_elements = [
+            (m, f"measure '{m._name}' (table: {m.table.name})") for m in self.measures
+        ]
 
         cross_cube = False
         non_related = []
         for x, y in itertools.combinations(d_elements, r=2):
             if x[0].table.is_related(y[0].table, allow_same=True):
                 pass
-            elif x[0].table.is_descendant(self.table) and y[0].table.is_descendant(self.table):
+            elif x[0].table.is_descendant(self.table) and y[0].table.is_descendant(
+                self.table
+            ):
                 cross_cube = True
             else:
                 # should be unreachable
@@ -136,12 +401,17 @@ class Cube:
                     error_msg += f"\n{m[1]} & {d[1]}"
                 raise ValueError(error_msg)
 
+    def _create_request(self):
+        return self._create_cube()
+
+    def _fetch(self):
+        return self._get_data()
+
     def _get_data(self):
-        cube_result = self._get_cube()
-        raw_data = [
-            [x for row in mr.rows for x in row.split("\t")]
-            for mr in cube_result.measure_results
-        ]
+        return self._process_cube(self._get_cube(), self.sparse)
+
+    @staticmethod
+    def _process_cube(cube_result, sparse=False):
         headers = [
             {
                 "codes": [
@@ -156,27 +426,33 @@ class Cube:
             for dimension in reversed(cube_result.dimension_results)
         ]
         sizes = tuple(len(dh["codes"]) for dh in headers)
-        data_as_arrays = [np.array(raw_measure_data) for raw_measure_data in raw_data]
-        data = [
-            measure_data_as_array.reshape(sizes)
-            for measure_data_as_array in data_as_arrays
-        ]
+        if sparse:
+            data = _parse_sparse_measures(cube_result.measure_results, sizes)
+        else:
+            data = [
+                _parse_measure(mr.rows).reshape(sizes)
+                for mr in cube_result.measure_results
+            ]
         measure_names = [mr.id for mr in cube_result.measure_results]
-        dimension_names = [dim.id for dim in cube_result.dimension_results]
         return data, sizes, headers, measure_names
 
-    def _get_cube(self):
-        cube = aa.Cube(
+    def _create_cube(self):
+        return aa.Cube(
             base_query=aa.Query(
-                selection=self.selection._to_model_selection()
-                if self.selection is not None
-                else aa.Selection(table_name=self.table.name)
+                selection=(
+                    self.selection._to_model_selection()
+                    if self.selection is not None
+                    else aa.Selection(table_name=self.table.name)
+                )
             ),
             resolve_table_name=self.table.name,
             storage="Full",
             dimensions=self._create_dimensions(),
             measures=self._create_measures(),
         )
+
+    def _get_cube(self):
+        cube = self._request if self._request is not None else self._create_cube()
         cubes_controller = aa.CubesApi(self.session.api_client)
         cube_result = cubes_controller.cubes_calculate_cube_synchronously(
             self.session.data_view, self.session.system, cube=cube
@@ -190,12 +466,25 @@ class Cube:
         return [m._to_model_measure(self.table) for m in self.measures]
 
     def to_df(
-        self, unclassified=False, totals=False, no_trans=False, convert_index=None
+        self,
+        unclassified=False,
+        totals=False,
+        no_trans=False,
+        convert_index=None,
+        *,
+        sparse=None,
     ):
+        import pandas as pd
+
         # 0. validate inputs
         if no_trans is not False:  # no_trans not currently supported
             raise ValueError("no_trans must be False")
 
+        if sparse is None:
+            sparse = self.sparse
+        elif not isinstance(sparse, bool):
+            raise ValueError("sparse must be True, False or None")
+
         if any([unclassified, totals, no_trans]):
             if convert_index is True:
                 raise ValueError(
@@ -220,7 +509,15 @@ class Cube:
         slices = [slice(start, end) for __ in self.dimensions]
 
         # 3. apply slices
-        data = [measure_data[tuple(slices)] for measure_data in self._data]
+        data = self._data
+        if sparse and not isinstance(data, SparseCubeData):
+            data = SparseCubeData.from_dense(data)
+        elif not sparse and isinstance(data, SparseCubeData):
+            data = data.to_dense()
+        if sparse:
+            data = data[tuple(slices)]
+        else:
+            data = [measure_data[tuple(slices)] for measure_data in data]
         sliced_headers = [headers[s] for headers, s in zip(normalized_headers, slices)]
 
         # 4. convert headers
@@ -233,20 +530,44 @@ class Cube:
             converted_headers = sliced_headers
 
         # 5. create index
-        if len(self.dimensions) == 1:
+        if sparse:
+            # only label the non-empty cells, rather than every cell in the cube
+            index = self._create_sparse_index(converted_headers, data.coords)
+        elif len(self.dimensions) == 1:
             index = pd.Index(converted_headers[0], name=self.dimensions[0].description)
         else:
             index = pd.MultiIndex.from_product(
                 converted_headers, names=[d.description for d in self.dimensions]
             )
 
-        # 6. convert data & create DataFrame
+        # 6. create DataFrame from the parsed data
+        # (slicing, ravel() and pandas consolidating the columns may each copy it)
+        if sparse:
+            data = data.values
         return pd.DataFrame(
             {
-                measure_name: pd.to_numeric(measure_data.ravel(), errors="coerce")
+                measure_name: measure_data.ravel()
                 for measure_name, measure_data in zip(self._measure_names, data)
             },
             index=index,
+            copy=False,
+        )
+
+    def _create_sparse_index(self, headers, coords):
+        import pandas as pd
+
+        levels = [
+            pd.Index(dimension_headers, name=dimension.description).take(
+                dimension_coords
+            )
+            for dimension_headers, dimension, dimension_coords in zip(
+                headers, self.dimensions, coords
+            )
+        ]
+        if len(levels) == 1:
+            return levels[0]
+        return pd.MultiIndex.from_arrays(
+            levels, names=[d.description for d in self.dimensions]
         )
 
     @staticmethod
@@ -285,6 +606,8 @@ class Cube:
 
     @staticmethod
     def _convert_headers(headers, dimension):
+        import pandas as pd
+
         variable_type = dimension.type
         if variable_type == VariableType.SELECTOR:
             return headers
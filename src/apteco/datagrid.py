@@ -1,41 +1,567 @@
-import apteco_api as aa
-import numpy as np
-import pandas as pd
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from numbers import Integral
+from operator import itemgetter
+from typing import List
 
-from apteco.common import VariableType
+# pandas is imported in the methods that use it, to keep `import apteco` fast
+from apteco.common import VariableType, aa
+from apteco.deferred import DeferredResult
 
+DATAGRID_CHUNK_SIZE = 10_000
+
+
+def _is_positive_integer(value) -> bool:
+    return isinstance(value, Integral) and not isinstance(value, bool) and value > 0
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as exc:
+        raise ImportError(
+            "pyarrow is required to create Arrow tables and Parquet files:"
+            " install it with `pip install pyarrow`"
+        ) from exc
+    return pyarrow
+
+
+def _parse_dates(data: "pd.Series", date_format: str, dates_only: bool = False):
+    """Parse a column of date strings, parsing each distinct string only once.
+
+    Date columns typically have far fewer distinct values than rows,
+    so the column is factorized, only its distinct strings are parsed,
+    and the results are taken back out for each row.
+    Strings that aren't valid dates (e.g. ``"Unclassified"``) become ``NaT``.
+
+    Args:
+        data (pd.Series): column of date strings
+        date_format (str): format of the strings, as used by ``strptime``
+        dates_only (bool): whether to return ``datetime.date`` objects
+            rather than a ``datetime64`` column (default is ``False``)
+
+    Returns:
+        pd.Series: parsed dates, with the same index as ``data``
+
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(data)
+    parsed = pd.to_datetime(
+        pd.Series(uniques, dtype=object), format=date_format, errors="coerce"
+    )
+    if dates_only:
+        parsed = parsed.dt.date
+    # missing values have code -1, which takes the NaT appended at the end
+    not_a_time = pd.NaT if dates_only else np.datetime64("NaT")
+    values = np.append(parsed.to_numpy(), not_a_time)
+    return pd.Series(values.take(codes), index=data.index)
+
+
+def _group_codes(values: "SelectorValues", shards: int) -> List[List[str]]:
+    """Split the codes of a selector variable into groups of similar size.
+
+    The codes are assigned in order of decreasing record count,
+    each to the group with the fewest records so far,
+    so the groups have roughly equal total counts.
+    Codes without a count are treated as having no records.
+
+    Args:
+        values (SelectorValues): codes and counts of the variable's categories
+        shards (int): maximum number of groups
+
+    Returns:
+        list: groups of codes, each in the variable's order
+
+    """
+    order = {code: i for i, code in enumerate(values)}
+    counts = {code: values.count_for(code) or 0 for code in values}
+    groups = [[] for _ in range(min(shards, len(counts)))]
+    # (records, codes, index) so groups with equal counts share out the codes
+    heap = [(0, 0, i) for i in range(len(groups))]
+    for code in sorted(counts, key=counts.get, reverse=True):
+        records, num_codes, i = heapq.heappop(heap)
+        groups[i].append(code)
+        heapq.heappush(heap, (records + counts[code], num_codes + 1, i))
+    return [sorted(group, key=order.get) for group in groups if group]
+
+
+class DataGrid(DeferredResult):
+    _result_attributes = ("_data",)
 
-class DataGrid:
     def __init__(
-        self, columns, selection=None, table=None, max_rows=1000, *, session=None
+        self,
+        columns,
+        selection=None,
+        table=None,
+        max_rows=1000,
+        *,
+        session=None,
+        shard_by=None,
+        shards=None,
+        export_codes=False,
+        lazy=False,
+    ):
+        self._set_inputs(columns, selection, table, max_rows, session, export_codes)
+        self._set_sharding(shard_by, shards)
+        self._init_result(lazy)
+
+    @classmethod
+    async def fetch_async(
+        cls,
+        columns,
+        selection=None,
+        table=None,
+        max_rows=1000,
+        *,
+        session=None,
+        export_codes=False,
+    ):
+        """Create a data grid, fetching its data without blocking the event loop.
+
+        Takes the same arguments as creating a ``DataGrid`` directly,
+        except that ``session`` must be an ``AsyncSession``
+        and sharding isn't supported.
+
+        Returns:
+            DataGrid: data grid with its data
+
+        """
+        if session is None:
+            raise ValueError("You must provide a valid session (none was given).")
+        data_grid = cls.__new__(cls)
+        data_grid._set_inputs(
+            columns, selection, table, max_rows, session.session, export_codes
+        )
+        data_grid._set_sharding(None, None)
+        export_result = await session._post(
+            "Exports", "ExportSync", data_grid._create_export(), "ExportResult"
+        )
+        data_grid._data = data_grid._process_export(export_result)
+        return data_grid
+
+    def _set_inputs(
+        self, columns, selection, table, max_rows, session, export_codes=False
     ):
         self.columns = columns
         self.selection = selection
         self.table = table
         self.max_rows = max_rows
         self.session = session
+        self.export_codes = export_codes
         self._check_inputs()
-        self._data = self._get_data()
 
-    def to_df(self):
-        df = pd.DataFrame(self._data, columns=[v.description for v in self.columns])
+    def to_df(self, *, categorical=False):
+        """Return the data as a DataFrame.
+
+        Args:
+            categorical (bool or str): whether to return selector columns
+                as categorical columns, with the variable's categories,
+                or ``"all"`` to also return text columns as categorical
+                (default is ``False``, to return them as strings)
+
+        Returns:
+            pandas.DataFrame: data from the data grid
+
+        """
+        return self._rows_to_df(
+            self._data, self._get_categories(categorical), self._get_code_values()
+        )
+
+    def iter_chunks(
+        self,
+        chunk_size: int = DATAGRID_CHUNK_SIZE,
+        *,
+        max_rows=None,
+        prefetch=True,
+        categorical=False,
+    ):
+        """Iterate over the records in the data grid in chunks.
+
+        The records are fetched from the API a page at a time,
+        so at most two pages are held in memory at once
+        (the current chunk and, if prefetching, the next page).
+        Unlike the data grid's own data, the number of records
+        is not limited by ``max_rows`` on the data grid.
+
+        Args:
+            chunk_size (int): number of records to fetch in each page
+                (default is 10,000)
+            max_rows (int): maximum total number of records to fetch
+                (default is ``None``, to fetch all records)
+            prefetch (bool): whether to fetch the next page in the background
+                while the current chunk is being processed (default is ``True``)
+            categorical (bool or str): as for :meth:`to_df`;
+                selector columns have the same categories in every chunk
+
+        Returns:
+            Iterator[pandas.DataFrame]: chunks of records,
+            with the same columns and types as :meth:`to_df`
+
+        """
+        pages = self._iter_pages(
+            *self._check_paging("chunk_size", chunk_size, max_rows, prefetch)
+        )
+        categories = self._get_categories(categorical)
+        code_values = self._get_code_values()
+        return (self._rows_to_df(rows, categories, code_values) for rows in pages)
+
+    def to_arrow(self):
+        """Return the data as a PyArrow Table.
+
+        The columns are decoded straight into typed Arrow arrays,
+        without creating a DataFrame.
+        Selector, Text and Reference columns are strings,
+        Numeric columns are 64-bit floats,
+        Date columns are dates and DateTime columns are timestamps (in seconds),
+        with values that aren't valid dates as nulls.
+        Requires `pyarrow <https://arrow.apache.org/docs/python/>`_.
+
+        Returns:
+            pyarrow.Table: data from the data grid
+
+        """
+        pa = _import_pyarrow()
+        return self._rows_to_arrow(
+            self._data, self._arrow_schema(pa), self._get_code_values()
+        )
+
+    def write_parquet(
+        self,
+        path,
+        row_group_size: int = DATAGRID_CHUNK_SIZE,
+        *,
+        max_rows=None,
+        prefetch=True,
+    ):
+        """Write the records in the data grid to a Parquet file.
+
+        The records are fetched from the API a page at a time,
+        as for :meth:`iter_chunks`, and each page is written to the file
+        as a row group as soon as it is fetched,
+        so the memory used doesn't depend on the total number of records.
+        The columns have the same types as for :meth:`to_arrow`.
+        Requires `pyarrow <https://arrow.apache.org/docs/python/>`_.
+
+        Args:
+            path (str or pathlib.Path): path of the file to write
+            row_group_size (int): number of records to fetch in each page,
+                and so in each row group of the file (default is 10,000)
+            max_rows (int): maximum total number of records to write
+                (default is ``None``, to write all records)
+            prefetch (bool): whether to fetch the next page in the background
+                while the current one is being written (default is ``True``)
+
+        """
+        pages = self._iter_pages(
+            *self._check_paging("row_group_size", row_group_size, max_rows, prefetch)
+        )
+        pa = _import_pyarrow()
+        import pyarrow.parquet as pq
+
+        schema = self._arrow_schema(pa)
+        code_values = self._get_code_values()
+        with pq.ParquetWriter(path, schema) as writer:
+            for rows in pages:
+                writer.write_table(self._rows_to_arrow(rows, schema, code_values))
+
+    @staticmethod
+    def _check_paging(size_name, size, max_rows, prefetch):
+        """Check the arguments for fetching records page by page.
+
+        Returns:
+            tuple: page size, maximum number of records and prefetch setting,
+            as arguments for :meth:`_iter_pages`
+
+        """
+        if not _is_positive_integer(size):
+            raise ValueError(f"{size_name} must be an integer greater than 0")
+        if max_rows is not None and not _is_positive_integer(max_rows):
+            raise ValueError("max_rows must be an integer greater than 0")
+        if not isinstance(prefetch, bool):
+            raise ValueError("prefetch must be True or False")
+        return int(size), max_rows if max_rows is None else int(max_rows), prefetch
+
+    def _iter_pages(self, chunk_size, max_rows, prefetch):
+        """Fetch the data grid records page by page, yielding lists of rows."""
+
+        def page_size(offset):
+            if max_rows is None:
+                return chunk_size
+            return min(chunk_size, max_rows - offset)
+
+        def fetch_page(offset):
+            return self._process_export(
+                self._get_export(self._create_page_export(offset, page_size(offset)))
+            )
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            offset = 0
+            next_page = executor.submit(fetch_page, offset) if prefetch else None
+            while True:
+                rows = next_page.result() if prefetch else fetch_page(offset)
+                next_offset = offset + len(rows)
+                has_more = len(rows) == page_size(offset) and (
+                    max_rows is None or next_offset < max_rows
+                )
+                if has_more and prefetch:
+                    next_page = executor.submit(fetch_page, next_offset)
+                if rows:
+                    yield rows
+                if not has_more:
+                    return
+                offset = next_offset
+
+    def _get_categories(self, categorical):
+        """Return the categories of the columns to make categorical.
+
+        Args:
+            categorical (bool or str): ``True`` for selector columns,
+                ``"all"`` for selector and text columns, or ``False`` for none
+
+        Returns:
+            dict: categories for each categorical column, keyed by column index,
+            with ``None`` for text columns, whose categories come from their data
+
+        """
+        if not (categorical is True or categorical is False or categorical == "all"):
+            raise ValueError("categorical must be True, False or 'all'")
+        categories = {}
+        if not categorical:
+            return categories
         for i, v in enumerate(self.columns):
-            df.iloc[:, i] = self._convert_column(df.iloc[:, i], v.type)
+            if v.type == VariableType.SELECTOR:
+                categories[i] = list(dict.fromkeys(v.values.descriptions))
+            elif v.type == VariableType.TEXT and categorical == "all":
+                categories[i] = None
+        return categories
+
+    def _get_code_values(self):
+        """Return the categories of the selector columns exported as codes.
+
+        Returns:
+            dict: codes and descriptions of the categories of each selector column,
+            keyed by column index, or an empty dict if descriptions were exported
+
+        """
+        if not self.export_codes:
+            return {}
+        return {
+            i: v.values
+            for i, v in enumerate(self.columns)
+            if v.type == VariableType.SELECTOR
+        }
+
+    def _rows_to_df(self, rows, categories=None, code_values=None):
+        """Convert a list of rows of strings into a DataFrame.
+
+        Each column is copied out of the rows into its own array of strings
+        and converted to its final type in one operation,
+        then the DataFrame is assembled from the converted columns,
+        so no intermediate DataFrame of strings is created
+        and columns are never converted in place.
+
+        Args:
+            rows (list): rows of the data grid, as tuples of strings
+            categories (dict): categories of the columns to make categorical,
+                as returned by :meth:`_get_categories`
+            code_values (dict): categories of the columns containing codes,
+                as returned by :meth:`_get_code_values`
+
+        """
+        import numpy as np
+        import pandas as pd
+
+        categories = categories or {}
+        code_values = code_values or {}
+
+        def convert_column(i, v):
+            values = np.fromiter(
+                map(itemgetter(i), rows), dtype=object, count=len(rows)
+            )
+            strings = pd.Series(values, copy=False)
+            if i in code_values:
+                column = self._decode_codes(strings, code_values[i])
+                return column if i in categories else column.astype(object)
+            if i in categories:
+                return self._to_categorical(strings, categories[i])
+            return self._convert_column(strings, v.type)
+
+        df = pd.concat(
+            [convert_column(i, v) for i, v in enumerate(self.columns)],
+            axis=1,
+            copy=False,
+        )
+        df.columns = [v.description for v in self.columns]
         return df
 
+    def _arrow_schema(self, pa):
+        """Return the Arrow schema for the data grid columns."""
+        arrow_types = {
+            VariableType.SELECTOR: pa.string(),
+            VariableType.TEXT: pa.string(),
+            VariableType.REFERENCE: pa.string(),
+            VariableType.NUMERIC: pa.float64(),
+            VariableType.DATE: pa.date32(),
+            VariableType.DATETIME: pa.timestamp("s"),
+        }
+        fields = []
+        for v in self.columns:
+            if v.type not in arrow_types:
+                raise ValueError(f"Unrecognised column type: {v.type}")
+            fields.append(pa.field(v.description, arrow_types[v.type]))
+        return pa.schema(fields)
+
+    def _rows_to_arrow(self, rows, schema, code_values=None):
+        """Convert a list of rows of strings into an Arrow table.
+
+        Each column is copied out of the rows into an Arrow array of strings
+        and cast to its type in the schema.
+        As with :meth:`_convert_column`, dates are parsed
+        once for each distinct string.
+
+        Args:
+            rows (list): rows of the data grid, as tuples of strings
+            schema (pyarrow.Schema): schema from :meth:`_arrow_schema`
+            code_values (dict): categories of the columns containing codes,
+                as returned by :meth:`_get_code_values`
+
+        Returns:
+            pyarrow.Table: data in the rows
+
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        code_values = code_values or {}
+        arrays = []
+        for i, field in enumerate(schema):
+            strings = pa.array(
+                map(itemgetter(i), rows), type=pa.string(), size=len(rows)
+            )
+            if i in code_values:
+                values = code_values[i]
+                positions = pc.index_in(
+                    strings, value_set=pa.array(values.codes, type=pa.string())
+                )
+                descriptions = pa.array(values.descriptions, type=pa.string())
+                # codes not in the variable's categories are kept as they are
+                arrays.append(pc.coalesce(pc.take(descriptions, positions), strings))
+            elif pa.types.is_string(field.type):
+                arrays.append(strings)
+            elif pa.types.is_floating(field.type):
+                # empty cells are missing values, as in to_df()
+                missing = pc.equal(strings, "")
+                arrays.append(pc.cast(pc.if_else(missing, None, strings), field.type))
+            else:
+                date_format = (
+                    "%d-%m-%Y" if pa.types.is_date(field.type) else "%d-%m-%Y %H:%M:%S"
+                )
+                encoded = strings.dictionary_encode()
+                parsed = pc.strptime(
+                    encoded.dictionary, format=date_format, unit="s", error_is_null=True
+                )
+                arrays.append(pc.take(parsed, encoded.indices).cast(field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
     @staticmethod
-    def _convert_column(data: pd.Series, column_type):
+    def _decode_codes(data: "pd.Series", values: "SelectorValues"):
+        """Convert a column of selector codes to a categorical column of descriptions.
+
+        The categories are the descriptions of the variable's categories,
+        in the same order as from :meth:`_get_categories`.
+        Any codes that aren't among the variable's categories
+        are kept as they are and added to the end of the categories.
+
+        Args:
+            data (pd.Series): column of codes
+            values (SelectorValues): codes and descriptions
+                of the variable's categories
+
+        Returns:
+            pd.Series: categorical column of descriptions
+
+        """
+        import pandas as pd
+
+        extra = sorted(set(pd.unique(data)).difference(values))
+        codes = pd.Index([*values, *extra])
+        descriptions = [*values.descriptions, *extra]
+        categories = list(dict.fromkeys(descriptions))
+        category_codes = pd.Index(categories).get_indexer(descriptions)
+        column = pd.Categorical.from_codes(
+            category_codes[codes.get_indexer(data)], categories
+        )
+        return pd.Series(column, index=data.index)
+
+    @staticmethod
+    def _to_categorical(data: "pd.Series", categories=None):
+        """Convert a column of strings to a categorical column.
+
+        Any values not in ``categories`` are added to the end of them,
+        so no data is lost if a variable's categories have changed.
+
+        Args:
+            data (pd.Series): column of strings
+            categories (list): categories for the column,
+                or ``None`` to use the sorted distinct values in ``data``
+
+        Returns:
+            pd.Series: categorical column
+
+        """
+        import pandas as pd
+
+        if categories is None:
+            return data.astype("category")
+        column = pd.Categorical(data, categories=categories)
+        missing = column.codes == -1
+        if missing.any():
+            extra = sorted(set(data[missing]))
+            column = pd.Categorical(data, categories=[*categories, *extra])
+        return pd.Series(column, index=data.index)
+
+    @staticmethod
+    def _convert_column(data: "pd.Series", column_type):
+        import pandas as pd
+
         if column_type in (VariableType.SELECTOR, VariableType.TEXT, VariableType.REFERENCE):
             return data.astype(str)
         elif column_type == VariableType.NUMERIC:
             return pd.to_numeric(data)
         elif column_type == VariableType.DATE:
-            return pd.to_datetime(data, format="%d-%m-%Y", errors="coerce").dt.date
+            return _parse_dates(data, "%d-%m-%Y", dates_only=True)
         elif column_type == VariableType.DATETIME:
-            return pd.to_datetime(data, format="%d-%m-%Y %H:%M:%S", errors="coerce")
+            return _parse_dates(data, "%d-%m-%Y %H:%M:%S")
         else:
             raise ValueError(f"Unrecognised column type: {column_type}")
 
+    def _set_sharding(self, shard_by, shards):
+        if shard_by is None:
+            if shards is not None:
+                raise ValueError("shards can only be given with shard_by")
+        else:
+            if shard_by.type != VariableType.SELECTOR:
+                raise ValueError(
+                    f"The variable '{shard_by.name}' has type '{shard_by.type.value}'."
+                    f"\nOnly Selector variables can be used to shard a data grid."
+                )
+            if shard_by.table != self.table:
+                raise ValueError(
+                    f"The resolve table of the data grid is '{self.table.name}',"
+                    f" but the variable '{shard_by.name}' belongs to the"
+                    f" '{shard_by.table.name}' table."
+                    f"\nOnly variables from the same table as the data grid"
+                    f" can be used to shard it."
+                )
+            if shards is None:
+                shards = self.session.max_workers
+            elif not _is_positive_integer(shards):
+                raise ValueError("shards must be an integer greater than 0")
+        self.shard_by = shard_by
+        self.shards = shards
+
     def _check_inputs(self):
         if self.session is None:
             raise ValueError("You must provide a valid session (none was given).")
@@ -44,6 +570,8 @@ class DataGrid:
             assert self.max_rows > 0
         except (ValueError, TypeError, AssertionError) as exc:
             raise ValueError("max_rows must be a number greater than 0") from exc
+        if not isinstance(self.export_codes, bool):
+            raise ValueError("export_codes must be True or False")
         if not self.columns:
             raise ValueError(
                 "You must specify at least one variable"
@@ -77,13 +605,18 @@ class DataGrid:
                 )
 
     def _create_columns(self):
-        return [
-            aa.Column(id=str(i), variable_name=v.name, column_header=v.description)
-            for i, v in enumerate(self.columns)
-        ]
+        columns = []
+        for i, v in enumerate(self.columns):
+            column = aa.Column(
+                id=str(i), variable_name=v.name, column_header=v.description
+            )
+            if self.export_codes and v.type == VariableType.SELECTOR:
+                column.detail = "Code"
+            columns.append(column)
+        return columns
 
-    def _get_export(self):
-        export = aa.Export(
+    def _create_export(self):
+        return aa.Export(
             base_query=aa.Query(
                 selection=self.selection._to_model_selection()
                 if self.selection is not None
@@ -94,12 +627,122 @@ class DataGrid:
             return_browse_rows=True,
             columns=self._create_columns(),
         )
+
+    def _create_page_export(self, offset, page_size):
+        """Create an export for one page of the data grid records.
+
+        The page is selected using limits on the export,
+        skipping the records on earlier pages
+        and taking the first ``page_size`` records after them.
+
+        """
+        export = self._create_export()
+        export.maximum_number_of_rows_to_browse = page_size
+        export.limits = aa.Limits(
+            sampling="First", total=page_size, type="Total", start_at=offset
+        )
+        return export
+
+    def _create_shard_export(self, clause, offset, page_size):
+        """Create an export for a page of the records selected by a shard clause."""
+        export = self._create_page_export(offset, page_size)
+        export.base_query = aa.Query(selection=clause._to_model_selection())
+        return export
+
+    def _get_export(self, export=None):
+        if export is None:
+            export = self._request
+        if export is None:
+            export = self._create_export()
         exports_controller = aa.ExportsApi(self.session.api_client)
         export_result = exports_controller.exports_perform_export_synchronously(
             self.session.data_view, self.session.system, export=export
         )
         return export_result
 
+    def _create_request(self):
+        if self.shard_by is not None:
+            return None  # shards are built from var code counts when fetching
+        return self._create_export()
+
+    def _fetch(self):
+        if self.shard_by is not None:
+            return (self._get_sharded_data(),)
+        return (self._get_data(),)
+
     def _get_data(self):
-        export_result = self._get_export()
-        return [tuple(row.descriptions.split("\t")) for row in export_result.rows]
+        return self._process_export(self._get_export())
+
+    def _get_sharded_data(self):
+        """Fetch the data grid records in shards, concurrently.
+
+        The codes of the ``shard_by`` variable are split into groups
+        with similar numbers of records,
+        and the records for each group (within the data grid's selection)
+        are exported concurrently, then concatenated in shard order.
+
+        ``max_rows`` is split evenly between the shards,
+        so no more than ``max_rows`` records are fetched in total.
+        Any shards which return all the records they asked for
+        are then asked for more, sharing out the rows still left,
+        until either every shard is exhausted or ``max_rows`` is reached.
+
+        """
+        from apteco.query import SelectorClause
+
+        shard_clauses = []
+        for codes in _group_codes(self.shard_by.values, self.shards):
+            clause = SelectorClause(self.shard_by, codes, session=self.session)
+            if self.selection is not None:
+                clause = clause & self.selection
+            shard_clauses.append(clause)
+        if not shard_clauses:
+            return []
+
+        shard_rows = [[] for _ in shard_clauses]
+
+        def fetch_shard(request):
+            i, page_size = request
+            export = self._create_shard_export(
+                shard_clauses[i], len(shard_rows[i]), page_size
+            )
+            return self._process_export(self._get_export(export))
+
+        unfinished = list(range(len(shard_clauses)))
+        rows_left = self.max_rows
+        max_workers = min(len(shard_clauses), self.session.max_workers)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while unfinished and rows_left > 0:
+                page_size, extra = divmod(rows_left, len(unfinished))
+                requests = [
+                    (i, page_size + (n < extra)) for n, i in enumerate(unfinished)
+                ]
+                # with fewer rows left than shards, some wait for the next round
+                waiting = [i for i, size in requests if size == 0]
+                requests = [(i, size) for i, size in requests if size > 0]
+                pages = list(executor.map(fetch_shard, requests))
+                unfinished = []
+                for (i, size), rows in zip(requests, pages):
+                    shard_rows[i].extend(rows)
+                    rows_left -= len(rows)
+                    if len(rows) == size:  # there may be more records
+                        unfinished.append(i)
+                unfinished.extend(waiting)
+        return [row for rows in shard_rows for row in rows]
+
+    def _process_export(self, export_result):
+        if not self.export_codes:
+            return [tuple(row.descriptions.split("\t")) for row in export_result.rows]
+        code_columns = [
+            i for i, v in enumerate(self.columns) if v.type == VariableType.SELECTOR
+        ]
+        rows = []
+        for row in export_result.rows:
+            values = row.descriptions.split("\t")
+            codes = row.codes.split("\t")
+            for i in code_columns:
+                # an empty code means the description is used as the code
+                if codes[i]:
+                    values[i] = codes[i]
+            rows.append(tuple(values))
+        return rows
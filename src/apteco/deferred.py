@@ -0,0 +1,84 @@
+"""Deferred fetching of results for data grids and cubes.
+
+Data grids and cubes created with ``lazy=True`` only check their inputs
+and build their API request when they are created,
+and fetch their results from the API when they are first used,
+or when they are run together with :meth:`Session.execute`.
+
+"""
+
+from typing import Tuple
+
+
+class DeferredResult:
+    """Mixin for objects whose results can be fetched when first needed.
+
+    Subclasses name the attributes holding their results
+    in ``_result_attributes``, and implement ``_create_request()``
+    to build their API request and ``_fetch()`` to get their results.
+    While an object is pending, its result attributes aren't set,
+    so accessing one of them fetches the results.
+
+    """
+
+    _result_attributes: Tuple[str, ...] = ()
+    _request = None
+    _pending = False
+
+    def _init_result(self, lazy: bool):
+        """Fetch the results now, or build the request to fetch them later.
+
+        Args:
+            lazy (bool): whether to defer fetching the results
+                until they are first needed
+
+        """
+        if not isinstance(lazy, bool):
+            raise ValueError("lazy must be True or False")
+        if lazy:
+            self._request = self._create_request()
+            self._pending = True
+        else:
+            self._set_result(self._fetch())
+
+    @property
+    def pending(self) -> bool:
+        """Whether the results are still to be fetched from the API."""
+        return self._pending
+
+    def execute(self):
+        """Fetch the results from the API, if they haven't been fetched already.
+
+        Returns:
+            self, with its results
+
+        """
+        if self._pending:
+            self._set_result(self._fetch())
+        return self
+
+    def _create_request(self):
+        """Return the API request for the results.
+
+        Returns ``None`` if the request can't be built in advance.
+
+        """
+        return None
+
+    def _fetch(self) -> tuple:
+        """Fetch the results, in the order of ``_result_attributes``."""
+        raise NotImplementedError
+
+    def _set_result(self, result: tuple):
+        for name, value in zip(self._result_attributes, result):
+            setattr(self, name, value)
+        self._pending = False
+
+    def __getattr__(self, name):
+        # only called for attributes that aren't set,
+        # so the results of a pending object are fetched the first time they are used
+        if name in self._result_attributes and self._pending:
+            return getattr(self.execute(), name)
+        raise AttributeError(
+            f"'{type(self).__name__}' object has no attribute '{name}'"
+        )
@@ -1,3 +1,5 @@
+import functools
+import hashlib
 from collections.abc import Sequence
 from datetime import date, datetime
 from decimal import Decimal
@@ -5,9 +7,9 @@ from fractions import Fraction
 from numbers import Integral, Number, Rational, Real
 from typing import Iterable, List, Optional
 
-import apteco_api as aa
-
-from apteco.common import VariableType
+from apteco.async_session import AsyncSession
+from apteco.cache import get_selector_values
+from apteco.common import VariableType, aa
 from apteco.cube import Cube
 from apteco.datagrid import DataGrid
 from apteco.exceptions import AptecoException
@@ -30,11 +32,37 @@ class SelectionCount(object):
 
 
 class Selection:
-    def __init__(self, query: aa.Query, session: "Session"):
+    def __init__(self, query: "aa.Query", session: "Session"):
 
         self.queries_controller = aa.QueriesApi(session.api_client)
-        self._response = self._run_query(session.data_view, session.system, query)
+        count_cache = getattr(session, "count_cache", None)
+        if count_cache is None:
+            self._response = self._run_query(session.data_view, session.system, query)
+        else:
+            self._response = self._run_cached_query(session, query, count_cache)
+        self._read_response()
+
+    @classmethod
+    async def run_async(cls, query: "aa.Query", session: "AsyncSession"):
+        """Count a query without blocking the event loop.
+
+        Args:
+            query: query request
+            session: async session to send the request with
 
+        Returns:
+            Selection: selection with the counts from the query result
+
+        """
+        selection = cls.__new__(cls)
+        selection._response = await session._post(
+            "Queries", "CountSync", query, "QueryResult"
+        )
+        selection._read_response()
+        return selection
+
+    def _read_response(self):
+        """Set the counts from the query result."""
         self.counts = []
         self.count_names = []
         for count_dict in self._response.counts:
@@ -45,7 +73,7 @@ class Selection:
         self.count = self.counts[0].count
         self.table_name = self.counts[0].table_name
 
-    def _run_query(self, data_view_name: str, system: str, query: aa.Query):
+    def _run_query(self, data_view_name: str, system: str, query: "aa.Query"):
         """Request a query be counted
 
         Args:
@@ -64,6 +92,27 @@ class Selection:
 
         return response  # type: aa.QueryResult
 
+    def _run_cached_query(
+        self, session: "Session", query: "aa.Query", count_cache: "CountCache"
+    ):
+        """Get the query result from the count cache, or run and cache it.
+
+        Args:
+            session: API session to run the query with
+            query: query request
+            count_cache: cache of count results for the session
+
+        Returns:
+            QueryResult from the cache or the API
+
+        """
+        key = count_cache.key(session, query)
+        response = count_cache.get(key, session)
+        if response is None:
+            response = self._run_query(session.data_view, session.system, query)
+            count_cache.put(key, response, session)
+        return response
+
     def get_count(self, table: str = None) -> int:
         """Get the count for the given table.
 
@@ -109,22 +158,38 @@ class Selection:
             raise ValueError("Table name not found")
 
 
-# TODO: change name to Controller (confusing with APIClient otherwise)
-class APIController:
-    def __init__(self, controller, session: "Session"):
-        self._controller = controller(session.api_client)
+async def _count_async(self, session: Optional[AsyncSession] = None) -> int:
+    """Return the number of records, without blocking the event loop.
+
+    Args:
+        session (AsyncSession): async session to send the request with
+            (default is a new one for this request only,
+            which is closed afterwards)
 
-    def __call__(self, function_as_string, **kwargs):
-        return getattr(self._controller, function_as_string)(**kwargs)
+    Returns:
+        int: number of records in the selection
+
+    """
+    query_final = self._to_model_query()
+    if session is None:
+        async with AsyncSession(self.session) as session:
+            return (await Selection.run_async(query_final, session)).count
+    return (await Selection.run_async(query_final, session)).count
 
 
 class TableMixin:
+    __slots__ = ()
+
     def count(self):
-        query_final = aa.Query(
-            selection=aa.Selection(table_name=self.name, ancestor_counts=True)
-        )
-        session = self.session
-        return Selection(query_final, session).count
+        return Selection(self._to_model_query(), self.session).count
+
+    count_async = _count_async
+
+    def _to_model_selection(self):
+        return aa.Selection(table_name=self.name, ancestor_counts=True)
+
+    def _to_model_query(self):
+        return aa.Query(selection=self._to_model_selection())
 
 
 general_error_msg_selector = (
@@ -326,23 +391,140 @@ def validate_single_input(value, abstract_class, concrete_class, metavar, valid_
     return value
 
 
+def _memoized(method):
+    """Decorate a clause method so its result is computed only once.
+
+    The result is stored on the clause the first time the method is called
+    and returned on every later call.
+    This relies on clauses being immutable, so the result can't go out of date.
+
+    """
+    attr = f"_memo{method.__name__}"
+
+    @functools.wraps(method)
+    def memoized_method(self):
+        try:
+            return self.__dict__[attr]
+        except KeyError:
+            result = self.__dict__[attr] = method(self)
+            return result
+
+    return memoized_method
+
+
+def _fingerprint_value(value):
+    """Convert a clause attribute into a value to include in a fingerprint.
+
+    Clauses are represented by their own fingerprint,
+    and tables and variables by their names,
+    so the result only contains basic types with a stable ``repr()``.
+
+    """
+    if isinstance(value, Clause):
+        return ("Clause", value._fingerprint())
+    if isinstance(value, TableMixin):
+        return ("Table", value.name)
+    if hasattr(value, "is_selectable"):  # only vars have this attr
+        return ("Variable", getattr(value.table, "name", None), value.name)
+    if isinstance(value, (list, tuple)):
+        return tuple(_fingerprint_value(v) for v in value)
+    if isinstance(value, dict):
+        return tuple((k, _fingerprint_value(v)) for k, v in value.items())
+    return value
+
+
 class Clause:
+    """Base class for clauses, the building blocks of selections.
+
+    Clauses are immutable: their attributes can't be changed once set.
+    This means the apteco-api models a clause compiles to can be built
+    on first use and reused every time the clause is counted
+    or used as the selection for a data grid, cube or limit.
+    Don't modify lists passed to a clause (e.g. its values) after creating it.
+
+    Clauses compare equal (and have the same hash) if they have the same type
+    and attributes, including the clauses they're built from,
+    so they can be used in sets and as dictionary keys
+    to find repeated selections.
+    The session a clause belongs to isn't compared.
+
+    """
+
+    def __setattr__(self, name, value):
+        if not name.startswith("_") and name in self.__dict__:
+            raise AttributeError(
+                f"Cannot change '{name}': clauses are immutable once created."
+            )
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name):
+        if not name.startswith("_"):
+            raise AttributeError(
+                f"Cannot delete '{name}': clauses are immutable once created."
+            )
+        super().__delattr__(name)
+
+    def __eq__(self, other):
+        if not isinstance(other, Clause):
+            return NotImplemented
+        return self._fingerprint() == other._fingerprint()
+
+    def __hash__(self):
+        return int(self._fingerprint()[:16], 16)
+
+    @_memoized
+    def _fingerprint(self):
+        """Return a digest identifying the structure of this clause.
+
+        The digest combines the type of clause and its attributes,
+        using the fingerprints of any clauses it's built from,
+        so each clause in a tree is only processed once.
+        It is stable between Python processes.
+
+        Returns:
+            str: hexadecimal SHA-256 digest
+
+        """
+        structure = (type(self).__name__,) + tuple(
+            (name, _fingerprint_value(value))
+            for name, value in sorted(vars(self).items())
+            if not name.startswith("_") and name != "session"
+        )
+        return hashlib.sha256(repr(structure).encode()).hexdigest()
+
     @property
     def table_name(self):
         return self.table.name
 
     def count(self):
-        query_final = aa.Query(selection=self._to_model_selection())
-        session = self.session
-        return Selection(query_final, session).count
+        return Selection(self._to_model_query(), self.session).count
 
+    count_async = _count_async
+
+    @_memoized
     def _to_model_selection(self):
         return aa.Selection(
             table_name=self.table_name,
             ancestor_counts=True,
-            rule=aa.Rule(clause=self._to_model_clause()),
+            rule=aa.Rule(clause=self._canonicalize()._to_model_clause()),
         )
 
+    @_memoized
+    def _to_model_query(self):
+        return aa.Query(selection=self._to_model_selection())
+
+    def _canonicalize(self):
+        """Return an equivalent clause which is simpler to send to the API.
+
+        Clauses are returned unchanged unless they combine other clauses,
+        in which case the combined clauses are simplified
+        (see :meth:`BooleanClause._canonicalize`
+        and :meth:`TableClause._canonicalize`).
+        The clause is never modified: a new clause is returned if needed.
+
+        """
+        return self
+
     def _change_table(self, new_table, simplify=False):
 
         if simplify:
@@ -368,18 +550,12 @@ class Clause:
         elif self.table == new_table:
             return self
         else:
-            try:
-                common_ancestor_names = set(t.name for t in self.table.ancestors) & set(
-                    t.name for t in new_table.ancestors
-                )
-                nearest_common_ancestor = max(
-                    self.session.tables[name] for name in common_ancestor_names
-                )
-            except ValueError:  # empty list passed to max() -> no common ancestors
+            nearest_common_ancestor = self.table.nearest_common_ancestor(new_table)
+            if nearest_common_ancestor is None:
                 raise OperationError(
                     f"Could not establish relationship between tables "
                     f"'{new_table.name}' and '{self.table_name}'."
-                ) from None
+                )
             return self._change_table_main(nearest_common_ancestor)._change_table_main(
                 new_table
             )
@@ -420,22 +596,38 @@ class Clause:
     def __rmul__(self, other):
         return self.__mul__(other)
 
-    def datagrid(self, columns, table=None, max_rows=1000):
+    def datagrid(
+        self,
+        columns,
+        table=None,
+        max_rows=1000,
+        *,
+        shard_by=None,
+        shards=None,
+        export_codes=False,
+        lazy=False,
+    ):
         return DataGrid(
             columns,
             selection=self,
             table=table if table is not None else self.table,
             max_rows=max_rows,
             session=self.session,
+            shard_by=shard_by,
+            shards=shards,
+            export_codes=export_codes,
+            lazy=lazy,
         )
 
-    def cube(self, dimensions, measures=None, table=None):
+    def cube(self, dimensions, measures=None, table=None, *, sparse=False, lazy=False):
         return Cube(
             dimensions,
             measures=measures,
             selection=self,
             table=table if table is not None else self.table,
             session=self.session,
+            sparse=sparse,
+            lazy=lazy,
         )
 
     def sample(
@@ -519,38 +711,15 @@ class Clause:
 class SelectorClauseMixin:
     @staticmethod
     def _verify_values(values: Iterable[str], variable_name: str, session: "Session"):
-        systems_controller = APIController(aa.FastStatsSystemsApi, session)
-
-        # TODO: separate this part into a (dynamic) getter for a .values property
-        #  on the SelectorVariable class
-        var_codes_raw = []
-        offset = 0
-        while True:
-            var_code_results = systems_controller(
-                "fast_stats_systems_get_fast_stats_variable_codes",
-                data_view_name=session.data_view,
-                system_name=session.system,
-                variable_name=variable_name,
-                offset=offset,
-            )
-            var_codes_raw.extend(var_code_results.list)
-            if (
-                var_code_results.offset + var_code_results.count
-                >= var_code_results.total_count
-            ):
-                break
-            offset = var_code_results.offset + var_code_results.count
-
-        values_by_code = {c.code: c for c in var_codes_raw}
-        values_by_desc = {c.description: c for c in var_codes_raw}
+        selector_values = get_selector_values(session, variable_name)
+        code_set = set(selector_values.codes)
+        desc_set = set(selector_values.descriptions)
 
         val_set = set(values)
-        code_set = set(values_by_code.keys())
-        desc_set = set(values_by_desc.keys())
         if val_set <= code_set:
             return sorted(val_set)
         elif val_set <= desc_set:
-            return [values_by_desc[desc].code for desc in sorted(val_set)]
+            return [selector_values.code_for(desc) for desc in sorted(val_set)]
         elif val_set <= (code_set | desc_set):
             raise InvalidValuesError(
                 "Cannot mix codes and descriptions in selector values list."
@@ -684,6 +853,7 @@ class SelectorClause(CriteriaClause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_clause(self):
         return aa.Clause(
             criteria=aa.Criteria(
@@ -716,6 +886,7 @@ class CombinedCategoriesClause(CriteriaClause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_clause(self):
         return aa.Clause(
             criteria=aa.Criteria(
@@ -748,6 +919,7 @@ class NumericClause(CriteriaClause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_clause(self):
         return aa.Clause(
             criteria=aa.Criteria(
@@ -792,6 +964,7 @@ class TextClause(CriteriaClause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_clause(self):
         return aa.Clause(
             criteria=aa.Criteria(
@@ -827,6 +1000,7 @@ class ArrayClause(CriteriaClause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_clause(self):
         return aa.Clause(
             criteria=aa.Criteria(
@@ -863,6 +1037,7 @@ class DateListClause(CriteriaClause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_clause(self):
         return aa.Clause(
             criteria=aa.Criteria(
@@ -911,6 +1086,7 @@ class DateRangeClause(CriteriaClause):
             params["range_end_date"] = self.end + "T00:00:00"
         return params
 
+    @_memoized
     def _to_model_clause(self):
         return aa.Clause(
             criteria=aa.Criteria(
@@ -947,6 +1123,7 @@ class TimeRangeClause(CriteriaClause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_clause(self):
         return aa.Clause(
             criteria=aa.Criteria(
@@ -1003,6 +1180,7 @@ class BooleanClause(Clause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_clause(self):
         return aa.Clause(
             logic=aa.Logic(
@@ -1013,6 +1191,118 @@ class BooleanClause(Clause):
             )
         )
 
+    @_memoized
+    def _canonicalize(self):
+        """Return an equivalent clause with its logic simplified.
+
+        The operands are canonicalized, then for AND and OR:
+
+        * unlabelled operands with the same operation are flattened into this one,
+          e.g. ``(a & b) & c`` becomes ``a & b & c``
+        * unlabelled selector or numeric clauses on the same variable are merged
+          into a single clause listing all their values
+          (included clauses for OR, excluded ones for AND)
+        * duplicate operands are removed
+        * if only one operand is left, it is returned in place of this clause
+
+        For NOT, a double negation (``~~a``) is replaced by the clause itself.
+        Clauses with a label are kept as they are (apart from their operands),
+        so the label still appears in the query.
+
+        """
+        if self.label is None and self.operation != "NOT":
+            operands = [op._canonicalize() for op in self._flatten_operands()]
+            operands = self._remove_duplicates(self._merge_criteria(operands))
+            if len(operands) == 1:
+                return operands[0]
+        else:
+            operands = [op._canonicalize() for op in self.operands]
+            if self.label is None:
+                (operand,) = operands
+                if (
+                    isinstance(operand, BooleanClause)
+                    and operand.operation == "NOT"
+                    and operand.label is None
+                ):
+                    return operand.operands[0]
+        if len(operands) == len(self.operands) and all(
+            new is old for new, old in zip(operands, self.operands)
+        ):
+            return self
+        return BooleanClause(
+            self.table, self.operation, operands, label=self.label, session=self.session
+        )
+
+    def _flatten_operands(self):
+        """Return the operands of this and any nested clauses it can absorb.
+
+        The nested clauses are unpacked before canonicalizing them,
+        so a long chain built with ``|`` or ``&`` is simplified in one pass
+        rather than once for each level of nesting.
+
+        """
+        operands = []
+        pending = list(reversed(self.operands))
+        while pending:
+            op = pending.pop()
+            if self._can_absorb(op):
+                pending.extend(reversed(op.operands))
+            else:
+                operands.append(op)
+        return operands
+
+    def _can_absorb(self, op):
+        """Return whether an operand's operands can be moved into this clause."""
+        return (
+            isinstance(op, BooleanClause)
+            and op.operation == self.operation
+            and op.label is None
+        )
+
+    def _merge_criteria(self, operands):
+        """Flatten nested operands and merge criteria on the same variable."""
+        flat_operands = []
+        for op in operands:
+            if self._can_absorb(op):
+                flat_operands.extend(op.operands)
+            else:
+                flat_operands.append(op)
+        # NOT a AND NOT b == NOT (a OR b), so excluded criteria merge under AND
+        mergeable_include = self.operation == "OR"
+        merged = []
+        merged_positions = {}
+        merged_values = {}
+        for op in flat_operands:
+            if (
+                type(op) in (SelectorClause, NumericClause)
+                and op.label is None
+                and op.include == mergeable_include
+            ):
+                key = (type(op), op.table_name, op.variable_name)
+                position = merged_positions.get(key)
+                if position is not None:
+                    merged_values[position].extend(op.values)
+                    continue
+                merged_positions[key] = len(merged)
+                merged_values[len(merged)] = list(op.values)
+            merged.append(op)
+        for position, values in merged_values.items():
+            first = merged[position]
+            unique_values = list(dict.fromkeys(values))
+            if unique_values != list(first.values):
+                merged[position] = type(first)(
+                    first.variable,
+                    unique_values,
+                    include=first.include,
+                    session=first.session,
+                )
+        return merged
+
+    @staticmethod
+    def _remove_duplicates(operands):
+        """Remove operands which are the same as an earlier one."""
+        return list(dict.fromkeys(operands))
+
 
 class TableClause(Clause):
     def __init__(self, table, operation, operand, *, label=None, session=None):
@@ -1023,6 +1313,7 @@ class TableClause(Clause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_clause(self):
         return aa.Clause(
             logic=aa.Logic(
@@ -1033,6 +1324,35 @@ class TableClause(Clause):
             )
         )
 
+    @_memoized
+    def _canonicalize(self):
+        """Return an equivalent clause with redundant table changes removed.
+
+        Changing to a related table and back again,
+        then repeating the first change,
+        gives the same records as just making the first change,
+        e.g. ``ANY(THE(ANY(x)))`` selects the same people as ``ANY(x)``
+        when ``x`` is on a child table of people.
+        Such chains (without labels) are collapsed to the single change.
+
+        """
+        operand = self.operand._canonicalize()
+        if (
+            self.label is None
+            and isinstance(operand, TableClause)
+            and operand.label is None
+            and isinstance(operand.operand, TableClause)
+            and operand.operand.operation == self.operation
+            and operand.operand.table == self.table
+            and operand.operand.operand.table == operand.table
+        ):
+            return operand.operand
+        if operand is self.operand:
+            return self
+        return TableClause(
+            self.table, self.operation, operand, label=self.label, session=self.session
+        )
+
 
 class SubSelectionClause(Clause):
     def __init__(self, selection, *, label=None, session=None):
@@ -1041,6 +1361,7 @@ class SubSelectionClause(Clause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_clause(self):
         return aa.Clause(
             # TODO: this may need to be changed depending on
@@ -1050,6 +1371,7 @@ class SubSelectionClause(Clause):
 
 
 class BaseLimitClause(Clause):
+    @_memoized
     def _to_model_clause(self):
         return aa.Clause(
             sub_selection=aa.SubSelection(selection=self._to_model_selection())
@@ -1077,25 +1399,25 @@ class LimitClause(BaseLimitClause):
             )
         self.kind = {0: "Total", 1: "Percent", 2: "Fraction"}[input_flag.index(True)]
 
-        self.total = None
-        self.percent = None
-        self.fraction = None
         if self.kind == "Total":
             if not isinstance(total, Integral) or int(total) < 1:
                 raise ValueError("`total` must be an integer greater than 0")
-            self.total = int(total)
+            total = int(total)
         elif self.kind == "Percent":
             if not isinstance(percent, Real) or not (0 < float(percent) < 100):
                 raise ValueError("`percent` must be a number between 0–100 (exclusive)")
-            self.percent = float(percent)
+            percent = float(percent)
         elif self.kind == "Fraction":
             if not isinstance(fraction, Rational) or not (0 < float(fraction) < 1):
                 raise ValueError(
                     "`fraction` must be a rational number between 0 and 1 (exclusive)"
                 )
-            self.fraction = Fraction(fraction.numerator, fraction.denominator)
+            fraction = Fraction(fraction.numerator, fraction.denominator)
         else:
             raise ValueError("Limit kind not recognised")
+        self.total = total
+        self.percent = percent
+        self.fraction = fraction
 
         if sample_type.title() not in ("First", "Stratified", "Random"):
             raise ValueError(f"{sample_type} is not a valid sample type")
@@ -1111,9 +1433,10 @@ class LimitClause(BaseLimitClause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_selection(self):
         return aa.Selection(
-            rule=aa.Rule(clause=self.clause._to_model_clause()),
+            rule=aa.Rule(clause=self.clause._canonicalize()._to_model_clause()),
             limits=aa.Limits(
                 sampling=self.sample_type,
                 total=self.total,
@@ -1159,6 +1482,7 @@ class TopNClause(BaseLimitClause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_selection(self):
         if self.kind[0] == "single":
             if self.kind[1] == "total":
@@ -1188,7 +1512,7 @@ class TopNClause(BaseLimitClause):
             raise ValueError(f"Invalid kind: {self.kind}")
 
         return aa.Selection(
-            rule=aa.Rule(clause=self.clause._to_model_clause()),
+            rule=aa.Rule(clause=self.clause._canonicalize()._to_model_clause()),
             top_n=aa.TopN(
                 variable_name=self.by.name,
                 direction=direction,
@@ -1230,6 +1554,7 @@ class NPerVariableClause(BaseLimitClause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_selection(self):
         if self.by is not None:
             grouping_sequence_variable_name = self.by.name
@@ -1238,7 +1563,7 @@ class NPerVariableClause(BaseLimitClause):
             grouping_sequence_variable_name = None
             grouping_ascending = None
         return aa.Selection(
-            rule=aa.Rule(clause=self.clause._to_model_clause()),
+            rule=aa.Rule(clause=self.clause._canonicalize()._to_model_clause()),
             top_n=aa.TopN(
                 grouping_variable_name=self.per.name,
                 grouping_sequence_variable_name=grouping_sequence_variable_name,
@@ -1276,6 +1601,7 @@ class NPerTableClause(BaseLimitClause):
         self.label = label
         self.session = session
 
+    @_memoized
     def _to_model_selection(self):
         if self.by is not None:
             variable_name = self.by.name
@@ -1284,7 +1610,7 @@ class NPerTableClause(BaseLimitClause):
             variable_name = None
             direction = None
         return aa.Selection(
-            rule=aa.Rule(clause=self.clause._to_model_clause()),
+            rule=aa.Rule(clause=self.clause._canonicalize()._to_model_clause()),
             n_per=aa.NPer(
                 recency=aa.RFVRecency(
                     variable_name=variable_name, direction=direction, value=self.n
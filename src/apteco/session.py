@@ -1,20 +1,32 @@
 import getpass
 import json
 import logging
+import threading
 import warnings
 from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from json import JSONDecodeError
-from typing import Any, Dict, List, Tuple
-
-import apteco_api as aa
-
+from numbers import Integral
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from apteco.cache import (
+    CountCache,
+    MetadataCache,
+    VarCodeCache,
+    deserialize_models,
+    fingerprint_models,
+    serialize_models,
+)
+from apteco.common import aa, lazy_import
 from apteco.exceptions import (
     ApiResultsError,
     DeserializeError,
     TablesError,
     VariablesError,
 )
-from apteco.tables import Table, TablesAccessor
+from apteco.query import Selection
+from apteco.tables import NOT_LOADED, Table, TableRelations, TablesAccessor
 from apteco.variables import (
     ArrayVariable,
     DateTimeVariable,
@@ -30,22 +42,124 @@ from apteco.variables import (
 
 NOT_ASSIGNED: Any = object()
 VARIABLES_PER_PAGE = 1000
+MAX_WORKERS = 4
+SNAPSHOT_VERSION = 1
+
+# only needed once a client is created, and imports urllib3
+connection = lazy_import("apteco.connection")
 
 
 class Session:
-    def __init__(self, credentials: "Credentials", system: str):
+    def __init__(
+        self,
+        credentials: "Credentials",
+        system: str,
+        *,
+        metadata_cache: Optional[MetadataCache] = None,
+        count_cache: Optional[CountCache] = None,
+        var_code_cache: Union[VarCodeCache, bool, None] = True,
+        variables_per_page: int = VARIABLES_PER_PAGE,
+        max_workers: int = MAX_WORKERS,
+        lazy_variables: bool = False,
+        pool_maxsize: Optional[int] = None,
+        keep_alive: bool = True,
+        timeout=None,
+        reuse_tls_context: bool = True,
+    ):
+        """
+
+        Args:
+            credentials (Credentials): credentials from logging in to the API
+            system (str): FastStats system to connect to
+            metadata_cache (MetadataCache): optional cache to load tables
+                and variables data from, if the system build date is unchanged
+                (a directory path can also be given, to use a cache there)
+            count_cache (CountCache): optional cache for selection counts,
+                so repeated counts of the same query don't call the API
+                (``True`` can also be given, to use a cache with default settings)
+            var_code_cache (VarCodeCache): cache for the categories
+                of selector variables, fetched when first needed
+                (default is ``True``, to use a cache with default settings;
+                ``None`` turns off caching)
+            variables_per_page (int): number of variables to request
+                in each page when fetching variables data
+            max_workers (int): maximum number of API requests to make
+                concurrently when fetching data in pages
+            lazy_variables (bool): whether to wait until the variables
+                on a table are first accessed before loading them
+                (default is ``False``, which loads all variables up front)
+            pool_maxsize (int): maximum number of connections to keep open
+                to the API server (default is the apteco-api default,
+                which is 5 times the number of CPUs)
+            keep_alive (bool): whether to keep connections open
+                between requests so they can be reused (default is ``True``)
+            timeout (float or tuple): timeout for each API request in seconds,
+                either a single number or a ``(connect, read)`` tuple
+                (default is ``None``, for no timeout)
+            reuse_tls_context (bool): whether connections share a single
+                TLS context, so certificates are only loaded once
+                (default is ``True``); only applies when any of the other
+                connection settings is changed from its default
+
+        """
         self._unpack_credentials(credentials)
+        self._set_fetch_options(variables_per_page, max_workers)
+        self._set_connection_options(
+            pool_maxsize, keep_alive, timeout, reuse_tls_context
+        )
         self._create_client()
         self.system = system
         self._fetch_system_info()
-        tables_without_vars, master_table_name = InitializeTablesAlgorithm(self).run()
-        variables, tables = InitializeVariablesAlgorithm(
-            self, tables_without_vars
-        ).run()
+        self._set_metadata_cache(metadata_cache)
+        self._set_count_cache(count_cache)
+        self._set_var_code_cache(var_code_cache)
+        self.lazy_variables = lazy_variables
+        raw_tables, raw_variables = self._load_cached_metadata()
+        self._initialize_metadata(raw_tables, raw_variables)
+
+    def _initialize_metadata(self, raw_tables, raw_variables):
+        """Create tables and variables and add them to the session.
+
+        Args:
+            raw_tables (List[aa.Table]): list of raw tables,
+                or ``None`` to fetch them from the API
+            raw_variables (List[aa.Variable]): list of raw variables,
+                or ``None`` to fetch them from the API
+
+        """
+        tables_algo = InitializeTablesAlgorithm(self, raw_tables)
+        tables_without_vars, master_table_name = tables_algo.run()
+        if self.lazy_variables:
+            tables = self._defer_variables(tables_without_vars, raw_variables)
+            variables = NOT_LOADED
+            if raw_variables is None and self.metadata_cache is not None:
+                # saved once the variables for every table have been loaded
+                self._unsaved_metadata = (tables_algo.raw_tables, {})
+        else:
+            variables_algo = InitializeVariablesAlgorithm(
+                self, tables_without_vars, raw_variables
+            )
+            variables, tables = variables_algo.run()
+            variables = VariablesAccessor(variables)
+            if raw_variables is None:
+                self._save_cached_metadata(
+                    tables_algo.raw_tables, variables_algo.raw_variables
+                )
         self.tables = TablesAccessor(tables)
-        self.variables = VariablesAccessor(variables)
+        self.variables = variables
         self.master_table = self.tables[master_table_name]
 
+    @property
+    def variables(self):
+        """Variables in the system, loaded for every table if not yet loaded."""
+        if self._variables is NOT_LOADED:
+            self._load_all_variables()
+        return self._variables
+
+    @variables.setter
+    def variables(self, variables):
+        self._variables = variables
+
     def _unpack_credentials(self, credentials):
         """Copy credentials data into session."""
         self.base_url = credentials.base_url
@@ -54,6 +168,21 @@ class Session:
         self.access_token = credentials.access_token
         self.user = credentials.user
 
+    def _set_fetch_options(self, variables_per_page, max_workers):
+        """Validate and set options for fetching paged data."""
+        for name, value in [
+            ("variables_per_page", variables_per_page),
+            ("max_workers", max_workers),
+        ]:
+            if not isinstance(value, Integral) or isinstance(value, bool) or value < 1:
+                raise ValueError(f"{name} must be an integer greater than 0")
+        self.variables_per_page = int(variables_per_page)
+        self.max_workers = int(max_workers)
+
+    def _set_connection_options(self, *args):
+        """Validate and set options for the HTTP connections to the API."""
+        self.connection_options = connection.validate_connection_options(*args)
+
     def _create_client(self):
         """Create an authorized API client."""
         config = aa.Configuration()
@@ -62,6 +191,24 @@ class Session:
         config.api_key_prefix = {"Authorization": "Bearer"}
         self._config = config
         self.api_client = aa.ApiClient(configuration=self._config)
+        connection.configure_api_client(self.api_client, self.connection_options)
+
+    def close(self):
+        """Close the session's connections to the API.
+
+        Open connections in the pool are closed straight away,
+        rather than when the session is garbage collected.
+        If the session is used again afterwards,
+        new connections are opened as needed.
+
+        """
+        connection.close_api_client(self.api_client)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def _fetch_system_info(self):
         """Fetch FastStats system info from API and add to session."""
@@ -76,8 +223,238 @@ class Session:
             view_name=result.view_name,
         )
 
-    def _to_dict(self):
-        return {
+    def _set_metadata_cache(self, metadata_cache):
+        """Set the cache used for system metadata."""
+        if metadata_cache is None or isinstance(metadata_cache, MetadataCache):
+            self.metadata_cache = metadata_cache
+        else:
+            self.metadata_cache = MetadataCache(metadata_cache)
+
+    def _set_count_cache(self, count_cache):
+        """Set the cache used for selection counts."""
+        if count_cache is True:
+            self.count_cache = CountCache()
+        elif count_cache is None or count_cache is False:
+            self.count_cache = None
+        elif isinstance(count_cache, CountCache):
+            self.count_cache = count_cache
+        else:
+            raise ValueError("count_cache must be a CountCache, True, False or None")
+
+    def _set_var_code_cache(self, var_code_cache):
+        """Set the cache used for the categories of selector variables."""
+        if var_code_cache is True:
+            self.var_code_cache = VarCodeCache()
+        elif var_code_cache is None or var_code_cache is False:
+            self.var_code_cache = None
+        elif isinstance(var_code_cache, VarCodeCache):
+            self.var_code_cache = var_code_cache
+        else:
+            raise ValueError(
+                "var_code_cache must be a VarCodeCache, True, False or None"
+            )
+
+    def _load_cached_metadata(self):
+        """Load raw tables and variables data from the metadata cache.
+
+        Returns:
+            (tuple): tuple containing:
+
+                raw_tables (List[aa.Table]):
+                    list of raw tables, or ``None`` if not cached
+                raw_variables (List[aa.Variable]):
+                    list of raw variables, or ``None`` if not cached
+
+        """
+        if self.metadata_cache is None:
+            return None, None
+        cached = self.metadata_cache.load(self)
+        if cached is None:
+            return None, None
+        return cached.raw_tables, cached.raw_variables
+
+    def _save_cached_metadata(self, raw_tables, raw_variables):
+        """Save raw tables and variables data to the metadata cache."""
+        if self.metadata_cache is not None:
+            self.metadata_cache.save(self, raw_tables, raw_variables)
+
+    def _defer_variables(self, tables_without_variables, raw_variables):
+        """Prepare tables to load their variables on first access.
+
+        Args:
+            tables_without_variables (Dict[str, Table]):
+                mapping from table name to its ``Table`` object,
+                with variables attribute as ``NOT_ASSIGNED``
+            raw_variables (List[aa.Variable]): list of raw variables
+                (e.g. from the metadata cache) to create variables from,
+                or ``None`` to fetch each table's variables from the API
+
+        Returns:
+            List[Table]: list of tables as py-apteco ``Table`` objects
+
+        """
+        self._variables_lock = threading.RLock()
+        self._unsaved_metadata = None
+        if raw_variables is None:
+            self._raw_variables_lookup = None
+        else:
+            self._raw_variables_lookup = defaultdict(list)
+            for raw_variable in raw_variables:
+                self._raw_variables_lookup[raw_variable.table_name].append(raw_variable)
+        for table in tables_without_variables.values():
+            table.variables = NOT_LOADED
+        return list(tables_without_variables.values())
+
+    def _load_table_variables(self, table):
+        """Load the variables for a single table and assign them to it."""
+        with self._variables_lock:
+            if table._variables is not NOT_LOADED:  # loaded in another thread
+                return
+            tables_lookup = {table.name: table}
+            if self._raw_variables_lookup is None:
+                variables_algo = InitializeVariablesAlgorithm(
+                    self, tables_lookup, table_name=table.name
+                )
+                variables_algo.run()
+                self._add_unsaved_variables(table.name, variables_algo.raw_variables)
+            else:
+                variables_algo = InitializeVariablesAlgorithm(
+                    self, tables_lookup, self._raw_variables_lookup[table.name]
+                )
+                variables_algo.run()
+
+    def _add_unsaved_variables(self, table_name, raw_variables):
+        """Keep a table's raw variables to save to the metadata cache.
+
+        Once the variables for every table have been loaded,
+        the tables and variables are saved to the metadata cache.
+
+        """
+        if self._unsaved_metadata is None:
+            return
+        raw_tables, raw_variables_by_table = self._unsaved_metadata
+        raw_variables_by_table[table_name] = raw_variables
+        if len(raw_variables_by_table) == len(raw_tables):
+            self._unsaved_metadata = None
+            self._save_cached_metadata(
+                raw_tables,
+                [v for t in raw_tables for v in raw_variables_by_table[t.name]],
+            )
+
+    def _load_all_variables(self):
+        """Load the variables for every table and collect them for the session."""
+        with self._variables_lock:
+            if self._variables is NOT_LOADED:
+                self._variables = VariablesAccessor(
+                    variable for table in self.tables for variable in table.variables
+                )
+
+    def count_many(
+        self, clauses: Iterable, max_workers: Optional[int] = None
+    ) -> List["CountResult"]:
+        """Count several selections, running their queries concurrently.
+
+        Identical selections are only counted once,
+        and a failure counting one selection doesn't stop the others.
+
+        Args:
+            clauses (Iterable): clauses (or tables) to count
+            max_workers (int): maximum number of queries to run concurrently
+                (default is the session's ``max_workers``)
+
+        Returns:
+            List[CountResult]: a result for each clause, in the order given
+
+        """
+        max_workers = _check_max_workers(max_workers, self.max_workers)
+        clauses = list(clauses)
+        prepared = []
+        queries = {}
+        for clause in clauses:
+            try:
+                query = clause._to_model_query()
+            except Exception as exc:
+                prepared.append((None, exc))
+                continue
+            key = fingerprint_models(self.api_client, query)
+            queries.setdefault(key, query)
+            prepared.append((key, None))
+        futures = {}
+        if queries:
+            with ThreadPoolExecutor(
+                max_workers=min(max_workers, len(queries))
+            ) as executor:
+                futures = {
+                    key: executor.submit(Selection, query, self)
+                    for key, query in queries.items()
+                }
+        results = []
+        for clause, (key, error) in zip(clauses, prepared):
+            if error is None:
+                try:
+                    selection = futures[key].result()
+                except Exception as exc:
+                    error = exc
+            if error is not None:
+                results.append(CountResult(clause, None, None, error))
+                continue
+            counts = {c.table_name: c.count for c in selection.counts}
+            results.append(CountResult(clause, selection.count, counts, None))
+        return results
+
+    def execute(self, objects: Iterable, max_workers: Optional[int] = None) -> List:
+        """Fetch the results of several lazy data grids and cubes concurrently.
+
+        Objects with identical requests are only fetched once,
+        and objects that aren't pending are left as they are.
+        If fetching any of the objects fails, the first error is raised
+        once all the others have been fetched, and the failed objects
+        are left pending.
+
+        Args:
+            objects (Iterable): data grids and cubes created with ``lazy=True``
+            max_workers (int): maximum number of requests to run concurrently
+                (default is the session's ``max_workers``)
+
+        Returns:
+            list: the objects, in the order given, with their results
+
+        """
+        max_workers = _check_max_workers(max_workers, self.max_workers)
+        objects = list(objects)
+        groups = {}
+        for obj in objects:
+            if not obj.pending:
+                continue
+            if obj._request is None:
+                key = id(obj)
+            else:
+                request = obj._request
+                key = fingerprint_models(
+                    self.api_client, type(request).__name__, request
+                )
+            groups.setdefault(key, []).append(obj)
+        if not groups:
+            return objects
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(groups))) as executor:
+            futures = [
+                (executor.submit(group[0]._fetch), group) for group in groups.values()
+            ]
+        errors = []
+        for future, group in futures:
+            try:
+                result = future.result()
+            except Exception as exc:
+                errors.append(exc)
+                continue
+            for obj in group:
+                obj._set_result(result)
+        if errors:
+            raise errors[0]
+        return objects
+
+    def _to_dict(self, full=False):
+        d = {
             "base_url": self.base_url,
             "data_view": self.data_view,
             "session_id": self.session_id,
@@ -85,9 +462,97 @@ class Session:
             "user": self.user._asdict(),
             "system": self.system,
         }
+        if full:
+            d["snapshot"] = self._to_snapshot()
+        return d
+
+    def _to_snapshot(self):
+        """Capture the system info, tables and variables for serialization."""
+        return {
+            "version": SNAPSHOT_VERSION,
+            "system_info": {
+                "name": self.system_info.name,
+                "description": self.system_info.description,
+                "build_date": self.system_info.build_date.isoformat(),
+                "view_name": self.system_info.view_name,
+            },
+            "tables": serialize_models(
+                self.api_client, [table._to_model_table() for table in self.tables]
+            ),
+            "variables": serialize_models(
+                self.api_client,
+                [variable._to_model_variable() for variable in self.variables],
+            ),
+        }
+
+    def _restore_snapshot(
+        self,
+        snapshot,
+        check_build_date=False,
+        count_cache=None,
+        var_code_cache=True,
+        lazy_variables=False,
+    ):
+        """Set up the session from a snapshot without fetching its metadata.
+
+        Args:
+            snapshot (dict): snapshot data from :meth:`_to_snapshot`
+            check_build_date (bool): whether to check with the API
+                that the FastStats system hasn't been rebuilt
+                since the snapshot was taken
+            count_cache (CountCache): optional cache for selection counts
+            var_code_cache (VarCodeCache): cache for the categories
+                of selector variables, or ``None`` to turn off caching
+            lazy_variables (bool): whether to wait until the variables
+                on a table are first accessed before creating them
+
+        Raises:
+            DeserializeError: if the snapshot is invalid,
+                or the system has been rebuilt and ``check_build_date`` is set
+
+        """
+        try:
+            version = snapshot["version"]
+            if version != SNAPSHOT_VERSION:
+                raise DeserializeError(
+                    f"Session snapshot has unsupported version: {version}"
+                )
+            system_info = snapshot["system_info"]
+            self.system_info = FastStatsSystem(
+                name=system_info["name"],
+                description=system_info["description"],
+                build_date=datetime.fromisoformat(system_info["build_date"]),
+                view_name=system_info["view_name"],
+            )
+            raw_tables = deserialize_models(
+                self.api_client, snapshot["tables"], "Table"
+            )
+            raw_variables = deserialize_models(
+                self.api_client, snapshot["variables"], "Variable"
+            )
+        except KeyError as e:
+            raise DeserializeError(f"Data missing from session snapshot: no {e} found.")
+        if check_build_date:
+            self._check_build_date()
+        self._set_metadata_cache(None)
+        self._set_count_cache(count_cache)
+        self._set_var_code_cache(var_code_cache)
+        self.lazy_variables = lazy_variables
+        self._initialize_metadata(raw_tables, raw_variables)
+
+    def _check_build_date(self):
+        """Check the FastStats system hasn't been rebuilt since the snapshot."""
+        snapshot_build_date = self.system_info.build_date
+        self._fetch_system_info()
+        if self.system_info.build_date != snapshot_build_date:
+            raise DeserializeError(
+                f"The FastStats system has been rebuilt since the session"
+                f" was serialized (build date was {snapshot_build_date},"
+                f" now {self.system_info.build_date})."
+            )
 
     @staticmethod
-    def _from_dict(d):
+    def _from_dict(d, check_build_date=False, **options):
         try:
             credentials = Credentials(
                 d["base_url"],
@@ -105,19 +570,111 @@ class Session:
                 f"{exc.args[0].split(':')[1].strip()}"
             )
         else:
-            return Session(credentials, system)
+            if "snapshot" not in d:
+                return Session(credentials, system, **options)
+            session = Session.__new__(Session)
+            session._unpack_credentials(credentials)
+            session._set_fetch_options(
+                options.pop("variables_per_page", VARIABLES_PER_PAGE),
+                options.pop("max_workers", MAX_WORKERS),
+            )
+            session._set_connection_options(
+                options.pop("pool_maxsize", None),
+                options.pop("keep_alive", True),
+                options.pop("timeout", None),
+                options.pop("reuse_tls_context", True),
+            )
+            session._create_client()
+            session.system = system
+            session._restore_snapshot(d["snapshot"], check_build_date, **options)
+            return session
 
-    def serialize(self):
-        return json.dumps(self._to_dict())
+    def serialize(self, full: bool = False):
+        """Serialize the session to a string.
+
+        Args:
+            full (bool): whether to include a snapshot of the system info,
+                tables and variables, so the session can be deserialized
+                without fetching them from the API again (default is ``False``)
+
+        Returns:
+            str: serialized session
+
+        """
+        return json.dumps(self._to_dict(full=full))
 
     @staticmethod
-    def deserialize(s: str):
+    def deserialize(
+        s: str,
+        check_build_date: bool = False,
+        *,
+        count_cache: Optional[CountCache] = None,
+        var_code_cache: Union[VarCodeCache, bool, None] = True,
+        variables_per_page: int = VARIABLES_PER_PAGE,
+        max_workers: int = MAX_WORKERS,
+        lazy_variables: bool = False,
+        pool_maxsize: Optional[int] = None,
+        keep_alive: bool = True,
+        timeout=None,
+        reuse_tls_context: bool = True,
+    ):
+        """Create a session from a string created by :meth:`serialize`.
+
+        Caches and other settings aren't serialized,
+        so they are given here as when creating a :class:`Session`.
+
+        Args:
+            s (str): serialized session
+            check_build_date (bool): for a session serialized with ``full=True``,
+                whether to check with the API that the FastStats system
+                hasn't been rebuilt since it was serialized (default is ``False``)
+            count_cache (CountCache): optional cache for selection counts,
+                so repeated counts of the same query don't call the API
+                (``True`` can also be given, to use a cache with default settings)
+            var_code_cache (VarCodeCache): cache for the categories
+                of selector variables, fetched when first needed
+                (default is ``True``, to use a cache with default settings;
+                ``None`` turns off caching)
+            variables_per_page (int): number of variables to request
+                in each page when fetching variables data
+            max_workers (int): maximum number of API requests to make
+                concurrently when fetching data in pages
+            lazy_variables (bool): whether to wait until the variables
+                on a table are first accessed before loading them
+                (default is ``False``)
+            pool_maxsize (int): maximum number of connections to keep open
+                to the API server (default is the apteco-api default)
+            keep_alive (bool): whether to keep connections open
+                between requests so they can be reused (default is ``True``)
+            timeout (float or tuple): timeout for each API request in seconds,
+                either a single number or a ``(connect, read)`` tuple
+                (default is ``None``, for no timeout)
+            reuse_tls_context (bool): whether connections share a single
+                TLS context, so certificates are only loaded once
+                (default is ``True``)
+
+        Returns:
+            Session: API session object
+
+        """
         try:
             d = json.loads(s)
         except JSONDecodeError:
             raise DeserializeError("The given input could not be deserialized.")
         else:
-            return Session._from_dict(d)
+            return Session._from_dict(
+                d,
+                check_build_date,
+                count_cache=count_cache,
+                var_code_cache=var_code_cache,
+                variables_per_page=variables_per_page,
+                max_workers=max_workers,
+                lazy_variables=lazy_variables,
+                pool_maxsize=pool_maxsize,
+                keep_alive=keep_alive,
+                timeout=timeout,
+                reuse_tls_context=reuse_tls_context,
+            )
 
 
 User = namedtuple("User", ["username", "first_name", "surname", "email_address"])
@@ -156,7 +713,38 @@ FastStatsSystem = namedtuple(
 )
 
 
-def login(base_url: str, data_view: str, system: str, user: str) -> Session:
+def _check_max_workers(max_workers, default):
+    """Return the number of workers to use, checking it if one is given."""
+    if max_workers is None:
+        return default
+    if (
+        not isinstance(max_workers, Integral)
+        or isinstance(max_workers, bool)
+        or max_workers < 1
+    ):
+        raise ValueError("max_workers must be an integer greater than 0")
+    return max_workers
+
+
+CountResult = namedtuple("CountResult", ["clause", "count", "counts", "error"])
+CountResult.__doc__ = """Result of counting one selection with :meth:`Session.count_many`.
+
+Attributes:
+    clause: clause (or table) that was counted
+    count (int): number of records in the selection on its own table,
+        or ``None`` if counting failed
+    counts (Dict[str, int]): counts for the selection's table
+        and each of its ancestor tables, keyed by table name,
+        or ``None`` if counting failed
+    error (Exception): error raised when counting the selection,
+        or ``None`` if it succeeded
+
+"""
+
+
+def login(
+    base_url: str, data_view: str, system: str, user: str, **session_options
+) -> Session:
     """Log in to the API without supplying password directly.
 
     Args:
@@ -164,18 +752,25 @@ def login(base_url: str, data_view: str, system: str, user: str) -> Session:
         data_view (str): DataView being logged into
         system (str): FastStats system to connect to
         user (str): username of API user
+        **session_options: keyword arguments passed on to ``Session``,
+            e.g. ``metadata_cache``
 
     Returns:
         Session: API session object
 
     """
     return login_with_password(
-        base_url, data_view, system, user, password=_get_password()
+        base_url, data_view, system, user, password=_get_password(), **session_options
     )
 
 
 def login_with_password(
-    base_url: str, data_view: str, system: str, user: str, password: str
+    base_url: str,
+    data_view: str,
+    system: str,
+    user: str,
+    password: str,
+    **session_options,
 ) -> Session:
     """Log in to the API, supplying password directly.
 
@@ -185,13 +780,24 @@ def login_with_password(
         system (str): FastStats system to connect to
         user (str): username of API user
         password (str): password for this user
+        **session_options: keyword arguments passed on to ``Session``,
+            e.g. ``metadata_cache``
 
     Returns:
         Session: API session object
 
     """
-    credentials = SimpleLoginAlgorithm(base_url, data_view).run(user, password)
-    return Session(credentials, system)
+    connection_options = connection.validate_connection_options(
+        **{
+            name: session_options[name]
+            for name in connection.ConnectionOptions._fields
+            if name in session_options
+        }
+    )
+    credentials = SimpleLoginAlgorithm(base_url, data_view, connection_options).run(
+        user, password
+    )
+    return Session(credentials, system, **session_options)
 
 
 def _get_password(prompt: str = "Enter your password: ") -> str:
@@ -211,6 +817,8 @@ class SimpleLoginAlgorithm:
     Attributes:
         base_url (str): API base URL, normally ending '/OrbitAPI'
         data_view (str): DataView being logged into
+        connection_options (ConnectionOptions): settings for the
+            HTTP connections to the API
         api_client (aa.ApiClient): API client used to log in
         session_id (str): Apteco session ID for the created session
         access_token (str): access token for the created session
@@ -221,16 +829,24 @@ class SimpleLoginAlgorithm:
 
     """
 
-    def __init__(self, base_url: str, data_view: str):
+    def __init__(
+        self,
+        base_url: str,
+        data_view: str,
+        connection_options: Optional["connection.ConnectionOptions"] = None,
+    ):
         """
 
         Args:
             base_url (str): API base URL, normally ending '/OrbitAPI'
             data_view (str): DataView being logged into
+            connection_options (ConnectionOptions): settings for the
+                HTTP connections to the API, or ``None`` to use the defaults
 
         """
         self.base_url = base_url
         self.data_view = data_view
+        self.connection_options = connection_options
 
     def run(self, user: str, password: str) -> Credentials:
         """Run the algorithm with the given login credentials.
@@ -254,6 +870,8 @@ class SimpleLoginAlgorithm:
         config.host = self.base_url
         self._config = config
         self.api_client = aa.ApiClient(configuration=self._config)
+        if self.connection_options is not None:
+            connection.configure_api_client(self.api_client, self.connection_options)
 
     def _simple_login(self, user, password):
         """Call API to perform simple login."""
@@ -291,7 +909,8 @@ class InitializeTablesAlgorithm:
         system (str): FastStats system the session is connected to
         api_client (aa.ApiClient): client to handle API calls
         session (Session): API session the tables data belongs to
-        raw_tables (List[aa.Table]): list of raw tables
+        raw_tables (List[aa.Table]): list of raw tables,
+            either given or fetched from the API
         children_lookup (Dict[str, List[str]]):
             mapping from table name to list of its child table names
         master_table (Table): master table of the FastStats system
@@ -303,17 +922,21 @@ class InitializeTablesAlgorithm:
 
     """
 
-    def __init__(self, session):
+    def __init__(self, session, raw_tables=None):
         """
 
         Args:
             session (Session): API session the tables data belongs to
+            raw_tables (List[aa.Table]): list of raw tables,
+                e.g. from a metadata cache (if not given, these are fetched
+                from the API when the algorithm is run)
 
         """
         self.data_view = session.data_view
         self.system = session.system
         self.api_client = session.api_client
         self.session = session
+        self.raw_tables = raw_tables
 
     def run(self) -> Tuple[Dict[str, Table], str]:
         """Run the algorithm.
@@ -327,7 +950,8 @@ class InitializeTablesAlgorithm:
                     name of the master table of the FastStats system
 
         """
-        self._get_raw_tables()
+        if self.raw_tables is None:
+            self._get_raw_tables()
         self._identify_children()
         self._create_tables()
         self._assign_parent_and_children()
@@ -335,6 +959,7 @@ class InitializeTablesAlgorithm:
         _tree_tables = self._assign_ancestors_and_descendants(self.master_table, [])
         self._check_all_tables_in_tree(_tree_tables)
         self._check_all_relations_assigned()
+        self._index_relations()
         return self.tables_lookup, self.master_table.name
 
     def _get_raw_tables(self):
@@ -347,7 +972,7 @@ class InitializeTablesAlgorithm:
         self.raw_tables = results.list
 
     @staticmethod
-    def _check_table_results_consistency(results: aa.PagedResultsTable):
+    def _check_table_results_consistency(results: "aa.PagedResultsTable"):
         """Check the number of tables in list matches stated count."""
         results_count = results.count
         list_count = len(results.list)
@@ -477,6 +1102,12 @@ class InitializeTablesAlgorithm:
         if error_details:
             raise TablesError("Error constructing table tree:" + error_details)
 
+    def _index_relations(self):
+        """Build the relationship index and share it with every table."""
+        relations = TableRelations(self.master_table)
+        for table in self.tables_lookup.values():
+            table._relations = relations
+
 
 class InitializeVariablesAlgorithm:
     """Class holding the algorithm to initialize system variables.
@@ -491,10 +1122,15 @@ class InitializeVariablesAlgorithm:
         system (str): FastStats system the session is connected to
         api_client (aa.ApiClient): client to handle API calls
         session (Session): API session the variables data belongs to
+        table_name (str): name of the table to fetch variables for,
+            or ``None`` to fetch variables for all tables
+        variables_per_page (int): number of variables to request in each page
+        max_workers (int): maximum number of pages to request concurrently
         tables_lookup (Dict[str, Table]):
             mapping from table name to its ``Table`` object,
             initially with ``variables`` attribute as ``NOT_ASSIGNED``
-        raw_variables (List[aa.Variable]): list of raw variables
+        raw_variables (List[aa.Variable]): list of raw variables,
+            either given or fetched from the API
         variables (List[Variable]): list of variables
             as py-apteco ``Variable`` objects
         variables_lookup (Dict[str, List[Variable]]):
@@ -505,7 +1141,9 @@ class InitializeVariablesAlgorithm:
 
     """
 
-    def __init__(self, session, tables_without_variables):
+    def __init__(
+        self, session, tables_without_variables, raw_variables=None, *, table_name=None
+    ):
         """
 
         Args:
@@ -513,13 +1151,22 @@ class InitializeVariablesAlgorithm:
             tables_without_variables (Dict[str, Table]):
                 mapping from table name to its ``Table`` object,
                 with variables attribute as ``NOT_ASSIGNED``
+            raw_variables (List[aa.Variable]): list of raw variables,
+                e.g. from a metadata cache (if not given, these are fetched
+                from the API when the algorithm is run)
+            table_name (str): name of a single table to fetch variables for
+                (if not given, variables for all tables are fetched)
 
         """
         self.data_view = session.data_view
         self.system = session.system
         self.api_client = session.api_client
         self.session = session
+        self.table_name = table_name
+        self.variables_per_page = session.variables_per_page
+        self.max_workers = session.max_workers
         self.tables_lookup = tables_without_variables
+        self.raw_variables = raw_variables
 
     def run(self) -> Tuple[List[Variable], List[Table]]:
         """Run the algorithm.
@@ -534,28 +1181,53 @@ class InitializeVariablesAlgorithm:
 
         """
 
-        self._get_raw_variables()
+        if self.raw_variables is None:
+            self._get_raw_variables()
         self._create_variables()
         self._identify_variables()
         self._assign_variables()
         self._check_all_variables_assigned()
         return self.variables, list(self.tables_lookup.values())
 
-    def _get_raw_variables(self, variables_per_page=VARIABLES_PER_PAGE):
-        """Get list of all variables from API."""
-        systems_controller = aa.FastStatsSystemsApi(self.api_client)
+    def _get_raw_variables(self):
+        """Get list of all variables from API.
+
+        The first page is fetched on its own to find the total number of variables,
+        then the remaining pages are fetched concurrently
+        and reassembled in order.
 
-        self.raw_variables = []
-        offset = 0
-        while True:
-            results = systems_controller.fast_stats_systems_get_fast_stats_variables(
-                self.data_view, self.system, count=variables_per_page, offset=offset
+        """
+        systems_controller = aa.FastStatsSystemsApi(self.api_client)
+        filter_kwargs = {}
+        if self.table_name is not None:
+            # quotes in a string are escaped by doubling them
+            table_name = self.table_name.replace("'", "''")
+            filter_kwargs["filter"] = f"TableName == '{table_name}'"
+
+        def get_page(offset):
+            return systems_controller.fast_stats_systems_get_fast_stats_variables(
+                self.data_view,
+                self.system,
+                count=self.variables_per_page,
+                offset=offset,
+                **filter_kwargs,
             )  # type: aa.PagedResultsVariable
-            self.raw_variables.extend(results.list)
-            if results.offset + results.count >= results.total_count:
-                break
-            offset = results.offset + results.count
-        self._check_variable_results_consistency(results.total_count)
+
+        first_page = get_page(0)
+        page_size = first_page.count  # API may return fewer than requested
+        if page_size > 0:
+            offsets = range(
+                first_page.offset + page_size, first_page.total_count, page_size
+            )
+        else:
+            offsets = range(0)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            other_pages = list(executor.map(get_page, offsets))
+
+        self.raw_variables = [
+            variable for page in [first_page] + other_pages for variable in page.list
+        ]
+        self._check_variable_results_consistency(first_page.total_count)
 
     def _check_variable_results_consistency(self, total_variables: int):
         """Check number of variables returned matches stated total count."""
@@ -595,7 +1267,7 @@ class InitializeVariablesAlgorithm:
                 self.variables.append(variable)
 
     @staticmethod
-    def _choose_variable(raw_variable: aa.Variable):
+    def _choose_variable(raw_variable: "aa.Variable"):
         """Get class to create given variable according to its type."""
         variable_type_lookup = {
             ("Selector", "Categorical", "SingleValue", False): SelectorVariable,
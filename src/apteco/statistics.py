@@ -1,5 +1,3 @@
-import apteco_api as aa
-
 __all__ = [
     "Sum",
     "Mean",
@@ -17,7 +15,7 @@ __all__ = [
     "CountMode",
 ]
 
-from apteco.common import VariableType
+from apteco.common import VariableType, aa
 
 
 def _ensure_correct_type(operand, accepted_types):
@@ -1,17 +1,38 @@
-from typing import Iterable, List, Optional
-
-import apteco_api as aa
+from typing import Any, Iterable, List, Optional
 
+from apteco.common import aa
 from apteco.cube import Cube
 from apteco.datagrid import DataGrid
 from apteco.exceptions import get_deprecated_attr
 from apteco.query import NPerTableClause, TableMixin
 from apteco.variables import VariablesAccessor
 
+NOT_LOADED: Any = object()  # placeholder for variables not yet loaded from the API
+
 
 class Table(TableMixin):
     """Class representing a FastStats system table."""
 
+    __slots__ = (
+        "name",
+        "singular",
+        "plural",
+        "is_default",
+        "is_people",
+        "total_records",
+        "child_relationship",
+        "parent_relationship",
+        "has_children",
+        "parent_name",
+        "parent",
+        "children",
+        "ancestors",
+        "descendants",
+        "_variables",
+        "session",
+        "_relations",
+    )
+
     def __init__(
         self,
         name: str,
@@ -61,6 +82,7 @@ class Table(TableMixin):
             descendants (List[Table]): list of descendant tables
                 of this table (an empty list if table has no children)
             variables (VariablesAccessor): variables on this table
+                (or ``NOT_LOADED`` to load them from the session on first access)
             session (Session): API session the tables data belongs to
 
         """
@@ -81,8 +103,40 @@ class Table(TableMixin):
         self.variables = variables
         self.session = session
 
-        self.table = self
-        self._name = self.name
+    @property
+    def table(self):
+        """The table itself, so it can be used as a measure like a variable."""
+        return self
+
+    @property
+    def _name(self):
+        return self.name
+
+    @property
+    def variables(self):
+        """Variables on this table, loaded from the session if not yet loaded."""
+        if self._variables is NOT_LOADED:
+            self.session._load_table_variables(self)
+        return self._variables
+
+    @variables.setter
+    def variables(self, variables):
+        self._variables = variables
+
+    def _to_model_table(self):
+        """Recreate the apteco-api model this table was created from."""
+        return aa.Table(
+            name=self.name,
+            singular_display_name=self.singular,
+            plural_display_name=self.plural,
+            is_default_table=self.is_default,
+            is_people_table=self.is_people,
+            total_records=self.total_records,
+            child_relationship_name=self.child_relationship,
+            parent_relationship_name=self.parent_relationship,
+            has_child_tables=self.has_children,
+            parent_table=self.parent_name,
+        )
 
     def is_same(self, other: "Table"):
         """Return whether this table is the same as ``other``.
@@ -96,6 +150,13 @@ class Table(TableMixin):
         """
         return self.name == other.name
 
+    def _shared_relations(self, other: "Table") -> Optional["TableRelations"]:
+        """Return the relationship index for both tables, if they share one."""
+        relations = getattr(self, "_relations", None)
+        if relations is not None and relations is getattr(other, "_relations", None):
+            return relations
+        return None
+
     def is_ancestor(self, other: "Table", allow_same: bool = False):
         """Return whether this table is an ancestor of ``other``.
 
@@ -108,6 +169,11 @@ class Table(TableMixin):
             bool: ``True`` if this is an ancestor of ``other``, otherwise ``False``
 
         """
+        relations = self._shared_relations(other)
+        if relations is not None:
+            return relations.is_ancestor(self.name, other.name) or (
+                allow_same and self.is_same(other)
+            )
         return self in other.ancestors or (allow_same and self.is_same(other))
 
     def is_descendant(self, other: "Table", allow_same: bool = False):
@@ -122,6 +188,11 @@ class Table(TableMixin):
             bool: ``True`` if this is a descendant of ``other``, otherwise ``False``
 
         """
+        relations = self._shared_relations(other)
+        if relations is not None:
+            return relations.is_ancestor(other.name, self.name) or (
+                allow_same and self.is_same(other)
+            )
         return self in other.descendants or (allow_same and self.is_same(other))
 
     def is_related(self, other: "Table", allow_same: bool = False):
@@ -144,6 +215,27 @@ class Table(TableMixin):
             or (allow_same and self.is_same(other))
         )
 
+    def nearest_common_ancestor(self, other: "Table") -> Optional["Table"]:
+        """Return the nearest table which is an ancestor of this and ``other``.
+
+        Args:
+            other (Table): the table to find a common ancestor with
+
+        Returns:
+            Table: the nearest common ancestor,
+            or ``None`` if the tables have no common ancestor
+
+        """
+        relations = self._shared_relations(other)
+        if relations is not None:
+            ancestor = relations.nearest_common_ancestor(self.name, other.name)
+            if self.is_same(ancestor) or other.is_same(ancestor):
+                return ancestor.parent
+            return ancestor
+        other_ancestor_names = set(t.name for t in other.ancestors)
+        common_ancestors = [t for t in self.ancestors if t.name in other_ancestor_names]
+        return max(common_ancestors, default=None)
+
     def __eq__(self, other):
         """Return whether this is the same table as ``other``."""
         return self.is_same(other)
@@ -167,18 +259,40 @@ class Table(TableMixin):
     def __getitem__(self, item):
         return self.variables[item]
 
-    def datagrid(self, columns, selection=None, max_rows=1000):
+    def datagrid(
+        self,
+        columns,
+        selection=None,
+        max_rows=1000,
+        *,
+        shard_by=None,
+        shards=None,
+        export_codes=False,
+        lazy=False,
+    ):
         return DataGrid(
             columns,
             selection=selection,
             table=self,
             max_rows=max_rows,
             session=self.session,
+            shard_by=shard_by,
+            shards=shards,
+            export_codes=export_codes,
+            lazy=lazy,
         )
 
-    def cube(self, dimensions, measures=None, selection=None):
+    def cube(
+        self, dimensions, measures=None, selection=None, *, sparse=False, lazy=False
+    ):
         return Cube(
-            dimensions, measures, selection=selection, table=self, session=self.session
+            dimensions,
+            measures,
+            selection=selection,
+            table=self,
+            session=self.session,
+            sparse=sparse,
+            lazy=lazy,
         )
 
     def _as_nper_clause(self, clause, n, by, ascending, label):
@@ -219,6 +333,79 @@ class Table(TableMixin):
             )
 
 
+class TableRelations:
+    """Precomputed relationships between the tables in a FastStats system.
+
+    Built from an Euler tour of the table tree, recording where each table
+    is first and last visited, so ancestry checks are constant-time lookups.
+    A sparse table of the shallowest table over each power-of-two span
+    of the tour gives the nearest common ancestor of two tables
+    in constant time too.
+
+    """
+
+    __slots__ = ("_tables", "_depth", "_first", "_last", "_sparse")
+
+    def __init__(self, master_table: Table):
+        """
+
+        Args:
+            master_table (Table): the master table of the FastStats system,
+                with children assigned for all tables in the tree
+
+        """
+        self._tables = {}
+        self._depth = {}
+        self._first = {}
+        self._last = {}
+        tour = []
+        self._visit(master_table, 0, tour)
+        self._build_sparse_table(tour)
+
+    def _visit(self, table: Table, depth: int, tour: List[str]):
+        """Record the Euler tour of the subtree below ``table``."""
+        self._tables[table.name] = table
+        self._depth[table.name] = depth
+        self._first[table.name] = len(tour)
+        tour.append(table.name)
+        for child in table.children:
+            self._visit(child, depth + 1, tour)
+            tour.append(table.name)
+        self._last[table.name] = len(tour) - 1
+
+    def _build_sparse_table(self, tour: List[str]):
+        """Record the shallowest table in each power-of-two span of the tour."""
+        level = tour
+        self._sparse = [level]
+        span = 1
+        while 2 * span <= len(tour):
+            level = [
+                self._shallowest(level[i], level[i + span])
+                for i in range(len(level) - span)
+            ]
+            self._sparse.append(level)
+            span *= 2
+
+    def _shallowest(self, name1: str, name2: str) -> str:
+        return name1 if self._depth[name1] <= self._depth[name2] else name2
+
+    def is_ancestor(self, ancestor_name: str, descendant_name: str) -> bool:
+        """Return whether one table is a (strict) ancestor of another."""
+        return (
+            self._first[ancestor_name] < self._first[descendant_name]
+            and self._last[descendant_name] < self._last[ancestor_name]
+        )
+
+    def nearest_common_ancestor(self, name1: str, name2: str) -> Table:
+        """Return the deepest table which is the same as or an ancestor of both."""
+        start, end = sorted((self._first[name1], self._first[name2]))
+        level = (end - start + 1).bit_length() - 1
+        shallowest = self._shallowest(
+            self._sparse[level][start], self._sparse[level][end - (1 << level) + 1]
+        )
+        return self._tables[shallowest]
+
+
 class TablesAccessor:
     """List- and dictionary-like access for tables."""
 
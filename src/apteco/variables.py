@@ -1,8 +1,7 @@
 from typing import Iterable, Mapping, Optional
 
-import apteco_api as aa
-
-from apteco.common import VariableType
+from apteco.cache import SelectorValues, get_selector_values
+from apteco.common import VariableType, aa
 from apteco.exceptions import get_deprecated_attr
 from apteco.query import (
     ArrayClause,
@@ -37,6 +36,20 @@ from apteco.query import (
 class Variable:
     """Class representing a FastStats system variable."""
 
+    __slots__ = (
+        "name",
+        "description",
+        "_model_type",
+        "folder_name",
+        "table",
+        "is_selectable",
+        "is_browsable",
+        "is_exportable",
+        "is_virtual",
+        "session",
+        "type",
+    )
+
     def __init__(
         self,
         name: str,
@@ -67,6 +80,25 @@ class Variable:
     def table_name(self):
         return self.table.name
 
+    def _to_model_variable(self):
+        """Recreate the apteco-api model this variable was created from."""
+        return aa.Variable(
+            name=self.name,
+            description=self.description,
+            type=self._model_type,
+            folder_name=self.folder_name,
+            table_name=self.table_name,
+            is_selectable=self.is_selectable,
+            is_browsable=self.is_browsable,
+            is_exportable=self.is_exportable,
+            is_virtual=self.is_virtual,
+            **self._model_variable_info(),
+        )
+
+    def _model_variable_info(self):
+        """Return type-specific info to include in the apteco-api model."""
+        return {}
+
     def _as_nper_clause(self, clause, n, by, ascending, label):
         return NPerVariableClause(
             clause=clause,
@@ -80,6 +112,17 @@ class Variable:
 
 
 class BaseSelectorVariable(Variable):
+    __slots__ = (
+        "code_length",
+        "num_codes",
+        "var_code_min_count",
+        "var_code_max_count",
+        "var_code_order",
+        "selector_type",
+        "sub_type",
+        "combined_from",
+    )
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         selector_info = kwargs["selector_info"]  # type: aa.SelectorVariableInfo
@@ -88,11 +131,40 @@ class BaseSelectorVariable(Variable):
         self.var_code_min_count = selector_info.minimum_var_code_count
         self.var_code_max_count = selector_info.maximum_var_code_count
         self.var_code_order = selector_info.var_code_order
+        self.selector_type = selector_info.selector_type
+        self.sub_type = selector_info.sub_type
+        self.combined_from = selector_info.combined_from_variable_name
+
+    @property
+    def values(self) -> SelectorValues:
+        """Codes and descriptions of the variable's categories.
+
+        These are fetched from the API when first needed,
+        and kept in the session's var code cache (if it has one).
+
+        """
+        return get_selector_values(self.session, self.name)
+
+    def _model_variable_info(self):
+        return {
+            "selector_info": aa.SelectorVariableInfo(
+                selector_type=self.selector_type,
+                sub_type=self.sub_type,
+                var_code_order=self.var_code_order,
+                number_of_codes=self.num_codes,
+                code_length=self.code_length,
+                minimum_var_code_count=self.var_code_min_count,
+                maximum_var_code_count=self.var_code_max_count,
+                combined_from_variable_name=self.combined_from,
+            )
+        }
 
 
 class SelectorVariable(BaseSelectorVariable):
     """Class representing a FastStats Selector variable."""
 
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.type = VariableType.SELECTOR
@@ -119,11 +191,11 @@ class SelectorVariable(BaseSelectorVariable):
 class CombinedCategoriesVariable(BaseSelectorVariable):
     """Class representing a FastStats Combined Categories variable."""
 
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.type = "CombinedCategories"
-        selector_info = kwargs["selector_info"]  # type: aa.SelectorVariableInfo
-        self.combined_from = selector_info.combined_from_variable_name
 
     def __eq__(self, other):
         raise NotImplementedError
@@ -135,6 +207,14 @@ class CombinedCategoriesVariable(BaseSelectorVariable):
 class NumericVariable(Variable):
     """Class representing a FastStats Numeric variable."""
 
+    __slots__ = (
+        "min_value",
+        "max_value",
+        "is_currency",
+        "currency_locale",
+        "currency_symbol",
+    )
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.type = VariableType.NUMERIC
@@ -145,6 +225,17 @@ class NumericVariable(Variable):
         self.currency_locale = numeric_info.currency_locale
         self.currency_symbol = numeric_info.currency_symbol
 
+    def _model_variable_info(self):
+        return {
+            "numeric_info": aa.NumericVariableInfo(
+                minimum=self.min_value,
+                maximum=self.max_value,
+                is_currency=self.is_currency,
+                currency_locale=self.currency_locale,
+                currency_symbol=self.currency_symbol,
+            )
+        }
+
     def __eq__(self, other):
         return NumericClause(
             self,
@@ -210,12 +301,17 @@ class NumericVariable(Variable):
 class TextVariable(Variable):
     """Class representing a FastStats Text variable."""
 
+    __slots__ = ("max_length",)
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.type = VariableType.TEXT
         text_info = kwargs["text_info"]  # type: aa.TextVariableInfo
         self.max_length = text_info.maximum_text_length
 
+    def _model_variable_info(self):
+        return {"text_info": aa.TextVariableInfo(maximum_text_length=self.max_length)}
+
     def equals(self, value, match_case=True, *, include=True, label=None):
         return TextClause(
             self,
@@ -345,6 +441,8 @@ class TextVariable(Variable):
 class ArrayVariable(BaseSelectorVariable):
     """Class representing a FastStats Array variable."""
 
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.type = VariableType.ARRAY
@@ -368,6 +466,8 @@ class ArrayVariable(BaseSelectorVariable):
 class FlagArrayVariable(BaseSelectorVariable):
     """Class representing a FastStats Flag Array variable."""
 
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.type = VariableType.FLAG_ARRAY
@@ -389,21 +489,50 @@ class FlagArrayVariable(BaseSelectorVariable):
 
 
 class BaseDateVariable(BaseSelectorVariable):
+    __slots__ = ("min_date", "max_date", "_year", "_quarter", "_month", "_day")
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         selector_info = kwargs["selector_info"]  # type: aa.SelectorVariableInfo
         self.min_date = selector_info.minimum_date
         self.max_date = selector_info.maximum_date
 
-        self.year = DateAccessor(self, "Years")
-        self.quarter = DateAccessor(self, "Quarters")
-        self.month = DateAccessor(self, "Months")
-        self.day = DateAccessor(self, "Day")
+    @property
+    def year(self):
+        return self._get_date_accessor("_year", "Years")
+
+    @property
+    def quarter(self):
+        return self._get_date_accessor("_quarter", "Quarters")
+
+    @property
+    def month(self):
+        return self._get_date_accessor("_month", "Months")
+
+    @property
+    def day(self):
+        return self._get_date_accessor("_day", "Day")
+
+    def _get_date_accessor(self, attr, banding):
+        """Return the date accessor stored at ``attr``, creating it if needed."""
+        date_accessor = getattr(self, attr, None)
+        if date_accessor is None:
+            date_accessor = DateAccessor(self, banding)
+            setattr(self, attr, date_accessor)
+        return date_accessor
+
+    def _model_variable_info(self):
+        model_info = super()._model_variable_info()
+        model_info["selector_info"].minimum_date = self.min_date
+        model_info["selector_info"].maximum_date = self.max_date
+        return model_info
 
 
 class DateVariable(BaseDateVariable):
     """Class representing a FastStats Date variable."""
 
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.type = VariableType.DATE
@@ -443,6 +572,8 @@ class DateVariable(BaseDateVariable):
 class DateTimeVariable(BaseDateVariable):
     """Class representing a FastStats DateTime variable."""
 
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.type = VariableType.DATETIME
@@ -473,10 +604,15 @@ class DateTimeVariable(BaseDateVariable):
 class ReferenceVariable(Variable):
     """Class representing a FastStats Reference variable."""
 
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.type = VariableType.REFERENCE
 
+    def _model_variable_info(self):
+        return {"reference_info": {}}
+
     def __eq__(self, other):
         raise NotImplementedError
 
@@ -562,14 +698,20 @@ class VariableDescsAccessor:
 class DateAccessor:
     """Banding for date variables."""
 
+    __slots__ = ("variable", "banding", "name", "description")
+
+    type = VariableType.BANDED_DATE
+
     def __init__(self, variable, banding):
         self.variable = variable
-        self.table = variable.table
         self.banding = banding
-        self.type = VariableType.BANDED_DATE
         self.name = f"{variable.name}_{banding.rstrip('s')}"
         self.description = f"{variable.description} ({banding.rstrip('s')})"
 
+    @property
+    def table(self):
+        return self.variable.table
+
     def _to_model_dimension(self):
         return aa.Dimension(
             id=self.name,
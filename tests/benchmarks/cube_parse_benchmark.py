@@ -0,0 +1,117 @@
+"""Measure the time and memory taken to parse cube results and convert them.
+
+Builds a cube result with rows of tab-delimited counts as returned by the API
+and compares parsing it into float64 arrays, as ``Cube._process_cube()`` does,
+with the previous implementation, which kept each measure as an array of strings
+and converted it with ``pd.to_numeric()`` every time ``to_df()`` was called.
+No API calls are made. Run from the repository root with::
+
+    python tests/benchmarks/cube_parse_benchmark.py [--sizes N N ...] [--repeat N]
+
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from apteco.cube import Cube
+
+
+def make_cube_result(sizes, measures=2, seed=0):
+    """Create a cube result with random counts for a cube of the given sizes."""
+    rng = np.random.default_rng(seed)
+    row_length = sizes[-1]
+    cells = int(np.prod(sizes))
+    measure_results = []
+    for i in range(measures):
+        values = rng.integers(0, 10_000, cells).astype(str)
+        rows = [
+            "\t".join(values[start : start + row_length])
+            for start in range(0, cells, row_length)
+        ]
+        measure_results.append(SimpleNamespace(rows=rows, id=f"Measure {i}"))
+    dimension_results = [
+        SimpleNamespace(
+            id=f"Dimension {i}",
+            header_codes="\t".join(str(c) for c in range(size)),
+            header_descriptions="\t".join(f"Category {c}" for c in range(size)),
+        )
+        for i, size in enumerate(reversed(sizes))
+    ]
+    return SimpleNamespace(
+        measure_results=measure_results, dimension_results=dimension_results
+    )
+
+
+def previous_process_cube(cube_result):
+    """Parse the measures into arrays of strings, as ``_process_cube()`` used to."""
+    sizes = tuple(
+        len(dimension.header_codes.split("\t"))
+        for dimension in reversed(cube_result.dimension_results)
+    )
+    return [
+        np.array([x for row in mr.rows for x in row.split("\t")]).reshape(sizes)
+        for mr in cube_result.measure_results
+    ]
+
+
+def previous_convert(data):
+    """Convert the string arrays to numbers, as ``to_df()`` used to."""
+    return [pd.to_numeric(m.ravel(), errors="coerce") for m in data]
+
+
+def measure(func, *args, repeat):
+    """Return the average seconds and the peak bytes allocated by ``func``."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    seconds = (time.perf_counter() - start) / repeat
+    gc.collect()
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cube_result = make_cube_result(args.sizes)
+    old_data = previous_process_cube(cube_result)
+    new_data = Cube._process_cube(cube_result)[0]
+    for old, new in zip(previous_convert(old_data), new_data):
+        np.testing.assert_array_equal(old, new.ravel())
+
+    cells = int(np.prod(args.sizes))
+    print(f"Cube of {' x '.join(map(str, args.sizes))} = {cells:,} cells, 2 measures")
+    print(f"{'':<24}{'previous':>12}{'float64':>12}")
+    old_seconds, old_peak = measure(
+        previous_process_cube, cube_result, repeat=args.repeat
+    )
+    new_seconds, new_peak = measure(Cube._process_cube, cube_result, repeat=args.repeat)
+    print(f"{'parse ms':<24}{old_seconds * 1000:>12.1f}{new_seconds * 1000:>12.1f}")
+    print(f"{'parse peak MiB':<24}{old_peak / 2**20:>12.1f}{new_peak / 2**20:>12.1f}")
+    old_size = sum(data.nbytes for data in old_data)
+    new_size = sum(data.nbytes for data in new_data)
+    print(f"{'stored MiB':<24}{old_size / 2**20:>12.1f}{new_size / 2**20:>12.1f}")
+    old_seconds, _ = measure(previous_convert, old_data, repeat=args.repeat)
+    new_seconds, _ = measure(
+        lambda data: [m.ravel() for m in data], new_data, repeat=args.repeat
+    )
+    print(
+        f"{'convert per to_df() ms':<24}"
+        f"{old_seconds * 1000:>12.1f}{new_seconds * 1000:>12.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Measure the memory and time used by dense and sparse cubes with many dimensions.
+
+Builds a cube result for a high-dimensional cube where most cells are empty,
+as returned by the API, and compares parsing it and converting it
+into a DataFrame with dense storage (``sparse=False``)
+and with sparse storage (``sparse=True``),
+which only keeps and labels the non-empty cells.
+No API calls are made. Run from the repository root with::
+
+    python tests/benchmarks/cube_sparse_benchmark.py [--sizes N N ...] [--density D]
+
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import numpy as np
+
+from apteco.common import VariableType
+from apteco.cube import Cube
+
+
+def make_cube_result(sizes, density, seed=0):
+    """Create a cube result with a count measure where most cells are 0."""
+    rng = np.random.default_rng(seed)
+    cells = int(np.prod(sizes))
+    counts = np.zeros(cells, dtype=np.int64)
+    non_empty = rng.choice(cells, int(cells * density), replace=False)
+    counts[non_empty] = rng.integers(1, 1000, len(non_empty))
+    values = counts.astype(str)
+    row_length = sizes[-1]
+    rows = [
+        "\t".join(values[start : start + row_length])
+        for start in range(0, cells, row_length)
+    ]
+    dimension_results = [
+        SimpleNamespace(
+            id=f"Dimension {i}",
+            header_codes="\t".join(str(c) for c in range(size)),
+            header_descriptions="\t".join(f"Category {c}" for c in range(size)),
+        )
+        for i, size in enumerate(reversed(sizes))
+    ]
+    return SimpleNamespace(
+        measure_results=[SimpleNamespace(rows=rows, id="Count")],
+        dimension_results=dimension_results,
+    )
+
+
+def cube_to_df(cube_result, sizes, sparse):
+    """Parse the cube result and convert it into a DataFrame."""
+    cube = Cube.__new__(Cube)
+    cube.dimensions = [
+        Mock(type=VariableType.SELECTOR, description=f"Dimension {i}")
+        for i in range(len(sizes))
+    ]
+    cube.sparse = sparse
+    cube._set_result(Cube._process_cube(cube_result, sparse))
+    return cube.to_df()
+
+
+def measure(func, *args):
+    """Return the seconds and the peak bytes allocated by ``func``."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[12, 20, 30, 40, 10])
+    parser.add_argument("--density", type=float, default=0.02)
+    args = parser.parse_args()
+
+    cube_result = make_cube_result(args.sizes, args.density)
+    cells = int(np.prod(args.sizes))
+    print(
+        f"Cube of {' x '.join(map(str, args.sizes))} = {cells:,} cells,"
+        f" {args.density:.1%} non-empty"
+    )
+    print(f"{'Storage':<10}{'rows':>12}{'seconds':>10}{'peak MiB':>10}{'df MiB':>10}")
+    for sparse in (False, True):
+        df, seconds, peak = measure(cube_to_df, cube_result, args.sizes, sparse)
+        df_size = df.memory_usage(deep=True, index=True).sum()
+        print(
+            f"{'sparse' if sparse else 'dense':<10}{len(df):>12,}{seconds:>10.2f}"
+            f"{peak / 2**20:>10.1f}{df_size / 2**20:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Measure the time and memory taken to convert data grid rows into a DataFrame.
+
+Uses the data grid reference data from the integration tests,
+converted into rows of strings as returned by the API
+and repeated to give a larger data grid,
+and compares ``DataGrid.to_df()`` with the previous implementation,
+which created a DataFrame of strings, converted each column in place
+and parsed every date string in date and datetime columns.
+Also reports the memory used by the DataFrame with selector columns
+as strings and as categorical columns. No API calls are made.
+Run from the repository root with::
+
+    python tests/benchmarks/datagrid_to_df_benchmark.py [--rows N] [--repeat N]
+
+"""
+
+import argparse
+import csv
+import gc
+import time
+import tracemalloc
+from pathlib import Path
+from unittest.mock import Mock
+
+import pandas as pd
+
+from apteco.datagrid import DataGrid
+
+DATA_DIR = Path(__file__).parent.parent / "integration_tests" / "data"
+
+COLUMN_TYPES = {
+    "datagrid_001_bookings_various_columns.csv": [
+        "Reference",
+        "Selector",
+        "Selector",
+        "Numeric",
+        "Date",
+    ],
+    "datagrid_002_policies_2000_rows_various_columns.csv": [
+        "Reference",
+        "Numeric",
+        "Numeric",
+        "Date",
+        "Selector",
+    ],
+    "datagrid_003_web_visits_mobile_social_media_1500_rows_all_columns.csv": [
+        "Reference",
+        "Text",
+        "DateTime",
+        "Selector",
+        "Numeric",
+        "Selector",
+    ],
+    "datagrid_004_bookings_with_households_selection.csv": [
+        "Reference",
+        "Selector",
+        "Date",
+        "Selector",
+        "Numeric",
+    ],
+    "datagrid_005_bookings_with_mixed_columns.csv": [
+        "Reference",
+        "Selector",
+        "Selector",
+        "Date",
+        "Selector",
+    ],
+}
+
+
+def load_datagrid(filename, rows):
+    """Create a data grid holding the reference data as rows of strings."""
+    with open(DATA_DIR / filename, newline="", encoding="utf-8-sig") as f:
+        header, *data = list(csv.reader(f))
+    column_types = COLUMN_TYPES[filename]
+    date_columns = [
+        i
+        for i, column_type in enumerate(column_types)
+        if column_type in ("Date", "DateTime")
+    ]
+    for row in data:
+        for i in date_columns:
+            # the API returns dates with '-' separators
+            row[i] = row[i].replace("/", "-")
+    data = [tuple(row) for row in data]
+    datagrid = DataGrid.__new__(DataGrid)
+    datagrid.columns = [
+        Mock(description=description, type=column_type)
+        for description, column_type in zip(header, column_types)
+    ]
+    for i, column in enumerate(datagrid.columns):
+        # give selector columns the categories in the data as their var codes
+        column.values.descriptions = sorted({row[i] for row in data})
+    datagrid._data = (data * (rows // len(data) + 1))[:rows]
+    datagrid.export_codes = False
+    return datagrid
+
+
+def previous_convert_column(data, column_type):
+    """Convert a column the way ``DataGrid._convert_column()`` used to."""
+    if column_type in ("Selector", "Text", "Reference"):
+        return data.astype(str)
+    elif column_type == "Numeric":
+        return pd.to_numeric(data)
+    elif column_type == "Date":
+        return pd.to_datetime(data, format="%d-%m-%Y", errors="coerce").dt.date
+    elif column_type == "DateTime":
+        return pd.to_datetime(data, format="%d-%m-%Y %H:%M:%S", errors="coerce")
+
+
+def previous_to_df(datagrid):
+    """Convert the rows into a DataFrame the way ``to_df()`` used to."""
+    df = pd.DataFrame(datagrid._data, columns=[v.description for v in datagrid.columns])
+    for i, v in enumerate(datagrid.columns):
+        df.iloc[:, i] = previous_convert_column(df.iloc[:, i], v.type)
+    return df
+
+
+def measure(to_df, datagrid, repeat):
+    """Return the average seconds and the peak bytes allocated by ``to_df``."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        to_df(datagrid)
+    seconds = (time.perf_counter() - start) / repeat
+    gc.collect()
+    tracemalloc.start()
+    to_df(datagrid)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def frame_size(df):
+    """Return the bytes used by a DataFrame, including the strings it holds."""
+    return df.memory_usage(deep=True).sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"{'Data grid':<16}{'previous ms':>13}{'to_df ms':>10}{'speedup':>9}"
+        f"{'previous MiB':>14}{'to_df MiB':>11}"
+        f"{'frame MiB':>11}{'categorical':>13}"
+    )
+    for filename in COLUMN_TYPES:
+        datagrid = load_datagrid(filename, args.rows)
+        pd.testing.assert_frame_equal(datagrid.to_df(), previous_to_df(datagrid))
+        old_seconds, old_peak = measure(previous_to_df, datagrid, args.repeat)
+        new_seconds, new_peak = measure(DataGrid.to_df, datagrid, args.repeat)
+        print(
+            f"{filename[:12]:<16}{old_seconds * 1000:>13.1f}{new_seconds * 1000:>10.1f}"
+            f"{old_seconds / new_seconds:>8.1f}x"
+            f"{old_peak / 2 ** 20:>14.1f}{new_peak / 2 ** 20:>11.1f}"
+            f"{frame_size(datagrid.to_df()) / 2 ** 20:>11.1f}"
+            f"{frame_size(datagrid.to_df(categorical=True)) / 2 ** 20:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
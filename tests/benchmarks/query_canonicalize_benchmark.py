@@ -0,0 +1,232 @@
+"""Measure the effect of canonicalizing clauses before sending them to the API.
+
+Builds selections the way user code typically does, with ``|``, ``&``, ``~``
+and repeated table changes, and compares the query sent to the API
+with and without canonicalization: its size, the number of clause nodes
+the server has to evaluate, and the time taken to build and serialize it.
+No API calls are made, so server-side time is not measured, but it scales
+with the number of clause nodes. Run from the repository root with::
+
+    python tests/benchmarks/query_canonicalize_benchmark.py [--repeat N]
+
+"""
+
+import argparse
+import json
+import time
+
+import apteco_api as aa
+
+from apteco.tables import Table
+from apteco.variables import NumericVariable, SelectorVariable
+
+
+def make_tables():
+    households = Table(
+        "Households",
+        "household",
+        "households",
+        False,
+        False,
+        100,
+        "",
+        "",
+        True,
+        "",
+        None,
+        [],
+        [],
+        [],
+        [],
+    )
+    people = Table(
+        "People",
+        "person",
+        "people",
+        False,
+        True,
+        250,
+        "",
+        "",
+        True,
+        "Households",
+        households,
+        [],
+        [households],
+        [],
+        [],
+    )
+    bookings = Table(
+        "Bookings",
+        "booking",
+        "bookings",
+        True,
+        False,
+        1000,
+        "",
+        "",
+        False,
+        "People",
+        people,
+        [],
+        [people, households],
+        [],
+        [],
+    )
+    households.children = [people]
+    households.descendants = [people, bookings]
+    people.children = [bookings]
+    people.descendants = [bookings]
+    return households, people, bookings
+
+
+def make_variable(variable_class, name, table, **info):
+    kwargs = {
+        "selector_info": None,
+        "numeric_info": None,
+        "text_info": None,
+        "reference_info": None,
+        **info,
+    }
+    return variable_class(
+        name=name,
+        description=name,
+        type="Selector",
+        folder_name="Folder",
+        table=table,
+        is_selectable=True,
+        is_browsable=True,
+        is_exportable=True,
+        is_virtual=False,
+        session=None,
+        **kwargs,
+    )
+
+
+def make_scenarios():
+    households, people, bookings = make_tables()
+    selector_info = aa.SelectorVariableInfo(
+        selector_type="SingleValue", sub_type="Categorical", number_of_codes=100
+    )
+    numeric_info = aa.NumericVariableInfo(minimum=0, maximum=10_000)
+    destinations = make_variable(
+        SelectorVariable, "boDest", bookings, selector_info=selector_info
+    )
+    products = make_variable(
+        SelectorVariable, "boProd", bookings, selector_info=selector_info
+    )
+    cost = make_variable(NumericVariable, "boCost", bookings, numeric_info=numeric_info)
+    sources = make_variable(
+        SelectorVariable, "peSource", people, selector_info=selector_info
+    )
+
+    def or_chain(clauses):
+        result = clauses[0]
+        for clause in clauses[1:]:
+            result = result | clause
+        return result
+
+    def and_chain(clauses):
+        result = clauses[0]
+        for clause in clauses[1:]:
+            result = result & clause
+        return result
+
+    def round_trips(clause, count):
+        for _ in range(count):
+            clause = clause * people * bookings
+        return clause * people
+
+    return {
+        "OR of 100 codes": or_chain(
+            [
+                variable == f"{i:02d}"
+                for i in range(50)
+                for variable in (destinations, products)
+            ]
+        ),
+        "AND of 60 exclusions": and_chain(
+            [destinations != f"{i:02d}" for i in range(30)]
+            + [cost != i * 100 for i in range(30)]
+        ),
+        "20 table round trips": round_trips((destinations == "01") & (cost > 500), 20),
+        "repeated criteria": or_chain(
+            [
+                ((destinations == "01") & (sources == "05")) | (cost < 100)
+                for _ in range(20)
+            ]
+        ),
+    }
+
+
+def raw_selection(clause):
+    """Build the selection model without canonicalizing the clause."""
+    return aa.Selection(
+        table_name=clause.table_name,
+        ancestor_counts=True,
+        rule=aa.Rule(clause=clause._to_model_clause()),
+    )
+
+
+def serialize(api_client, selection):
+    return json.dumps(
+        api_client.sanitize_for_serialization(aa.Query(selection=selection))
+    )
+
+
+def count_nodes(data):
+    """Count the criteria and logic nodes in a serialized query."""
+    if isinstance(data, dict):
+        own = int("criteria" in data) + int("logic" in data)
+        return own + sum(count_nodes(value) for value in data.values())
+    if isinstance(data, list):
+        return sum(count_nodes(item) for item in data)
+    return 0
+
+
+def time_first_build(build, repeat):
+    """Return the average seconds taken by ``build`` on freshly created clauses.
+
+    Clauses cache their compiled models, so new ones are made for each run.
+
+    """
+    total = 0
+    for _ in range(repeat):
+        scenarios = make_scenarios()
+        start = time.perf_counter()
+        for clause in scenarios.values():
+            build(clause)
+        total += time.perf_counter() - start
+    return total / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    api_client = aa.ApiClient()
+
+    print(f"{'Selection':<24}{'bytes':>10}{'canon.':>10}{'nodes':>8}{'canon.':>8}")
+    for name, clause in make_scenarios().items():
+        raw = serialize(api_client, raw_selection(clause))
+        canonical = serialize(api_client, clause._to_model_selection())
+        print(
+            f"{name:<24}{len(raw):>10,}{len(canonical):>10,}"
+            f"{count_nodes(json.loads(raw)):>8,}"
+            f"{count_nodes(json.loads(canonical)):>8,}"
+        )
+    raw_time = time_first_build(
+        lambda clause: serialize(api_client, raw_selection(clause)), args.repeat
+    )
+    canonical_time = time_first_build(
+        lambda clause: serialize(api_client, clause._to_model_selection()),
+        args.repeat,
+    )
+    print(
+        f"\nBuilding and serializing all queries: {raw_time * 1000:.2f} ms,"
+        f" canonicalized: {canonical_time * 1000:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
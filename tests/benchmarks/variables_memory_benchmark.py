@@ -0,0 +1,331 @@
+"""Measure the memory used by py-apteco variable and table objects.
+
+Creates a large number of variables of each type, as a session does
+when it is initialized, and reports the average memory allocated
+per object, both for the current classes, which use ``__slots__``
+and create date accessors on first use, and for the previous classes,
+which stored their attributes in a ``__dict__`` and created
+the date accessors up front. Run from the repository root with::
+
+    python tests/benchmarks/variables_memory_benchmark.py [--count N]
+
+"""
+
+import argparse
+import gc
+import tracemalloc
+from datetime import datetime
+
+import apteco_api as aa
+
+from apteco.common import VariableType
+from apteco.tables import Table
+from apteco.variables import (
+    ArrayVariable,
+    DateTimeVariable,
+    DateVariable,
+    FlagArrayVariable,
+    NumericVariable,
+    ReferenceVariable,
+    SelectorVariable,
+    TextVariable,
+)
+
+
+def selector_info(selector_type="SingleValue", sub_type="Categorical", dates=False):
+    return aa.SelectorVariableInfo(
+        selector_type=selector_type,
+        sub_type=sub_type,
+        var_code_order="Nominal",
+        number_of_codes=12,
+        code_length=4,
+        minimum_var_code_count=10,
+        maximum_var_code_count=1000,
+        minimum_date=datetime(2000, 1, 1) if dates else None,
+        maximum_date=datetime(2020, 12, 31) if dates else None,
+    )
+
+
+class PreviousVariable:
+    """Variable storing its attributes in a ``__dict__``, as ``Variable`` used to."""
+
+    variable_type = None
+
+    def __init__(
+        self,
+        name,
+        description,
+        type,
+        folder_name,
+        table,
+        is_selectable,
+        is_browsable,
+        is_exportable,
+        is_virtual,
+        *,
+        session=None,
+        **kwargs,
+    ):
+        self.name = name
+        self.description = description
+        self._model_type = type
+        self.folder_name = folder_name
+        self.table = table
+        self.is_selectable = is_selectable
+        self.is_browsable = is_browsable
+        self.is_exportable = is_exportable
+        self.is_virtual = is_virtual
+        self.session = session
+        self.type = self.variable_type
+
+
+class PreviousSelectorVariable(PreviousVariable):
+    variable_type = VariableType.SELECTOR
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        selector_info = kwargs["selector_info"]
+        self.code_length = selector_info.code_length
+        self.num_codes = selector_info.number_of_codes
+        self.var_code_min_count = selector_info.minimum_var_code_count
+        self.var_code_max_count = selector_info.maximum_var_code_count
+        self.var_code_order = selector_info.var_code_order
+        self.selector_type = selector_info.selector_type
+        self.sub_type = selector_info.sub_type
+        self.combined_from = selector_info.combined_from_variable_name
+
+
+class PreviousNumericVariable(PreviousVariable):
+    variable_type = VariableType.NUMERIC
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        numeric_info = kwargs["numeric_info"]
+        self.min_value = numeric_info.minimum
+        self.max_value = numeric_info.maximum
+        self.is_currency = numeric_info.is_currency
+        self.currency_locale = numeric_info.currency_locale
+        self.currency_symbol = numeric_info.currency_symbol
+
+
+class PreviousTextVariable(PreviousVariable):
+    variable_type = VariableType.TEXT
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.max_length = kwargs["text_info"].maximum_text_length
+
+
+class PreviousArrayVariable(PreviousSelectorVariable):
+    variable_type = VariableType.ARRAY
+
+
+class PreviousFlagArrayVariable(PreviousSelectorVariable):
+    variable_type = VariableType.FLAG_ARRAY
+
+
+class PreviousDateAccessor:
+    """Date banding storing its attributes in a ``__dict__``."""
+
+    def __init__(self, variable, banding):
+        self.variable = variable
+        self.table = variable.table
+        self.banding = banding
+        self.type = VariableType.BANDED_DATE
+        self.name = f"{variable.name}_{banding.rstrip('s')}"
+        self.description = f"{variable.description} ({banding.rstrip('s')})"
+
+
+class PreviousDateVariable(PreviousSelectorVariable):
+    variable_type = VariableType.DATE
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        selector_info = kwargs["selector_info"]
+        self.min_date = selector_info.minimum_date
+        self.max_date = selector_info.maximum_date
+        self.year = PreviousDateAccessor(self, "Years")
+        self.quarter = PreviousDateAccessor(self, "Quarters")
+        self.month = PreviousDateAccessor(self, "Months")
+        self.day = PreviousDateAccessor(self, "Day")
+
+
+class PreviousDateTimeVariable(PreviousDateVariable):
+    variable_type = VariableType.DATETIME
+
+
+class PreviousReferenceVariable(PreviousVariable):
+    variable_type = VariableType.REFERENCE
+
+
+class PreviousTable:
+    """Table storing its attributes in a ``__dict__``, as ``Table`` used to."""
+
+    def __init__(
+        self,
+        name,
+        singular,
+        plural,
+        is_default,
+        is_people,
+        total_records,
+        child_relationship,
+        parent_relationship,
+        has_children,
+        parent_name,
+        parent,
+        children,
+        ancestors,
+        descendants,
+        variables,
+        *,
+        session=None,
+    ):
+        self.name = name
+        self.singular = singular
+        self.plural = plural
+        self.is_default = is_default
+        self.is_people = is_people
+        self.total_records = total_records
+        self.child_relationship = child_relationship
+        self.parent_relationship = parent_relationship
+        self.has_children = has_children
+        self.parent_name = parent_name
+        self.parent = parent
+        self.children = children
+        self.ancestors = ancestors
+        self.descendants = descendants
+        self._variables = variables
+        self.session = session
+        self.table = self
+        self._name = self.name
+
+
+VARIABLE_TYPES = {
+    "Selector": (
+        SelectorVariable,
+        PreviousSelectorVariable,
+        {"selector_info": selector_info()},
+    ),
+    "Numeric": (
+        NumericVariable,
+        PreviousNumericVariable,
+        {
+            "numeric_info": aa.NumericVariableInfo(
+                minimum=0,
+                maximum=1000,
+                is_currency=True,
+                currency_locale="en-GB",
+                currency_symbol="£",
+            )
+        },
+    ),
+    "Text": (
+        TextVariable,
+        PreviousTextVariable,
+        {"text_info": aa.TextVariableInfo(maximum_text_length=80)},
+    ),
+    "Array": (
+        ArrayVariable,
+        PreviousArrayVariable,
+        {"selector_info": selector_info("OrArray")},
+    ),
+    "FlagArray": (
+        FlagArrayVariable,
+        PreviousFlagArrayVariable,
+        {"selector_info": selector_info("OrBitArray")},
+    ),
+    "Date": (
+        DateVariable,
+        PreviousDateVariable,
+        {"selector_info": selector_info(sub_type="Date", dates=True)},
+    ),
+    "DateTime": (
+        DateTimeVariable,
+        PreviousDateTimeVariable,
+        {"selector_info": selector_info(sub_type="DateTime", dates=True)},
+    ),
+    "Reference": (ReferenceVariable, PreviousReferenceVariable, {"reference_info": {}}),
+}
+
+
+def make_table(name, table_class=Table):
+    return table_class(
+        name, "item", "items", True, True, 1000, "", "", False, "", None, [], [], [], []
+    )
+
+
+def make_variables(variable_class, info, table, count):
+    kwargs = {
+        "selector_info": None,
+        "numeric_info": None,
+        "text_info": None,
+        "reference_info": None,
+        **info,
+    }
+    return [
+        variable_class(
+            # distinct strings, as names and descriptions are in a real system
+            name=f"var{i:06d}",
+            description=f"Variable number {i:06d}",
+            type="Selector",
+            folder_name="Folder",
+            table=table,
+            is_selectable=True,
+            is_browsable=True,
+            is_exportable=True,
+            is_virtual=False,
+            session=None,
+            **kwargs,
+        )
+        for i in range(count)
+    ]
+
+
+def measure(create, count):
+    """Return the average number of bytes allocated per object by ``create``."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = create()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(objects) == count
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=20_000)
+    args = parser.parse_args()
+    table = make_table("Table")
+
+    results = {}
+    for type_name, (variable_class, previous_class, info) in VARIABLE_TYPES.items():
+        results[type_name] = [
+            measure(
+                lambda: make_variables(cls, info, table, args.count),
+                args.count,
+            )
+            for cls in (previous_class, variable_class)
+        ]
+    results["Table"] = [
+        measure(
+            lambda: [make_table(f"Table{i:06d}", cls) for i in range(args.count)],
+            args.count,
+        )
+        for cls in (PreviousTable, Table)
+    ]
+
+    print(f"{'Object':<12}{'before':>10}{'after':>10}")
+    for type_name, (before, after) in results.items():
+        print(f"{type_name:<12}{before:>10,.0f}{after:>10,.0f}")
+    variable_sizes = [sizes for name, sizes in results.items() if name != "Table"]
+    mean_before, mean_after = (
+        sum(sizes) / len(variable_sizes) for sizes in zip(*variable_sizes)
+    )
+    print(f"{'Variable avg':<12}{mean_before:>10,.0f}{mean_after:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
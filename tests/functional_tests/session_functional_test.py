@@ -113,7 +113,17 @@ class TestSession:
             "my_user_object",
         )
         patched_session.assert_called_once_with(
-            "my_credentials_object", "fake_system_name"
+            "my_credentials_object",
+            "fake_system_name",
+            count_cache=None,
+            var_code_cache=True,
+            variables_per_page=1000,
+            max_workers=4,
+            lazy_variables=False,
+            pool_maxsize=None,
+            keep_alive=True,
+            timeout=None,
+            reuse_tls_context=True,
         )
 
     def test_deserialize_session_with_bad_credentials_dict(
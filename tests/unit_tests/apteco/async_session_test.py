@@ -0,0 +1,181 @@
+import asyncio
+import json
+import ssl
+import sys
+from unittest.mock import AsyncMock, MagicMock, Mock
+
+import apteco_api as aa
+import pytest
+
+from apteco.async_session import AsyncSession
+
+
+@pytest.fixture()
+def fake_session():
+    return Mock(
+        base_url="https://example.com/OrbitAPI",
+        data_view="holidays view",
+        system="holidays",
+        access_token="token of my gratitude",
+        api_client=aa.ApiClient(),
+    )
+
+
+@pytest.fixture()
+def async_session(fake_session):
+    return AsyncSession(fake_session)
+
+
+def make_fake_client_session(status, reason, body):
+    response = Mock(status=status, reason=reason)
+    response.text = AsyncMock(return_value=body)
+    response_context = MagicMock()
+    response_context.__aenter__.return_value = response
+    return Mock(post=Mock(return_value=response_context), close=AsyncMock())
+
+
+class TestAsyncSession:
+    def test_init(self, fake_session):
+        async_session = AsyncSession(
+            fake_session, limit=500, limit_per_host=200, timeout=(5, 60)
+        )
+        assert async_session.session is fake_session
+        assert async_session.limit == 500
+        assert async_session.limit_per_host == 200
+        assert async_session.timeout == (5, 60)
+        assert async_session._client_session is None
+
+    @pytest.mark.parametrize(
+        "kwargs, message",
+        [
+            ({"limit": 0}, "limit must be an integer of at least 1"),
+            ({"limit_per_host": -1}, "limit_per_host must be an integer of at least 0"),
+            (
+                {"timeout": -5},
+                "timeout must be a number greater than 0"
+                " or a (connect, read) tuple of these",
+            ),
+        ],
+    )
+    def test_init_bad_settings(self, fake_session, kwargs, message):
+        with pytest.raises(ValueError) as exc_info:
+            AsyncSession(fake_session, **kwargs)
+        assert exc_info.value.args[0] == message
+
+    def test_count(self, async_session):
+        clause = Mock(count_async=AsyncMock(return_value=1234))
+        assert asyncio.run(async_session.count(clause)) == 1234
+        clause.count_async.assert_awaited_once_with(async_session)
+
+    def test_datagrid(self, mocker, async_session):
+        patch_fetch_async = mocker.patch(
+            "apteco.async_session.DataGrid.fetch_async",
+            AsyncMock(return_value="my datagrid"),
+        )
+        result = asyncio.run(
+            async_session.datagrid(["columns"], table="my table", export_codes=True)
+        )
+        assert result == "my datagrid"
+        patch_fetch_async.assert_awaited_once_with(
+            ["columns"],
+            None,
+            "my table",
+            1000,
+            session=async_session,
+            export_codes=True,
+        )
+
+    def test_cube(self, mocker, async_session):
+        patch_fetch_async = mocker.patch(
+            "apteco.async_session.Cube.fetch_async",
+            AsyncMock(return_value="my cube"),
+        )
+        result = asyncio.run(
+            async_session.cube(["dimensions"], selection="my sel", sparse=True)
+        )
+        assert result == "my cube"
+        patch_fetch_async.assert_awaited_once_with(
+            ["dimensions"], None, "my sel", None, session=async_session, sparse=True
+        )
+
+    def test_post(self, async_session):
+        response_body = json.dumps(
+            {
+                "ranSuccessfully": True,
+                "counts": [{"tableName": "Bookings", "countValue": 250}],
+            }
+        )
+        client_session = make_fake_client_session(200, "OK", response_body)
+        async_session._client_session = client_session
+        query = aa.Query(selection=aa.Selection(table_name="Bookings"))
+        result = asyncio.run(
+            async_session._post("Queries", "CountSync", query, "QueryResult")
+        )
+        assert isinstance(result, aa.QueryResult)
+        assert result.counts[0].count_value == 250
+        (url,) = client_session.post.call_args.args
+        assert url == (
+            "https://example.com/OrbitAPI/holidays%20view/Queries/holidays/CountSync"
+        )
+        kwargs = client_session.post.call_args.kwargs
+        assert json.loads(kwargs["data"]) == {"selection": {"tableName": "Bookings"}}
+        assert kwargs["headers"]["Authorization"] == "Bearer token of my gratitude"
+        assert kwargs["headers"]["Content-Type"] == "application/json"
+
+    def test_post_error(self, async_session):
+        async_session._client_session = make_fake_client_session(
+            403, "Forbidden", "Not allowed"
+        )
+        query = aa.Query(selection=aa.Selection(table_name="Bookings"))
+        with pytest.raises(aa.ApiException) as exc_info:
+            asyncio.run(
+                async_session._post("Queries", "CountSync", query, "QueryResult")
+            )
+        assert exc_info.value.status == 403
+        assert exc_info.value.reason == "Forbidden"
+        assert exc_info.value.body == "Not allowed"
+
+    def test_close(self, async_session):
+        client_session = make_fake_client_session(200, "OK", "{}")
+        async_session._client_session = client_session
+
+        async def use_session():
+            async with async_session as s:
+                assert s is async_session
+
+        asyncio.run(use_session())
+        client_session.close.assert_awaited_once_with()
+        assert async_session._client_session is None
+
+    def test_get_client_session_without_aiohttp(self, mocker, async_session):
+        mocker.patch.dict(sys.modules, {"aiohttp": None})
+        with pytest.raises(ImportError) as exc_info:
+            async_session._get_client_session()
+        assert exc_info.value.args[0] == (
+            "aiohttp is required to make asynchronous requests:"
+            " install it with `pip install aiohttp`"
+        )
+
+    def test_create_ssl_context(self, async_session):
+        ssl_context = async_session._create_ssl_context()
+        assert isinstance(ssl_context, ssl.SSLContext)
+        assert ssl_context.verify_mode == ssl.CERT_REQUIRED
+
+    def test_create_ssl_context_no_verify(self, async_session):
+        async_session.session.api_client.configuration.verify_ssl = False
+        assert async_session._create_ssl_context() is False
+
+    @pytest.mark.parametrize(
+        "timeout, expected_kwargs",
+        [
+            (None, {"total": None}),
+            (30, {"total": 30}),
+            ((5, 60), {"total": None, "connect": 5, "sock_read": 60}),
+        ],
+    )
+    def test_create_client_timeout(self, async_session, timeout, expected_kwargs):
+        fake_aiohttp = Mock()
+        async_session.timeout = timeout
+        result = async_session._create_client_timeout(fake_aiohttp)
+        assert result is fake_aiohttp.ClientTimeout.return_value
+        fake_aiohttp.ClientTimeout.assert_called_once_with(**expected_kwargs)
@@ -0,0 +1,455 @@
+import json
+import logging
+import threading
+from datetime import datetime
+
+import apteco_api as aa
+import pytest
+
+from apteco.cache import (
+    CachedMetadata,
+    CacheStats,
+    CountCache,
+    MetadataCache,
+    SelectorValues,
+    VarCodeCache,
+    deserialize_models,
+    fetch_build_date,
+    fetch_selector_values,
+    fingerprint_models,
+    get_selector_values,
+    serialize_models,
+)
+from apteco.exceptions import ApiResultsError
+
+
+@pytest.fixture()
+def raw_tables():
+    return [
+        aa.Table(
+            name="Clients",
+            singular_display_name="Client",
+            plural_display_name="Clients",
+            is_default_table=True,
+            is_people_table=True,
+            total_records=1000,
+            child_relationship_name="",
+            parent_relationship_name="",
+            has_child_tables=True,
+            parent_table="",
+        ),
+        aa.Table(
+            name="Products",
+            singular_display_name="Product",
+            plural_display_name="Products",
+            is_default_table=False,
+            is_people_table=False,
+            total_records=3000,
+            child_relationship_name="bought",
+            parent_relationship_name="bought by",
+            has_child_tables=False,
+            parent_table="Clients",
+        ),
+    ]
+
+
+@pytest.fixture()
+def raw_variables(ins_aa_sel_var_gender, ins_aa_num_var_prem, ins_aa_dat_var_payrcvd):
+    return [ins_aa_sel_var_gender, ins_aa_num_var_prem, ins_aa_dat_var_payrcvd]
+
+
+@pytest.fixture()
+def fake_session(mocker):
+    return mocker.Mock(
+        base_url="https://example.com/OrbitAPI",
+        data_view="insurance_view",
+        system="insurance",
+        system_info=mocker.Mock(build_date=datetime(2020, 2, 20, 20, 20, 20)),
+        api_client=aa.ApiClient(),
+    )
+
+
+def test_serialize_deserialize_models(raw_tables, raw_variables):
+    api_client = aa.ApiClient()
+    tables_data = serialize_models(api_client, raw_tables)
+    variables_data = serialize_models(api_client, raw_variables)
+    assert json.loads(json.dumps(tables_data)) == tables_data
+    assert tables_data[1]["parentTable"] == "Clients"
+    assert deserialize_models(api_client, tables_data, "Table") == raw_tables
+    assert deserialize_models(api_client, variables_data, "Variable") == raw_variables
+
+
+class TestMetadataCache:
+    def test_load_empty_cache(self, tmp_path, fake_session):
+        cache = MetadataCache(tmp_path / "not yet created")
+        assert cache.load(fake_session) is None
+
+    def test_save_and_load(self, tmp_path, fake_session, raw_tables, raw_variables):
+        cache = MetadataCache(tmp_path / "cache")
+        cache.save(fake_session, raw_tables, raw_variables)
+        (cache_file,) = (tmp_path / "cache").iterdir()
+        assert cache_file.suffix == ".json"
+        result = cache.load(fake_session)
+        assert isinstance(result, CachedMetadata)
+        assert result.raw_tables == raw_tables
+        assert result.raw_variables == raw_variables
+
+    def test_load_build_date_changed(
+        self, tmp_path, fake_session, raw_tables, raw_variables
+    ):
+        cache = MetadataCache(tmp_path)
+        cache.save(fake_session, raw_tables, raw_variables)
+        fake_session.system_info.build_date = datetime(2021, 1, 1, 9, 0, 0)
+        assert cache.load(fake_session) is None
+
+    def test_load_different_system(
+        self, tmp_path, fake_session, raw_tables, raw_variables
+    ):
+        cache = MetadataCache(tmp_path)
+        cache.save(fake_session, raw_tables, raw_variables)
+        fake_session.data_view = "another_view"
+        assert cache.load(fake_session) is None
+
+    def test_save_replaces_entry(
+        self, tmp_path, fake_session, raw_tables, raw_variables
+    ):
+        cache = MetadataCache(tmp_path)
+        cache.save(fake_session, raw_tables, raw_variables)
+        fake_session.system_info.build_date = datetime(2021, 1, 1, 9, 0, 0)
+        cache.save(fake_session, raw_tables[:1], raw_variables[:1])
+        assert len(list(tmp_path.iterdir())) == 1
+        result = cache.load(fake_session)
+        assert result.raw_tables == raw_tables[:1]
+        assert result.raw_variables == raw_variables[:1]
+
+    def test_load_corrupt_file(
+        self, tmp_path, fake_session, raw_tables, raw_variables, caplog
+    ):
+        cache = MetadataCache(tmp_path)
+        cache.save(fake_session, raw_tables, raw_variables)
+        (cache_file,) = tmp_path.iterdir()
+        cache_file.write_text('{"version": 1, "key": ', encoding="utf-8")
+        with caplog.at_level(logging.WARNING):
+            assert cache.load(fake_session) is None
+        assert "Could not read metadata cache file" in caplog.text
+
+
+@pytest.fixture()
+def fake_clock(mocker):
+    clock = mocker.Mock(return_value=1000.0)
+    mocker.patch("apteco.cache.time.monotonic", clock)
+    return clock
+
+
+@pytest.fixture()
+def patch_fetch_build_date(mocker):
+    return mocker.patch(
+        "apteco.cache.fetch_build_date", return_value=datetime(2020, 2, 20, 20, 20, 20)
+    )
+
+
+def test_fetch_build_date(fake_session, mocker):
+    patch_system_api = mocker.patch("apteco.cache.aa.FastStatsSystemsApi")
+    get_system = patch_system_api.return_value.fast_stats_systems_get_fast_stats_system
+    get_system.return_value = mocker.Mock(
+        fast_stats_build_date=datetime(2021, 1, 1, 9, 0, 0)
+    )
+    assert fetch_build_date(fake_session) == datetime(2021, 1, 1, 9, 0, 0)
+    get_system.assert_called_once_with("insurance_view", "insurance")
+    assert fake_session.system_info.build_date == datetime(2020, 2, 20, 20, 20, 20)
+
+
+def test_fingerprint_models_canonical():
+    api_client = aa.ApiClient()
+    selection_1 = aa.Selection(table_name="Clients", ancestor_counts=True)
+    selection_2 = aa.Selection(ancestor_counts=True, table_name="Clients")
+    assert fingerprint_models(api_client, selection_1) == fingerprint_models(
+        api_client, selection_2
+    )
+    selection_3 = aa.Selection(table_name="Products", ancestor_counts=True)
+    assert fingerprint_models(api_client, selection_1) != fingerprint_models(
+        api_client, selection_3
+    )
+    assert fingerprint_models(api_client, {"a": 1, "b": 2}) == fingerprint_models(
+        api_client, {"b": 2, "a": 1}
+    )
+
+
+class TestCountCache:
+    @pytest.fixture()
+    def count_cache(self, fake_clock, patch_fetch_build_date):
+        return CountCache(maxsize=2, ttl=60, build_date_check_interval=30)
+
+    def test_key(self, fake_session):
+        query = aa.Query(selection=aa.Selection(table_name="Clients"))
+        key = CountCache().key(fake_session, query)
+        assert key[:3] == (
+            "https://example.com/OrbitAPI",
+            "insurance_view",
+            "insurance",
+        )
+        assert key[3] == fingerprint_models(fake_session.api_client, query)
+
+    @pytest.mark.parametrize(
+        "kwargs, message",
+        [
+            ({"maxsize": 0}, "maxsize must be an integer greater than 0"),
+            ({"ttl": 0}, "ttl must be a number greater than 0, or None"),
+            (
+                {"build_date_check_interval": -1},
+                "build_date_check_interval must be a non-negative number",
+            ),
+        ],
+    )
+    def test_bad_settings(self, kwargs, message):
+        with pytest.raises(ValueError) as exc_info:
+            CountCache(**kwargs)
+        assert exc_info.value.args[0] == message
+
+    def test_get_and_put(self, count_cache, fake_session):
+        assert count_cache.get("key", fake_session) is None
+        count_cache.put("key", "result", fake_session)
+        assert count_cache.get("key", fake_session) == "result"
+        assert count_cache.stats == CacheStats(
+            hits=1, misses=1, evictions=0, expirations=0, size=1, maxsize=2
+        )
+
+    def test_lru_eviction(self, count_cache, fake_session):
+        count_cache.put("a", 1, fake_session)
+        count_cache.put("b", 2, fake_session)
+        assert count_cache.get("a", fake_session) == 1  # "b" now least recent
+        count_cache.put("c", 3, fake_session)
+        assert count_cache.get("b", fake_session) is None
+        assert count_cache.get("a", fake_session) == 1
+        assert count_cache.get("c", fake_session) == 3
+        assert count_cache.stats.evictions == 1
+        assert count_cache.stats.size == 2
+
+    def test_ttl_expiry(self, count_cache, fake_session, fake_clock):
+        count_cache.put("key", "result", fake_session)
+        fake_clock.return_value = 1059.0
+        assert count_cache.get("key", fake_session) == "result"
+        fake_clock.return_value = 1060.0
+        assert count_cache.get("key", fake_session) is None
+        assert count_cache.stats.expirations == 1
+        assert count_cache.stats.size == 0
+
+    def test_no_ttl(self, fake_session, fake_clock, patch_fetch_build_date):
+        count_cache = CountCache(ttl=None)
+        count_cache.put("key", "result", fake_session)
+        fake_clock.return_value = 1_000_000.0
+        assert count_cache.get("key", fake_session) == "result"
+
+    def test_build_date_changed(
+        self, count_cache, fake_session, fake_clock, patch_fetch_build_date
+    ):
+        count_cache.put("key", "result", fake_session)
+        patch_fetch_build_date.return_value = datetime(2021, 1, 1, 9, 0, 0)
+        fake_clock.return_value = 1029.0  # not checked again yet
+        assert count_cache.get("key", fake_session) == "result"
+        patch_fetch_build_date.assert_not_called()
+        fake_clock.return_value = 1030.0
+        assert count_cache.get("key", fake_session) is None
+        patch_fetch_build_date.assert_called_once_with(fake_session)
+        assert count_cache.stats.size == 0
+        fake_session._fetch_system_info.assert_not_called()
+        assert fake_session.system_info.build_date == datetime(2020, 2, 20, 20, 20, 20)
+
+    def test_build_date_unchanged(
+        self, count_cache, fake_session, fake_clock, patch_fetch_build_date
+    ):
+        count_cache.put("key", "result", fake_session)
+        fake_clock.return_value = 1045.0
+        assert count_cache.get("key", fake_session) == "result"
+        patch_fetch_build_date.assert_called_once_with(fake_session)
+
+    def test_build_date_fetched_without_lock(
+        self, count_cache, fake_session, fake_clock, mocker
+    ):
+        acquired = []
+
+        def try_lock():
+            if count_cache._lock.acquire(blocking=False):
+                count_cache._lock.release()
+                acquired.append(True)
+
+        def fetch_build_date(session):
+            # another thread must be able to use the cache during the request
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+            return session.system_info.build_date
+
+        fetch = mocker.patch(
+            "apteco.cache.fetch_build_date", side_effect=fetch_build_date
+        )
+        count_cache.put("key", "result", fake_session)
+        fake_clock.return_value = 1030.0
+        assert count_cache.get("key", fake_session) == "result"
+        fetch.assert_called_once_with(fake_session)
+        assert acquired == [True]
+
+    def test_clear(self, count_cache, fake_session):
+        count_cache.put("key", "result", fake_session)
+        count_cache.get("key", fake_session)
+        count_cache.clear()
+        assert count_cache.get("key", fake_session) is None
+        assert count_cache.stats == CacheStats(
+            hits=1, misses=1, evictions=0, expirations=0, size=0, maxsize=2
+        )
+
+
+def make_var_codes(*codes):
+    return [
+        aa.VarCode(code=code, description=f"Desc {code}", count=int(code) * 10)
+        for code in codes
+    ]
+
+
+class TestSelectorValues:
+    def test_mapping(self):
+        values = SelectorValues(make_var_codes("02", "01", "03"))
+        assert len(values) == 3
+        assert list(values) == ["02", "01", "03"]
+        assert values["01"] == "Desc 01"
+        assert "04" not in values
+        assert values.codes == ["02", "01", "03"]
+        assert values.descriptions == ["Desc 02", "Desc 01", "Desc 03"]
+        assert values.code_for("Desc 03") == "03"
+        assert values.has_description("Desc 01")
+        assert not values.has_description("01")
+        assert values.count_for("03") == 30
+        with pytest.raises(KeyError):
+            values.count_for("04")
+
+
+@pytest.fixture()
+def patch_var_codes_api(mocker):
+    all_var_codes = make_var_codes(*[f"{i:02}" for i in range(7)])
+
+    def get_var_codes(data_view, system, variable_name, offset, count):
+        page = all_var_codes[offset : offset + count]
+        return aa.PagedResultsVarCode(
+            offset=offset, count=len(page), total_count=7, list=page
+        )
+
+    patched = mocker.patch("apteco.cache.aa.FastStatsSystemsApi")
+    get_codes = patched.return_value.fast_stats_systems_get_fast_stats_variable_codes
+    get_codes.side_effect = get_var_codes
+    return get_codes
+
+
+class TestFetchSelectorValues:
+    def test_fetch_pages(self, fake_session, patch_var_codes_api):
+        fake_session.max_workers = 2
+        values = fetch_selector_values(fake_session, "clGender", per_page=3)
+        assert values.codes == ["00", "01", "02", "03", "04", "05", "06"]
+        offsets = sorted(
+            call.kwargs["offset"] for call in patch_var_codes_api.call_args_list
+        )
+        assert offsets == [0, 3, 6]
+        patch_var_codes_api.assert_any_call(
+            "insurance_view", "insurance", "clGender", offset=0, count=3
+        )
+
+    def test_fetch_single_page(self, fake_session, patch_var_codes_api):
+        fake_session.max_workers = 2
+        values = fetch_selector_values(fake_session, "clGender")
+        assert len(values) == 7
+        patch_var_codes_api.assert_called_once()
+
+    def test_fetch_count_mismatch(self, fake_session, mocker):
+        fake_session.max_workers = 2
+        patched = mocker.patch("apteco.cache.aa.FastStatsSystemsApi")
+        get_codes = (
+            patched.return_value.fast_stats_systems_get_fast_stats_variable_codes
+        )
+        get_codes.return_value = aa.PagedResultsVarCode(
+            offset=0, count=2, total_count=2, list=make_var_codes("01")
+        )
+        with pytest.raises(ApiResultsError) as exc_info:
+            fetch_selector_values(fake_session, "clGender")
+        assert exc_info.value.args[0] == (
+            "API stated there are 2 categories for the variable 'clGender'"
+            " but 1 were returned."
+        )
+
+
+class TestVarCodeCache:
+    @pytest.fixture()
+    def patch_fetch(self, mocker):
+        return mocker.patch(
+            "apteco.cache.fetch_selector_values",
+            side_effect=lambda session, name: SelectorValues(
+                make_var_codes(*name.split(","))
+            ),
+        )
+
+    def test_bad_settings(self):
+        with pytest.raises(ValueError) as exc_info:
+            VarCodeCache(max_codes=0)
+        assert exc_info.value.args[0] == "max_codes must be an integer greater than 0"
+
+    def test_get(self, fake_session, fake_clock, patch_fetch):
+        var_code_cache = VarCodeCache()
+        values = var_code_cache.get(fake_session, "01,02")
+        assert values.codes == ["01", "02"]
+        assert var_code_cache.get(fake_session, "01,02") is values
+        patch_fetch.assert_called_once_with(fake_session, "01,02")
+        assert var_code_cache.stats == CacheStats(
+            hits=1, misses=1, evictions=0, expirations=0, size=2, maxsize=1_000_000
+        )
+
+    def test_eviction_by_number_of_codes(self, fake_session, fake_clock, patch_fetch):
+        var_code_cache = VarCodeCache(max_codes=5)
+        var_code_cache.get(fake_session, "01,02")
+        var_code_cache.get(fake_session, "03,04")
+        var_code_cache.get(fake_session, "01,02")  # "03,04" now least recent
+        var_code_cache.get(fake_session, "05,06,07")
+        assert var_code_cache.stats.evictions == 1
+        assert var_code_cache.stats.size == 5
+        var_code_cache.get(fake_session, "01,02")
+        assert patch_fetch.call_count == 3
+
+    def test_too_many_codes_not_cached(self, fake_session, fake_clock, patch_fetch):
+        var_code_cache = VarCodeCache(max_codes=2)
+        var_code_cache.get(fake_session, "01")
+        assert var_code_cache.get(fake_session, "01,02,03").codes == ["01", "02", "03"]
+        assert var_code_cache.stats.size == 1
+        var_code_cache.get(fake_session, "01,02,03")
+        assert patch_fetch.call_count == 3
+
+    def test_build_date_changed(
+        self, fake_session, fake_clock, patch_fetch, patch_fetch_build_date
+    ):
+        var_code_cache = VarCodeCache(build_date_check_interval=30)
+        var_code_cache.get(fake_session, "01,02")
+        patch_fetch_build_date.return_value = datetime(2021, 1, 1, 9, 0, 0)
+        fake_clock.return_value = 1030.0
+        var_code_cache.get(fake_session, "01,02")
+        patch_fetch_build_date.assert_called_once_with(fake_session)
+        assert patch_fetch.call_count == 2
+        assert var_code_cache.stats.size == 2
+
+    def test_clear(self, fake_session, fake_clock, patch_fetch):
+        var_code_cache = VarCodeCache()
+        var_code_cache.get(fake_session, "01,02")
+        var_code_cache.clear()
+        assert var_code_cache.stats.size == 0
+        var_code_cache.get(fake_session, "01,02")
+        assert patch_fetch.call_count == 2
+
+
+def test_get_selector_values_no_cache(mocker):
+    patch_fetch = mocker.patch("apteco.cache.fetch_selector_values")
+    fake_session = mocker.Mock(var_code_cache=None)
+    result = get_selector_values(fake_session, "clGender")
+    assert result is patch_fetch.return_value
+    patch_fetch.assert_called_once_with(fake_session, "clGender")
+
+
+def test_get_selector_values_cache(mocker):
+    fake_session = mocker.Mock()
+    result = get_selector_values(fake_session, "clGender")
+    assert result is fake_session.var_code_cache.get.return_value
+    fake_session.var_code_cache.get.assert_called_once_with(fake_session, "clGender")
@@ -1,4 +1,7 @@
-from apteco.common import VariableType
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from apteco.common import VariableType, lazy_import
 
 
 def test_variable_type_enum_string_comparison():
@@ -15,3 +18,26 @@ def test_variable_type_enum_string_comparison():
 def test_variable_type_enum_contains_string():
     assert "Array" in VariableType.ARRAY
     assert "Array" in VariableType.FLAG_ARRAY
+
+
+def test_lazy_import(tmp_path, monkeypatch):
+    (tmp_path / "lazily_loaded.py").write_text("LOADED = True\n", encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = lazy_import("lazily_loaded")
+    assert sys.modules["lazily_loaded"] is module
+    assert "LOADED" not in object.__getattribute__(module, "__dict__")
+    assert module.LOADED is True
+    assert lazy_import("lazily_loaded") is module
+    del sys.modules["lazily_loaded"]
+
+
+def test_lazy_import_first_use_from_several_threads(tmp_path, monkeypatch):
+    (tmp_path / "slowly_loaded.py").write_text(
+        "import time\ntime.sleep(0.2)\nLOADED = True\n", encoding="utf-8"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = lazy_import("slowly_loaded")
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: module.LOADED, range(4)))
+    assert results == [True] * 4
+    del sys.modules["slowly_loaded"]
@@ -0,0 +1,187 @@
+import ssl
+
+import apteco_api as aa
+import pytest
+import urllib3
+
+from apteco.connection import (
+    ConnectionOptions,
+    SessionPoolManager,
+    SessionProxyManager,
+    close_api_client,
+    configure_api_client,
+    create_pool_manager,
+    validate_connection_options,
+)
+
+
+@pytest.fixture()
+def api_config():
+    config = aa.Configuration()
+    config.host = "https://example.com/OrbitAPI"
+    return config
+
+
+class TestValidateConnectionOptions:
+    def test_defaults(self):
+        assert validate_connection_options() == ConnectionOptions(
+            pool_maxsize=None, keep_alive=True, timeout=None, reuse_tls_context=True
+        )
+
+    @pytest.mark.parametrize("timeout", [30, 2.5, (3.05, 27), (None, 10), (5, None)])
+    def test_good_timeout(self, timeout):
+        assert validate_connection_options(timeout=timeout).timeout == timeout
+
+    @pytest.mark.parametrize(
+        "timeout", [0, -1, "30", True, (None, None), (1, 2, 3), (1,), [1, 2]]
+    )
+    def test_bad_timeout(self, timeout):
+        with pytest.raises(ValueError) as exc_info:
+            validate_connection_options(timeout=timeout)
+        assert exc_info.value.args[0] == (
+            "timeout must be a number greater than 0 or a (connect, read) tuple of these"
+        )
+
+    @pytest.mark.parametrize("pool_maxsize", [0, 2.0, True, "10"])
+    def test_bad_pool_maxsize(self, pool_maxsize):
+        with pytest.raises(ValueError) as exc_info:
+            validate_connection_options(pool_maxsize=pool_maxsize)
+        assert (
+            exc_info.value.args[0] == "pool_maxsize must be an integer greater than 0"
+        )
+
+    def test_bad_keep_alive(self):
+        with pytest.raises(ValueError) as exc_info:
+            validate_connection_options(keep_alive="yes")
+        assert exc_info.value.args[0] == "keep_alive must be True or False"
+
+
+class TestCreatePoolManager:
+    def test_defaults(self, api_config):
+        pool_manager = create_pool_manager(api_config, ConnectionOptions())
+        assert isinstance(pool_manager, SessionPoolManager)
+        assert pool_manager.default_timeout is None
+        pool_kw = pool_manager.connection_pool_kw
+        assert pool_kw["maxsize"] == api_config.connection_pool_maxsize
+        assert pool_kw["cert_reqs"] == ssl.CERT_REQUIRED
+        assert isinstance(pool_kw["ssl_context"], ssl.SSLContext)
+        assert pool_kw["ssl_context"].verify_mode == ssl.CERT_REQUIRED
+        assert "ca_certs" not in pool_kw
+
+    def test_options(self, api_config):
+        options = ConnectionOptions(
+            pool_maxsize=12, timeout=(3, 60), reuse_tls_context=False
+        )
+        pool_manager = create_pool_manager(api_config, options)
+        pool_kw = pool_manager.connection_pool_kw
+        assert pool_kw["maxsize"] == 12
+        assert "ssl_context" not in pool_kw
+        assert pool_kw["ca_certs"]
+        assert pool_manager.default_timeout.connect_timeout == 3
+        assert pool_manager.default_timeout.read_timeout == 60
+
+    def test_total_timeout(self, api_config):
+        pool_manager = create_pool_manager(api_config, ConnectionOptions(timeout=45))
+        assert pool_manager.default_timeout.total == 45
+
+    def test_no_verify_ssl(self, api_config):
+        api_config.verify_ssl = False
+        pool_manager = create_pool_manager(api_config, ConnectionOptions())
+        pool_kw = pool_manager.connection_pool_kw
+        assert pool_kw["cert_reqs"] == ssl.CERT_NONE
+        assert pool_kw["ssl_context"].check_hostname is False
+
+    def test_shared_ssl_context(self, api_config):
+        pool_manager = create_pool_manager(api_config, ConnectionOptions())
+        pool_1 = pool_manager.connection_from_url("https://example.com/OrbitAPI")
+        pool_2 = pool_manager.connection_from_url("https://example.org/OrbitAPI")
+        assert pool_1 is not pool_2
+        assert pool_1.conn_kw["ssl_context"] is pool_2.conn_kw["ssl_context"]
+
+    def test_proxy(self, api_config):
+        api_config.proxy = "http://proxy.example.com:3128"
+        api_config.proxy_headers = urllib3.make_headers(proxy_basic_auth="jdoe:pw")
+        pool_manager = create_pool_manager(api_config, ConnectionOptions(timeout=30))
+        assert isinstance(pool_manager, SessionProxyManager)
+        assert pool_manager.proxy.host == "proxy.example.com"
+        assert pool_manager.proxy.port == 3128
+        assert pool_manager.proxy_headers == api_config.proxy_headers
+        assert pool_manager.default_timeout.total == 30
+        pool_kw = pool_manager.connection_pool_kw
+        assert pool_kw["cert_reqs"] == ssl.CERT_REQUIRED
+        assert isinstance(pool_kw["ssl_context"], ssl.SSLContext)
+
+
+class TestSessionPoolManager:
+    @pytest.fixture()
+    def patch_urlopen(self, mocker):
+        return mocker.patch.object(
+            urllib3.PoolManager, "urlopen", return_value="response"
+        )
+
+    def test_default_timeout_applied(self, patch_urlopen):
+        timeout = urllib3.Timeout(total=10)
+        pool_manager = SessionPoolManager(default_timeout=timeout)
+        result = pool_manager.urlopen("GET", "https://example.com", timeout=None)
+        assert result == "response"
+        patch_urlopen.assert_called_once_with(
+            "GET", "https://example.com", redirect=True, timeout=timeout
+        )
+
+    def test_request_timeout_kept(self, patch_urlopen):
+        pool_manager = SessionPoolManager(default_timeout=urllib3.Timeout(total=10))
+        request_timeout = urllib3.Timeout(connect=1, read=2)
+        pool_manager.urlopen("GET", "https://example.com", timeout=request_timeout)
+        patch_urlopen.assert_called_once_with(
+            "GET", "https://example.com", redirect=True, timeout=request_timeout
+        )
+
+    def test_no_default_timeout(self, patch_urlopen):
+        pool_manager = SessionPoolManager()
+        pool_manager.urlopen("GET", "https://example.com", timeout=None)
+        patch_urlopen.assert_called_once_with(
+            "GET", "https://example.com", redirect=True, timeout=None
+        )
+
+
+def test_configure_api_client(api_config):
+    api_client = aa.ApiClient(configuration=api_config)
+    configure_api_client(api_client, ConnectionOptions(pool_maxsize=8))
+    assert isinstance(api_client.rest_client.pool_manager, SessionPoolManager)
+    assert api_client.rest_client.pool_manager.connection_pool_kw["maxsize"] == 8
+    assert "Connection" not in api_client.default_headers
+
+
+def test_configure_api_client_defaults(api_config):
+    api_client = aa.ApiClient(configuration=api_config)
+    pool_manager = api_client.rest_client.pool_manager
+    configure_api_client(api_client, ConnectionOptions())
+    assert api_client.rest_client.pool_manager is pool_manager
+
+
+def test_configure_api_client_proxy(api_config):
+    api_config.proxy = "http://proxy.example.com:3128"
+    api_client = aa.ApiClient(configuration=api_config)
+    configure_api_client(api_client, ConnectionOptions(pool_maxsize=8))
+    pool_manager = api_client.rest_client.pool_manager
+    assert isinstance(pool_manager, SessionProxyManager)
+    assert pool_manager.proxy.host == "proxy.example.com"
+    assert pool_manager.connection_pool_kw["maxsize"] == 8
+
+
+def test_configure_api_client_no_keep_alive(api_config):
+    api_client = aa.ApiClient(configuration=api_config)
+    configure_api_client(api_client, ConnectionOptions(keep_alive=False))
+    assert api_client.default_headers["Connection"] == "close"
+
+
+def test_close_api_client(mocker, api_config):
+    api_client = aa.ApiClient(configuration=api_config)
+    configure_api_client(api_client, ConnectionOptions())
+    pool_manager = api_client.rest_client.pool_manager
+    pool_manager.connection_from_url("https://example.com/OrbitAPI")
+    assert len(pool_manager.pools) == 1
+    spy_close = mocker.spy(api_client, "close")
+    close_api_client(api_client)
+    assert len(pool_manager.pools) == 0
+    spy_close.assert_called_once_with()
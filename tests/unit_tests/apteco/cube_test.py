@@ -1,10 +1,13 @@
-from unittest.mock import MagicMock, Mock, call, patch
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 import apteco_api as aa
 import pytest
 from pytest_cases import parametrize_with_cases, case
 
-from apteco.cube import Cube
+from apteco.common import VariableType
+from apteco.cube import Cube, SparseCubeData, _parse_measure, _parse_sparse_measures
+from apteco.exceptions import ApiResultsError
 
 
 @case(id="no_selection")
@@ -75,6 +78,7 @@ def fake_cube(
     cube.selection = rtl_sel_high_value_purchases
     cube.table = rtl_table_purchases
     cube.session = rtl_session
+    cube.sparse = False
     cube._data = fake_cube_data
     cube._sizes = fake_cube_sizes
     cube._headers = fake_cube_headers
@@ -110,47 +114,167 @@ class TestCube:
         patch__check_inputs.assert_called_once_with()
         patch__get_data.assert_called_once_with()
 
-    @patch("pandas.to_numeric")
+    @patch("apteco.cube.Cube._create_cube")
+    @patch("apteco.cube.Cube._get_data")
+    @patch("apteco.cube.Cube._check_inputs")
+    def test_init_lazy(self, patch__check_inputs, patch__get_data, patch__create_cube):
+        patch__create_cube.return_value = "my_cube_request"
+        patch__get_data.return_value = (
+            "my_data",
+            "my_sizes",
+            "my_headers",
+            "my_measure_names",
+        )
+        cube_example = Cube(
+            ["variables", "for", "dimensions"],
+            selection="my_selection",
+            table="my_table",
+            session="my_session",
+            lazy=True,
+        )
+        assert cube_example.pending is True
+        assert cube_example._request == "my_cube_request"
+        patch__get_data.assert_not_called()
+        assert cube_example.execute() is cube_example
+        assert cube_example.pending is False
+        assert cube_example._data == "my_data"
+        assert cube_example._sizes == "my_sizes"
+        assert cube_example._headers == "my_headers"
+        assert cube_example._measure_names == "my_measure_names"
+        cube_example.execute()
+        patch__get_data.assert_called_once_with()
+
+    @patch("apteco.cube.Cube._process_cube")
+    @patch("apteco.cube.Cube._create_cube")
+    @patch("apteco.cube.Cube._check_inputs")
+    def test_fetch_async(
+        self, patch__check_inputs, patch__create_cube, patch__process_cube
+    ):
+        patch__create_cube.return_value = "my_cube"
+        patch__process_cube.return_value = (
+            "my_data",
+            "my_sizes",
+            "my_headers",
+            "my_measure_names",
+        )
+        fake_async_session = Mock(
+            session="my_session", _post=AsyncMock(return_value="my_cube_result")
+        )
+        cube_example = asyncio.run(
+            Cube.fetch_async(
+                ["variables", "for", "dimensions"],
+                table="my_table",
+                session=fake_async_session,
+            )
+        )
+        assert cube_example.dimensions == ["variables", "for", "dimensions"]
+        assert cube_example.measures is None
+        assert cube_example.selection is None
+        assert cube_example.table == "my_table"
+        assert cube_example.session == "my_session"
+        assert cube_example._data == "my_data"
+        assert cube_example._headers == "my_headers"
+        assert cube_example._measure_names == "my_measure_names"
+        assert cube_example._sizes == "my_sizes"
+        patch__check_inputs.assert_called_once_with()
+        fake_async_session._post.assert_awaited_once_with(
+            "Cubes", "CalculateSync", "my_cube", "CubeResult"
+        )
+        patch__process_cube.assert_called_once_with("my_cube_result", False)
+
     @patch("pandas.MultiIndex.from_product")
     @patch("pandas.DataFrame")
     def test_to_df(
         self,
         patch_pd_dataframe,
         patch_pd_mi_fp,
-        patch_pd_to_numeric,
         fake_cube,
         fake_cube_data,
     ):
         patch_pd_dataframe.return_value = "my_cube_df"
         patch_pd_mi_fp.return_value = "multi_index_for_cube_df"
-        patch_pd_to_numeric.side_effect = [
-            "numeric_flattened_cube_data1",
-            "numeric_flattened_cube_data2",
-        ]
         df = fake_cube.to_df(unclassified=True, totals=True)
         assert df == "my_cube_df"
         for d in fake_cube_data:
             d.__getitem__.assert_called_once_with(
                 (slice(0, None), slice(0, None), slice(0, None))
             )
-        patch_pd_to_numeric.assert_has_calls(
-            [
-                call("flattened_cube_data1", errors="coerce"),
-                call("flattened_cube_data2", errors="coerce"),
-            ]
-        )
         patch_pd_mi_fp.assert_called_once_with(
             ["dimension1_descs", "dimension2_descs", "dimension3_descs"],
             names=["Store Type", "Payment Method", "Department"],
         )
         patch_pd_dataframe.assert_called_once_with(
             {
-                "measure_name_1": "numeric_flattened_cube_data1",
-                "measure_name_2": "numeric_flattened_cube_data2",
+                "measure_name_1": "flattened_cube_data1",
+                "measure_name_2": "flattened_cube_data2",
             },
             index="multi_index_for_cube_df",
+            copy=False,
         )
 
+    def test_to_df_reuses_data(self, fake_cube):
+        import numpy as np
+
+        fake_cube.dimensions = fake_cube.dimensions[:1]
+        fake_cube._headers = [{"codes": list("XSFOT"), "descs": list("XSFOT")}]
+        fake_cube._measure_names = ["Purchases"]
+        fake_cube._data = [np.array([0.0, 12.0, 3.0, np.nan, 15.0])]
+        df = fake_cube.to_df(unclassified=True, totals=True)
+        assert df["Purchases"].dtype == np.float64
+        assert np.shares_memory(df["Purchases"].to_numpy(), fake_cube._data[0])
+
+    def test_to_df_sparse(self, fake_cube):
+        import numpy as np
+        import pandas as pd
+
+        fake_cube.dimensions = [
+            Mock(type=VariableType.SELECTOR, description="Store Type"),
+            Mock(type=VariableType.SELECTOR, description="Department"),
+        ]
+        fake_cube._headers = [
+            {
+                "codes": list("XSFOT"),
+                "descs": ["U", "Shop", "Franchise", "Online", "T"],
+            },
+            {"codes": list("XHGT"), "descs": ["U", "Home", "Garden", "T"]},
+        ]
+        fake_cube._measure_names = ["Purchases", "Profit"]
+        purchases = np.zeros((5, 4))
+        purchases[1, 2] = 7
+        purchases[3, 1] = 4
+        purchases[4, 3] = 11
+        profit = np.zeros((5, 4))
+        profit[2, 1] = np.nan
+        profit[3, 1] = 2.5
+        fake_cube._data = [purchases, profit]
+        expected = pd.DataFrame(
+            {"Purchases": [7.0, 0.0, 4.0], "Profit": [0.0, np.nan, 2.5]},
+            index=pd.MultiIndex.from_tuples(
+                [("Shop", "Garden"), ("Franchise", "Home"), ("Online", "Home")],
+                names=["Store Type", "Department"],
+            ),
+        )
+        pd.testing.assert_frame_equal(fake_cube.to_df(sparse=True), expected)
+        fake_cube.sparse = True
+        fake_cube._data = SparseCubeData.from_dense(fake_cube._data)
+        pd.testing.assert_frame_equal(fake_cube.to_df(), expected)
+        dense_df = fake_cube.to_df(sparse=False)
+        assert len(dense_df) == 6
+        pd.testing.assert_frame_equal(dense_df.loc[expected.index], expected)
+
+    def test_to_df_bad_sparse(self, fake_cube):
+        with pytest.raises(ValueError) as exc_info:
+            fake_cube.to_df(sparse="yes")
+        assert exc_info.value.args[0] == "sparse must be True, False or None"
+
+    @patch("apteco.cube.Cube._check_dimensions")
+    def test__check_inputs_bad_sparse(self, patch__check_dimensions, fake_cube):
+        fake_cube.sparse = "yes"
+        with pytest.raises(ValueError) as exc_info:
+            fake_cube._check_inputs()
+        assert exc_info.value.args[0] == "sparse must be True or False"
+        patch__check_dimensions.assert_not_called()
+
     @patch("apteco.cube.Cube._check_dimensions")
     def test__check_inputs(self, patch__check_dimensions, fake_cube):
         fake_cube._check_inputs()
@@ -321,13 +445,29 @@ class TestCube:
             "acme_inc", "retail", cube=expected_cube
         )
 
-    @patch("numpy.array")
+    @patch("apteco.cube.Cube._create_cube")
+    @patch("apteco_api.CubesApi")
+    def test__get_cube_uses_request(
+        self, patch_aa_cubes_api, patch__create_cube, fake_cube
+    ):
+        fake_cubes_calculate_cube_sync = Mock(return_value="your_cube_result")
+        patch_aa_cubes_api.return_value = Mock(
+            cubes_calculate_cube_synchronously=fake_cubes_calculate_cube_sync
+        )
+        fake_cube._request = "my_lazy_cube"
+        assert fake_cube._get_cube() == "your_cube_result"
+        fake_cubes_calculate_cube_sync.assert_called_once_with(
+            "acme_inc", "retail", cube="my_lazy_cube"
+        )
+        patch__create_cube.assert_not_called()
+
     @patch("apteco.cube.Cube._get_cube")
-    def test__get_data(self, patch__get_cube, patch_np_array, fake_cube):
+    def test__get_data(self, patch__get_cube, fake_cube):
+        import numpy as np
+
+        rows = ["\t".join(str(i + 20 * j) for i in range(20)) for j in range(3)]
         fake_cube_result = Mock(
-            measure_results=[
-                Mock(rows=["1\t2\t3", "4\t5\t6", "7\t8\t9"], id="Purchases")
-            ],
+            measure_results=[Mock(rows=rows, id="Purchases")],
             dimension_results=[
                 Mock(
                     header_codes="HO\tGA\tEL\tDI",
@@ -344,9 +484,6 @@ class TestCube:
             ],
         )
         patch__get_cube.return_value = fake_cube_result
-        fake_reshape = Mock(return_value="my_reshaped_data")
-        patch_np_array.return_value = Mock(reshape=fake_reshape)
-        expected_raw_data = ["1", "2", "3", "4", "5", "6", "7", "8", "9"]
         expected_headers = [
             {"codes": ["S", "F", "O"], "descs": ["Shop", "Franchise", "Online"]},
             {
@@ -363,9 +500,121 @@ class TestCube:
 
         data, sizes, headers, measure_names = fake_cube._get_data()
 
-        assert data == ["my_reshaped_data"]
+        assert len(data) == 1
+        assert data[0].dtype == np.float64
+        assert data[0].flags.c_contiguous
+        np.testing.assert_array_equal(
+            data[0], np.arange(60, dtype=np.float64).reshape(expected_sizes)
+        )
         assert sizes == expected_sizes
         assert headers == expected_headers
         assert measure_names == expected_measure_names
-        patch_np_array.assert_called_once_with(expected_raw_data)
-        fake_reshape.assert_called_once_with(expected_sizes)
+
+
+class TestParseMeasure:
+    def test_parse_measure(self):
+        import numpy as np
+
+        result = _parse_measure(["1\t2\t3.5", "0\t-4\t1e3"])
+        assert result.dtype == np.float64
+        np.testing.assert_array_equal(result, [1, 2, 3.5, 0, -4, 1000])
+
+    def test_parse_measure_not_numbers(self):
+        import numpy as np
+
+        result = _parse_measure(["1\t\t3", "N/A\t5\t6"])
+        assert result.dtype == np.float64
+        np.testing.assert_array_equal(result, [1, np.nan, 3, np.nan, 5, 6])
+
+
+class TestSparseCubeData:
+    @pytest.fixture()
+    def dense_data(self):
+        import numpy as np
+
+        purchases = np.zeros((3, 4, 5))
+        purchases[0, 1, 2] = 3
+        purchases[2, 3, 4] = 8
+        purchases[1, 0, 0] = np.nan
+        profit = np.zeros((3, 4, 5))
+        profit[2, 1, 0] = 1.5
+        profit[0, 1, 2] = 0.5
+        return [purchases, profit]
+
+    def test_from_dense(self, dense_data):
+        import numpy as np
+
+        sparse_data = SparseCubeData.from_dense(dense_data)
+        assert sparse_data.shape == (3, 4, 5)
+        assert len(sparse_data) == 4
+        assert sparse_data.coords.dtype == np.uint8
+        np.testing.assert_array_equal(
+            sparse_data.coords, [[0, 1, 2, 2], [1, 0, 1, 3], [2, 0, 0, 4]]
+        )
+        np.testing.assert_array_equal(sparse_data.values[0], [3, np.nan, 0, 8])
+        np.testing.assert_array_equal(sparse_data.values[1], [0.5, 0, 1.5, 0])
+        for dense, expected in zip(sparse_data.to_dense(), dense_data):
+            np.testing.assert_array_equal(dense, expected)
+
+    @pytest.mark.parametrize(
+        "key",
+        [
+            (slice(1, None), slice(None), slice(None)),
+            (slice(None), slice(1, -1), slice(0, 3)),
+            (slice(None, None, -1), slice(None), slice(None, None, 2)),
+            (slice(2, 2), slice(None), slice(None)),
+        ],
+    )
+    def test_getitem(self, dense_data, key):
+        import numpy as np
+
+        sliced = SparseCubeData.from_dense(dense_data)[key]
+        expected = [dense[key] for dense in dense_data]
+        assert sliced.shape == expected[0].shape
+        for dense, expected_dense in zip(sliced.to_dense(), expected):
+            np.testing.assert_array_equal(dense, expected_dense)
+        flat = np.ravel_multi_index(sliced.coords, sliced.shape)
+        assert list(flat) == sorted(flat)
+
+    def test_getitem_bad_key(self, dense_data):
+        sparse_data = SparseCubeData.from_dense(dense_data)
+        with pytest.raises(TypeError) as exc_info:
+            sparse_data[0, 1, 2]
+        assert exc_info.value.args[0] == (
+            "Sparse cube data must be indexed with a slice for each dimension"
+        )
+
+    def test_parse_sparse_measures(self, mocker):
+        import numpy as np
+
+        mocker.patch("apteco.cube.SPARSE_BATCH_CELLS", 8)
+        measure_results = [
+            Mock(rows=["0\t0\t2\t0", "0\t0\t0\t0", "1\t0\tN/A\t0"]),
+            Mock(rows=["0\t5\t0\t0", "0\t0\t0\t0", "0\t0\t0\t6"]),
+        ]
+        sparse_data = _parse_sparse_measures(measure_results, (3, 4))
+        assert sparse_data.shape == (3, 4)
+        np.testing.assert_array_equal(
+            sparse_data.coords, [[0, 0, 2, 2, 2], [1, 2, 0, 2, 3]]
+        )
+        np.testing.assert_array_equal(sparse_data.values[0], [0, 2, 1, np.nan, 0])
+        np.testing.assert_array_equal(sparse_data.values[1], [5, 0, 0, 0, 6])
+
+    def test_parse_sparse_measures_wrong_row_count(self):
+        measure_results = [Mock(rows=["0\t0\t2\t0", "0\t0\t0\t0"], id="Count")]
+        with pytest.raises(ApiResultsError) as exc_info:
+            _parse_sparse_measures(measure_results, (3, 4))
+        assert exc_info.value.args[0] == (
+            "API returned 2 rows for the measure 'Count' but the cube has 3 rows."
+        )
+
+    def test_parse_sparse_measures_ragged_rows(self):
+        measure_results = [
+            Mock(rows=["0\t0\t2\t0", "0\t0\t0", "1\t0\t0\t0\t0"], id="Count")
+        ]
+        with pytest.raises(ApiResultsError) as exc_info:
+            _parse_sparse_measures(measure_results, (3, 4))
+        assert exc_info.value.args[0] == (
+            "API returned a row with 3 cells for the measure 'Count'"
+            " but the cube has 4 cells in each row."
+        )
@@ -1,9 +1,17 @@
-from unittest.mock import MagicMock, Mock, call, patch
+import asyncio
+import sys
+from datetime import date, datetime
+from unittest.mock import AsyncMock, Mock, call, patch
 
 import apteco_api as aa
+import numpy as np
+import pandas as pd
 import pytest
 
-from apteco.datagrid import DataGrid
+from apteco.cache import SelectorValues
+from apteco.common import VariableType
+from apteco.datagrid import DataGrid, _group_codes, _parse_dates
+from apteco.query import BooleanClause, SelectorClause
 
 
 @pytest.fixture()
@@ -25,6 +33,7 @@ def fake_datagrid(
     dg.table = rtl_table_customers
     dg.max_rows = 1234
     dg.session = rtl_session
+    dg.export_codes = False
     dg._data = "my_datagrid_data"
     return dg
 
@@ -48,43 +57,537 @@ class TestDataGrid:
         patch__check_inputs.assert_called_once_with()
         patch__check_inputs.assert_called_once_with()
 
-    @patch("pandas.DataFrame")
-    def test_to_df(self, patch_pd_dataframe, fake_datagrid):
-        fake_getitem = MagicMock(side_effect=["column1", "column2", "column3"])
-        fake_setitem = MagicMock()
-        fake_dataframe = Mock(
-            iloc=MagicMock(__getitem__=fake_getitem, __setitem__=fake_setitem)
+    @patch("apteco.datagrid.DataGrid._create_export")
+    @patch("apteco.datagrid.DataGrid._get_data")
+    @patch("apteco.datagrid.DataGrid._check_inputs")
+    def test_init_lazy(
+        self, patch__check_inputs, patch__get_data, patch__create_export
+    ):
+        patch__create_export.return_value = "my_export"
+        patch__get_data.return_value = "my_datagrid_data"
+        datagrid_example = DataGrid(
+            ["variables", "for", "my", "columns"],
+            "my_selection",
+            "my_table",
+            session="my_session",
+            lazy=True,
+        )
+        assert datagrid_example.pending is True
+        assert datagrid_example._request == "my_export"
+        patch__get_data.assert_not_called()
+        assert datagrid_example._data == "my_datagrid_data"
+        assert datagrid_example.pending is False
+        assert datagrid_example._data == "my_datagrid_data"
+        patch__get_data.assert_called_once_with()
+        patch__create_export.assert_called_once_with()
+
+    @patch("apteco.datagrid.DataGrid._get_data")
+    @patch("apteco.datagrid.DataGrid._check_inputs")
+    def test_init_bad_lazy(self, patch__check_inputs, patch__get_data):
+        with pytest.raises(ValueError) as exc_info:
+            DataGrid(["columns"], session="my_session", lazy="yes")
+        assert exc_info.value.args[0] == "lazy must be True or False"
+        patch__get_data.assert_not_called()
+
+    @patch("apteco.datagrid.DataGrid._create_export")
+    @patch("apteco.datagrid.DataGrid._check_inputs")
+    def test_fetch_async(self, patch__check_inputs, patch__create_export):
+        patch__create_export.return_value = "my_export"
+        fake_export_result = Mock(
+            rows=[
+                Mock(descriptions="Sweden\tMale"),
+                Mock(descriptions="France\tFemale"),
+            ]
+        )
+        fake_async_session = Mock(
+            session="my_session", _post=AsyncMock(return_value=fake_export_result)
+        )
+        datagrid_example = asyncio.run(
+            DataGrid.fetch_async(
+                ["variables", "for", "columns"],
+                "my_selection",
+                "my_table",
+                500,
+                session=fake_async_session,
+            )
         )
-        patch_pd_dataframe.return_value = fake_dataframe
+        assert datagrid_example.columns == ["variables", "for", "columns"]
+        assert datagrid_example.selection == "my_selection"
+        assert datagrid_example.table == "my_table"
+        assert datagrid_example.max_rows == 500
+        assert datagrid_example.session == "my_session"
+        assert datagrid_example.shard_by is None
+        assert datagrid_example.shards is None
+        assert datagrid_example._data == [("Sweden", "Male"), ("France", "Female")]
+        patch__check_inputs.assert_called_once_with()
+        fake_async_session._post.assert_awaited_once_with(
+            "Exports", "ExportSync", "my_export", "ExportResult"
+        )
+
+    def test_fetch_async_no_session(self):
+        with pytest.raises(ValueError) as exc_info:
+            asyncio.run(DataGrid.fetch_async(["columns"], table="my_table"))
+        assert exc_info.value.args[0] == (
+            "You must provide a valid session (none was given)."
+        )
+
+    def test_to_df(self, fake_datagrid):
+        fake_datagrid._data = [
+            ("C001", "Alice", "Smith"),
+            ("C002", "Bob", "Jones"),
+        ]
         fake_datagrid._convert_column = Mock(
-            side_effect=["converted_column1", "converted_column2", "converted_column3"]
+            side_effect=lambda data, column_type: data + f" ({column_type.value})"
         )
 
         df = fake_datagrid.to_df()
 
-        assert df is fake_dataframe
-        patch_pd_dataframe.assert_called_once_with(
-            "my_datagrid_data",
-            columns=["Customer ID", "Customer First Name", "Customer Surname"],
+        expected_df = pd.DataFrame(
+            {
+                "Customer ID": ["C001 (Reference)", "C002 (Reference)"],
+                "Customer First Name": ["Alice (Text)", "Bob (Text)"],
+                "Customer Surname": ["Smith (Text)", "Jones (Text)"],
+            }
         )
-        convert_column_calls = [
-            call("column1", "Reference"),
-            call("column2", "Text"),
-            call("column3", "Text"),
+        pd.testing.assert_frame_equal(df, expected_df)
+        assert fake_datagrid._convert_column.call_count == 3
+        first_column, column_type = fake_datagrid._convert_column.call_args_list[0].args
+        assert first_column.tolist() == ["C001", "C002"]
+        assert column_type == "Reference"
+
+    def test_to_df_column_types(self, fake_datagrid):
+        fake_datagrid.columns = [
+            Mock(description="Cost", type="Numeric"),
+            Mock(description="Booked", type="Date"),
+            Mock(description="Visited", type="DateTime"),
+            Mock(description="Cost", type="Selector"),
         ]
-        getitem_calls = [
-            call((slice(None, None, None), 0)),
-            call((slice(None, None, None), 1)),
-            call((slice(None, None, None), 2)),
+        fake_datagrid._data = [
+            ("12.5", "09-02-1975", "07-10-2021 10:41:41", "Low"),
+            ("7", "Unclassified", "", "High"),
         ]
-        setitem_calls = [
-            call((slice(None, None, None), 0), "converted_column1"),
-            call((slice(None, None, None), 1), "converted_column2"),
-            call((slice(None, None, None), 2), "converted_column3"),
+
+        df = fake_datagrid.to_df()
+
+        assert df.columns.tolist() == ["Cost", "Booked", "Visited", "Cost"]
+        assert df.dtypes.tolist() == [
+            np.dtype("float64"),
+            np.dtype("O"),
+            np.dtype("datetime64[ns]"),
+            np.dtype("O"),
         ]
-        fake_datagrid._convert_column.assert_has_calls(convert_column_calls)
-        fake_getitem.assert_has_calls(getitem_calls)
-        fake_setitem.assert_has_calls(setitem_calls)
+        assert df.iloc[:, 0].tolist() == [12.5, 7.0]
+        assert df.iloc[0, 1] == date(1975, 2, 9)
+        assert pd.isna(df.iloc[1, 1])
+        assert df.iloc[0, 2] == pd.Timestamp(2021, 10, 7, 10, 41, 41)
+        assert pd.isna(df.iloc[1, 2])
+        assert df.iloc[:, 3].tolist() == ["Low", "High"]
+
+    def test_to_df_no_rows(self, fake_datagrid):
+        fake_datagrid._data = []
+        df = fake_datagrid.to_df()
+        assert df.columns.tolist() == [
+            "Customer ID",
+            "Customer First Name",
+            "Customer Surname",
+        ]
+        assert len(df) == 0
+
+    def test_to_df_categorical(self, fake_datagrid):
+        destination = Mock(description="Destination", type="Selector")
+        destination.values.descriptions = ["France", "Germany", "Spain", "Unknown"]
+        fake_datagrid.columns = [
+            destination,
+            Mock(description="Notes", type="Text"),
+            Mock(description="Booking URN", type="Reference"),
+        ]
+        fake_datagrid._data = [
+            ("Spain", "Late", "B001"),
+            ("France", "Early", "B002"),
+            ("Spain", "Late", "B003"),
+        ]
+
+        df = fake_datagrid.to_df(categorical=True)
+
+        assert df["Destination"].dtype == "category"
+        assert df["Destination"].cat.categories.tolist() == [
+            "France",
+            "Germany",
+            "Spain",
+            "Unknown",
+        ]
+        assert df["Destination"].tolist() == ["Spain", "France", "Spain"]
+        assert df["Notes"].dtype == object
+        assert df["Booking URN"].dtype == object
+
+        df = fake_datagrid.to_df(categorical="all")
+
+        assert df["Destination"].dtype == "category"
+        assert df["Notes"].dtype == "category"
+        assert df["Notes"].cat.categories.tolist() == ["Early", "Late"]
+        assert df["Booking URN"].dtype == object
+
+    def test_to_df_categorical_bad_value(self, fake_datagrid):
+        with pytest.raises(ValueError) as exc_info:
+            fake_datagrid.to_df(categorical="text")
+        assert exc_info.value.args[0] == "categorical must be True, False or 'all'"
+
+    def test_to_categorical_extra_values(self):
+        data = pd.Series(["B", "Z", "A", "Y", "Z"])
+        column = DataGrid._to_categorical(data, ["A", "B", "C"])
+        assert column.cat.categories.tolist() == ["A", "B", "C", "Y", "Z"]
+        assert column.tolist() == ["B", "Z", "A", "Y", "Z"]
+
+    @pytest.fixture()
+    def codes_datagrid(self, fake_datagrid):
+        destination = Mock(description="Destination", type=VariableType.SELECTOR)
+        destination.values = SelectorValues(
+            [
+                aa.VarCode(code="01", description="France", count=20),
+                aa.VarCode(code="02", description="Germany", count=10),
+                aa.VarCode(code="03", description="Spain", count=30),
+            ]
+        )
+        fake_datagrid.columns = [
+            Mock(description="Booking URN", type=VariableType.REFERENCE),
+            destination,
+        ]
+        fake_datagrid.export_codes = True
+        fake_datagrid._data = [("B001", "03"), ("B002", "01"), ("B003", "99")]
+        return fake_datagrid
+
+    def test_to_df_export_codes(self, codes_datagrid):
+        df = codes_datagrid.to_df()
+        assert df["Destination"].dtype == object
+        assert df["Destination"].tolist() == ["Spain", "France", "99"]
+        assert df["Booking URN"].tolist() == ["B001", "B002", "B003"]
+
+        df = codes_datagrid.to_df(categorical=True)
+        assert df["Destination"].dtype == "category"
+        assert df["Destination"].cat.categories.tolist() == [
+            "France",
+            "Germany",
+            "Spain",
+            "99",
+        ]
+        assert df["Destination"].tolist() == ["Spain", "France", "99"]
+
+    def test_to_arrow_export_codes(self, codes_datagrid):
+        pytest.importorskip("pyarrow")
+        table = codes_datagrid.to_arrow()
+        assert table.column("Destination").to_pylist() == ["Spain", "France", "99"]
+
+    def test_decode_codes_shared_descriptions(self):
+        values = SelectorValues(
+            [
+                aa.VarCode(code="A", description="Other", count=1),
+                aa.VarCode(code="B", description="Main", count=1),
+                aa.VarCode(code="C", description="Other", count=1),
+            ]
+        )
+        column = DataGrid._decode_codes(pd.Series(["C", "B", "A"]), values)
+        assert column.cat.categories.tolist() == ["Other", "Main"]
+        assert column.tolist() == ["Other", "Main", "Other"]
+
+    @pytest.fixture()
+    def patch_fetch_pages(self, mocker, fake_datagrid):
+        all_rows = [f"Name {i}\tCity {i}" for i in range(7)]
+
+        def fake_get_export(export):
+            start = export.limits.start_at
+            rows = all_rows[start : start + export.limits.total]
+            return Mock(rows=[Mock(descriptions=row) for row in rows])
+
+        mocker.patch.object(DataGrid, "_create_export", side_effect=Mock)
+        fake_datagrid._rows_to_df = Mock(side_effect=lambda rows, *args: rows)
+        return mocker.patch.object(DataGrid, "_get_export", side_effect=fake_get_export)
+
+    @pytest.mark.parametrize("prefetch", [True, False])
+    def test_iter_chunks(self, patch_fetch_pages, fake_datagrid, prefetch):
+        chunks = list(fake_datagrid.iter_chunks(3, prefetch=prefetch))
+        assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+        assert chunks[0][0] == ("Name 0", "City 0")
+        assert chunks[2][0] == ("Name 6", "City 6")
+        exports = [c.args[0] for c in patch_fetch_pages.call_args_list]
+        assert [e.limits.start_at for e in exports] == [0, 3, 6]
+        assert exports[0].limits.sampling == "First"
+        assert exports[0].limits.type == "Total"
+        assert exports[0].maximum_number_of_rows_to_browse == 3
+
+    def test_iter_chunks_categorical(self, patch_fetch_pages, fake_datagrid):
+        fake_datagrid._get_categories = Mock(return_value={1: ["City 1", "City 2"]})
+        chunks = list(fake_datagrid.iter_chunks(3, categorical=True))
+        assert len(chunks) == 3
+        fake_datagrid._get_categories.assert_called_once_with(True)
+        for rows_to_df_call in fake_datagrid._rows_to_df.call_args_list:
+            assert rows_to_df_call.args[1] == {1: ["City 1", "City 2"]}
+
+    def test_iter_chunks_exact_pages(self, patch_fetch_pages, fake_datagrid):
+        chunks = list(fake_datagrid.iter_chunks(7, prefetch=False))
+        assert [len(chunk) for chunk in chunks] == [7]
+        assert patch_fetch_pages.call_count == 2  # second page is empty
+
+    def test_iter_chunks_max_rows(self, patch_fetch_pages, fake_datagrid):
+        chunks = list(fake_datagrid.iter_chunks(2, max_rows=5))
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        exports = [c.args[0] for c in patch_fetch_pages.call_args_list]
+        assert [e.limits.total for e in exports] == [2, 2, 1]
+
+    @pytest.mark.parametrize(
+        "kwargs, message",
+        [
+            ({"chunk_size": 0}, "chunk_size must be an integer greater than 0"),
+            ({"max_rows": 2.5}, "max_rows must be an integer greater than 0"),
+            ({"prefetch": "yes"}, "prefetch must be True or False"),
+        ],
+    )
+    def test_iter_chunks_bad_args(self, fake_datagrid, kwargs, message):
+        with pytest.raises(ValueError) as exc_info:
+            fake_datagrid.iter_chunks(**kwargs)
+        assert exc_info.value.args[0] == message
+
+    def test_to_arrow(self, fake_datagrid):
+        pa = pytest.importorskip("pyarrow")
+        fake_datagrid.columns = [
+            Mock(description="Booking URN", type="Reference"),
+            Mock(description="Destination", type="Selector"),
+            Mock(description="Cost", type="Numeric"),
+            Mock(description="Booked", type="Date"),
+            Mock(description="Visited", type="DateTime"),
+        ]
+        fake_datagrid._data = [
+            ("B001", "Spain", "12.5", "09-02-1975", "07-10-2021 10:41:41"),
+            ("B002", "France", "7", "Unclassified", ""),
+            ("B003", "Spain", "", "09-02-1975", "07-10-2021 10:41:41"),
+        ]
+
+        table = fake_datagrid.to_arrow()
+
+        assert table.schema == pa.schema(
+            [
+                ("Booking URN", pa.string()),
+                ("Destination", pa.string()),
+                ("Cost", pa.float64()),
+                ("Booked", pa.date32()),
+                ("Visited", pa.timestamp("s")),
+            ]
+        )
+        assert table.to_pydict() == {
+            "Booking URN": ["B001", "B002", "B003"],
+            "Destination": ["Spain", "France", "Spain"],
+            "Cost": [12.5, 7.0, None],
+            "Booked": [date(1975, 2, 9), None, date(1975, 2, 9)],
+            "Visited": [
+                datetime(2021, 10, 7, 10, 41, 41),
+                None,
+                datetime(2021, 10, 7, 10, 41, 41),
+            ],
+        }
+
+    def test_to_arrow_no_rows(self, fake_datagrid):
+        pytest.importorskip("pyarrow")
+        fake_datagrid._data = []
+        table = fake_datagrid.to_arrow()
+        assert table.num_rows == 0
+        assert table.column_names == [
+            "Customer ID",
+            "Customer First Name",
+            "Customer Surname",
+        ]
+
+    def test_to_arrow_without_pyarrow(self, mocker, fake_datagrid):
+        mocker.patch.dict(sys.modules, {"pyarrow": None})
+        with pytest.raises(ImportError) as exc_info:
+            fake_datagrid.to_arrow()
+        assert exc_info.value.args[0] == (
+            "pyarrow is required to create Arrow tables and Parquet files:"
+            " install it with `pip install pyarrow`"
+        )
+
+    def test_write_parquet(self, patch_fetch_pages, fake_datagrid, tmp_path):
+        pytest.importorskip("pyarrow")
+        import pyarrow.parquet as pq
+
+        fake_datagrid.columns = [
+            Mock(description="Name", type="Text"),
+            Mock(description="City", type="Selector"),
+        ]
+        path = tmp_path / "datagrid.parquet"
+
+        fake_datagrid.write_parquet(path, 3)
+
+        parquet_file = pq.ParquetFile(path)
+        assert parquet_file.metadata.num_row_groups == 3
+        assert parquet_file.metadata.num_rows == 7
+        table = parquet_file.read()
+        assert table.column("Name").to_pylist() == [f"Name {i}" for i in range(7)]
+        assert table.column("City").to_pylist() == [f"City {i}" for i in range(7)]
+        exports = [c.args[0] for c in patch_fetch_pages.call_args_list]
+        assert [e.limits.start_at for e in exports] == [0, 3, 6]
+        fake_datagrid._rows_to_df.assert_not_called()
+
+    def test_write_parquet_bad_row_group_size(self, fake_datagrid, tmp_path):
+        with pytest.raises(ValueError) as exc_info:
+            fake_datagrid.write_parquet(tmp_path / "datagrid.parquet", 2.5)
+        assert exc_info.value.args[0] == (
+            "row_group_size must be an integer greater than 0"
+        )
+
+    @patch("apteco.datagrid.DataGrid._get_sharded_data")
+    @patch("apteco.datagrid.DataGrid._get_data")
+    @patch("apteco.datagrid.DataGrid._check_inputs")
+    def test_init_sharded(
+        self, patch__check_inputs, patch__get_data, patch__get_sharded_data
+    ):
+        patch__get_sharded_data.return_value = "my_sharded_data"
+        shard_by = Mock(type=VariableType.SELECTOR, table="my_table")
+        datagrid_example = DataGrid(
+            ["columns"],
+            table="my_table",
+            session=Mock(max_workers=6),
+            shard_by=shard_by,
+        )
+        assert datagrid_example.shard_by is shard_by
+        assert datagrid_example.shards == 6
+        assert datagrid_example._data == "my_sharded_data"
+        patch__get_data.assert_not_called()
+
+    def test__set_sharding(self, fake_datagrid, rtl_var_customer_gender):
+        fake_datagrid._set_sharding(rtl_var_customer_gender, 3)
+        assert fake_datagrid.shard_by is rtl_var_customer_gender
+        assert fake_datagrid.shards == 3
+        fake_datagrid._set_sharding(None, None)
+        assert fake_datagrid.shard_by is None
+        assert fake_datagrid.shards is None
+
+    def test__set_sharding_shards_without_shard_by(self, fake_datagrid):
+        with pytest.raises(ValueError) as exc_info:
+            fake_datagrid._set_sharding(None, 4)
+        assert exc_info.value.args[0] == "shards can only be given with shard_by"
+
+    def test__set_sharding_not_selector(self, fake_datagrid, rtl_var_customer_email):
+        with pytest.raises(ValueError) as exc_info:
+            fake_datagrid._set_sharding(rtl_var_customer_email, None)
+        assert exc_info.value.args[0] == (
+            "The variable 'cuEmail' has type 'Text'."
+            "\nOnly Selector variables can be used to shard a data grid."
+        )
+
+    def test__set_sharding_other_table(self, fake_datagrid, rtl_var_purchase_store):
+        with pytest.raises(ValueError) as exc_info:
+            fake_datagrid._set_sharding(rtl_var_purchase_store, None)
+        assert exc_info.value.args[0] == (
+            "The resolve table of the data grid is 'Customers',"
+            " but the variable 'puStore' belongs to the 'Purchases' table."
+            "\nOnly variables from the same table as the data grid"
+            " can be used to shard it."
+        )
+
+    def test__set_sharding_bad_shards(self, fake_datagrid, rtl_var_customer_gender):
+        with pytest.raises(ValueError) as exc_info:
+            fake_datagrid._set_sharding(rtl_var_customer_gender, 0)
+        assert exc_info.value.args[0] == "shards must be an integer greater than 0"
+
+    def test__get_sharded_data(self, fake_datagrid, rtl_var_customer_gender):
+        rtl_var_customer_gender.values = SelectorValues(
+            [
+                aa.VarCode(code="F", description="Female", count=500),
+                aa.VarCode(code="M", description="Male", count=450),
+                aa.VarCode(code="U", description="Unknown", count=50),
+            ]
+        )
+        fake_datagrid.shard_by = rtl_var_customer_gender
+        fake_datagrid.shards = 2
+        fake_datagrid.max_rows = 5
+        fake_datagrid.session.max_workers = 4
+        fake_datagrid._create_shard_export = Mock(
+            side_effect=lambda clause, offset, page_size: (clause, offset, page_size)
+        )
+
+        def fake_get_export(export):
+            clause, offset, page_size = export
+            shard_codes = clause.operands[0].values
+            rows = [
+                Mock(descriptions=f"{code}\t{i}")
+                for code in shard_codes
+                for i in range(2)
+            ]
+            return Mock(rows=rows[offset : offset + page_size])
+
+        fake_datagrid._get_export = Mock(side_effect=fake_get_export)
+
+        data = fake_datagrid._get_sharded_data()
+
+        assert data == [("F", "0"), ("F", "1"), ("M", "0"), ("M", "1"), ("U", "0")]
+        # max_rows is split between the shards, and the second shard
+        # is asked for the one row left over once the first runs out
+        pages = [c.args[1:] for c in fake_datagrid._create_shard_export.call_args_list]
+        assert pages == [(0, 3), (0, 2), (2, 1)]
+        shard_clauses = [
+            c.args[0] for c in fake_datagrid._create_shard_export.call_args_list[:2]
+        ]
+        assert len(shard_clauses) == 2
+        for clause, codes in zip(shard_clauses, [["F"], ["M", "U"]]):
+            assert isinstance(clause, BooleanClause)
+            assert clause.operation == "AND"
+            shard_clause, selection = clause.operands
+            assert isinstance(shard_clause, SelectorClause)
+            assert shard_clause.variable is rtl_var_customer_gender
+            assert shard_clause.values == codes
+            assert selection is fake_datagrid.selection
+
+    @pytest.mark.parametrize("max_rows", [1, 3, 7, 100, 1000])
+    def test__get_sharded_data_matches_unsharded(
+        self, fake_datagrid, rtl_var_customer_gender, max_rows
+    ):
+        rtl_var_customer_gender.values = SelectorValues(
+            [
+                aa.VarCode(code="F", description="Female", count=60),
+                aa.VarCode(code="M", description="Male", count=30),
+                aa.VarCode(code="U", description="Unknown", count=10),
+            ]
+        )
+        records = [("FMMFFUFMFF"[i % 10], str(i)) for i in range(100)]
+        fake_datagrid.shard_by = rtl_var_customer_gender
+        fake_datagrid.shards = 3
+        fake_datagrid.max_rows = max_rows
+        fake_datagrid.session.max_workers = 4
+        fake_datagrid._create_shard_export = Mock(
+            side_effect=lambda clause, offset, page_size: (clause, offset, page_size)
+        )
+
+        fetched = []
+
+        def fake_get_export(export):
+            clause, offset, page_size = export
+            shard_codes = clause.operands[0].values
+            rows = [r for r in records if r[0] in shard_codes]
+            page = rows[offset : offset + page_size]
+            fetched.extend(page)
+            return Mock(rows=[Mock(descriptions="\t".join(r)) for r in page])
+
+        fake_datagrid._get_export = Mock(side_effect=fake_get_export)
+
+        data = fake_datagrid._get_sharded_data()
+
+        # same number of records as without sharding, but grouped by shard
+        unsharded = records[:max_rows]
+        assert len(data) == len(unsharded)
+        assert len(set(data)) == len(data)
+        assert set(data) <= set(records)
+        if max_rows >= len(records):
+            assert sorted(data) == sorted(unsharded)
+        assert sorted(fetched) == sorted(data)  # nothing fetched and discarded
+
+    def test__create_shard_export(self, fake_datagrid):
+        fake_datagrid._create_page_export = Mock(
+            return_value=Mock(base_query="old query")
+        )
+        selection = aa.Selection(table_name="Customers")
+        clause = Mock(_to_model_selection=Mock(return_value=selection))
+        export = fake_datagrid._create_shard_export(clause, 200, 100)
+        fake_datagrid._create_page_export.assert_called_once_with(200, 100)
+        assert export.base_query == aa.Query(selection=selection)
 
     @patch("apteco.datagrid.DataGrid._check_columns")
     def test__check_inputs(self, patch__check_columns, fake_datagrid):
@@ -145,6 +648,14 @@ class TestDataGrid:
         assert exc_info.value.args[0] == "max_rows must be a number greater than 0"
         patch__check_columns.assert_not_called()
 
+    @patch("apteco.datagrid.DataGrid._check_columns")
+    def test__check_inputs_bad_export_codes(self, patch__check_columns, fake_datagrid):
+        fake_datagrid.export_codes = "yes"
+        with pytest.raises(ValueError) as exc_info:
+            fake_datagrid._check_inputs()
+        assert exc_info.value.args[0] == "export_codes must be True or False"
+        patch__check_columns.assert_not_called()
+
     @patch("apteco.datagrid.DataGrid._check_columns")
     def test__check_inputs_no_columns(self, patch__check_columns, fake_datagrid):
         fake_datagrid.columns = []
@@ -227,6 +738,19 @@ class TestDataGrid:
         assert columns == ["First column", "Second column", "Third column"]
         patch_aa_column.assert_has_calls(column_calls)
 
+    def test__create_columns_export_codes(
+        self, fake_datagrid, rtl_var_customer_id, rtl_var_customer_gender
+    ):
+        fake_datagrid.columns = [rtl_var_customer_id, rtl_var_customer_gender]
+        fake_datagrid.export_codes = True
+        columns = fake_datagrid._create_columns()
+        assert columns == [
+            aa.Column(id="0", variable_name="cuID", column_header="Customer ID"),
+            aa.Column(
+                id="1", variable_name="cuGender", column_header="Gender", detail="Code"
+            ),
+        ]
+
     @patch("apteco_api.ExportsApi")
     @patch("apteco.datagrid.DataGrid._create_columns")
     def test__get_export(
@@ -251,6 +775,22 @@ class TestDataGrid:
             "acme_inc", "retail", export=expected_export
         )
 
+    @patch("apteco.datagrid.DataGrid._create_export")
+    @patch("apteco.datagrid.aa.ExportsApi")
+    def test__get_export_uses_request(
+        self, patch_aa_exports_api, patch__create_export, fake_datagrid
+    ):
+        fake_exports_perform_export_sync = Mock(return_value="your_export_result")
+        patch_aa_exports_api.return_value = Mock(
+            exports_perform_export_synchronously=fake_exports_perform_export_sync
+        )
+        fake_datagrid._request = "my_lazy_export"
+        assert fake_datagrid._get_export() == "your_export_result"
+        fake_exports_perform_export_sync.assert_called_once_with(
+            "acme_inc", "retail", export="my_lazy_export"
+        )
+        patch__create_export.assert_not_called()
+
     @patch("apteco.datagrid.DataGrid._get_export")
     def test__get_data(self, patch__get_export, fake_datagrid):
         fake_export_result = Mock(
@@ -268,3 +808,91 @@ class TestDataGrid:
             ("France", "Female", "London", "0.00"),
             ("Germany", "Male", "South East", "345.67"),
         ]
+
+    def test__process_export_export_codes(
+        self, fake_datagrid, rtl_var_customer_id, rtl_var_customer_gender
+    ):
+        fake_datagrid.columns = [rtl_var_customer_id, rtl_var_customer_gender]
+        fake_datagrid.export_codes = True
+        fake_export_result = Mock(
+            rows=[
+                Mock(codes="1001\tF", descriptions="1001\tFemale"),
+                Mock(codes="1002\tM", descriptions="1002\tMale"),
+                Mock(codes="1003\t", descriptions="1003\tNot known"),
+            ]
+        )
+        assert fake_datagrid._process_export(fake_export_result) == [
+            ("1001", "F"),
+            ("1002", "M"),
+            ("1003", "Not known"),
+        ]
+
+    def test_to_df_export_codes_blank_codes(self, codes_datagrid):
+        export_result = Mock(
+            rows=[
+                Mock(codes="B001\t03", descriptions="B001\tSpain"),
+                Mock(codes="B002\t", descriptions="B002\tUnclassified"),
+            ]
+        )
+        codes_datagrid._data = codes_datagrid._process_export(export_result)
+        df = codes_datagrid.to_df()
+        assert df["Destination"].tolist() == ["Spain", "Unclassified"]
+
+
+class TestGroupCodes:
+    @staticmethod
+    def make_values(counts):
+        return SelectorValues(
+            [
+                aa.VarCode(code=code, description=code, count=count)
+                for code, count in counts.items()
+            ]
+        )
+
+    def test_balanced_by_count(self):
+        values = self.make_values({"A": 100, "B": 60, "C": 50, "D": 40, "E": 10})
+        assert _group_codes(values, 2) == [["A", "D"], ["B", "C", "E"]]
+
+    def test_no_counts(self):
+        values = self.make_values({code: None for code in "ABCDEFG"})
+        groups = _group_codes(values, 3)
+        assert sorted(len(group) for group in groups) == [2, 2, 3]
+        assert sorted(code for group in groups for code in group) == list("ABCDEFG")
+
+    def test_more_shards_than_codes(self):
+        values = self.make_values({"A": 5, "B": 3})
+        assert _group_codes(values, 10) == [["A"], ["B"]]
+
+
+class TestParseDates:
+    def test_dates(self, mocker):
+        spy_to_datetime = mocker.spy(pd, "to_datetime")
+        data = pd.Series(
+            ["09-02-1975", "Unclassified", "09-02-1975", None, "31-12-2020"],
+            index=[5, 6, 7, 8, 9],
+        )
+
+        result = _parse_dates(data, "%d-%m-%Y", dates_only=True)
+
+        assert result.index.tolist() == [5, 6, 7, 8, 9]
+        assert result.dtype == object
+        assert result[5] == date(1975, 2, 9)
+        assert result[7] is result[5]
+        assert result[9] == date(2020, 12, 31)
+        assert pd.isna(result[6]) and pd.isna(result[8])
+        (parsed_strings,) = spy_to_datetime.call_args.args
+        assert parsed_strings.tolist() == ["09-02-1975", "Unclassified", "31-12-2020"]
+
+    def test_datetimes(self):
+        data = pd.Series(["07-10-2021 10:41:41", "", "07-10-2021 10:41:41"])
+
+        result = _parse_dates(data, "%d-%m-%Y %H:%M:%S")
+
+        assert result.dtype == "datetime64[ns]"
+        assert result[0] == result[2] == pd.Timestamp(2021, 10, 7, 10, 41, 41)
+        assert pd.isna(result[1])
+
+    def test_no_values(self):
+        result = _parse_dates(pd.Series([], dtype=object), "%d-%m-%Y")
+        assert result.dtype == "datetime64[ns]"
+        assert len(result) == 0
@@ -0,0 +1,96 @@
+"""Import time regression tests.
+
+These run ``python -X importtime`` in a subprocess, or list ``sys.modules``,
+to check which modules are loaded by importing py-apteco.
+
+"""
+
+import subprocess
+import sys
+
+import pytest
+
+# modules which should only be loaded once they are needed
+DEFERRED_MODULES = ("pandas", "numpy", "apteco_api")
+
+
+def run_with_importtime(statement):
+    """Return import times in microseconds for modules imported by ``statement``.
+
+    Only includes modules imported after Python start-up.
+
+    Returns:
+        Dict[str, int]: mapping from module name to time spent importing it
+        (excluding time spent importing its own imports)
+
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    self_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, __, name = line[len("import time:") :].split("|")
+        if name.strip() == "site" and not name.startswith("  "):
+            self_times = {}  # discard modules imported during start-up
+            continue
+        self_times[name.strip()] = int(self_us)
+    return self_times
+
+
+def run_and_list_modules(statement):
+    """Return the names of the modules in ``sys.modules`` after ``statement``."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"{statement}; import sys; print(' '.join(sorted(sys.modules)))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.split()
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "import apteco",
+        "from apteco import Session, login, login_with_password",
+        "from apteco import Cube, DataGrid",
+    ],
+)
+def test_import_defers_heavy_modules(statement):
+    import_times = run_with_importtime(statement)
+    assert "apteco" in import_times
+    loaded = [m for m in import_times if m.split(".")[0] in DEFERRED_MODULES]
+    assert loaded == []
+
+
+def test_import_leaves_heavy_modules_out_of_sys_modules():
+    loaded = run_and_list_modules("from apteco import Session, Cube, DataGrid")
+    assert "apteco.session" in loaded
+    # apteco_api itself is registered in sys.modules, but isn't loaded
+    heavy = [m for m in loaded if m.split(".")[0] in ("pandas", "numpy")]
+    assert heavy == []
+    assert [m for m in loaded if m.startswith("apteco_api.")] == []
+
+
+def test_submodules_available_as_attributes():
+    loaded = run_and_list_modules(
+        "import apteco; apteco.session.Session; apteco.query.Clause"
+    )
+    assert "apteco.session" in loaded
+    assert "apteco.query" in loaded
+
+
+def test_deferred_modules_load_on_use():
+    import_times = run_with_importtime(
+        "from apteco import Session; import apteco.common; apteco.common.aa.Query"
+    )
+    assert "apteco_api.models.query" in import_times
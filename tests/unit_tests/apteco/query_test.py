@@ -1,24 +1,31 @@
+import asyncio
 from datetime import date, datetime
 from decimal import Decimal
 from fractions import Fraction
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock
 
 import apteco_api as aa
 import pytest
 
+from apteco.cache import CountCache, SelectorValues
 from apteco.query import (
     ArrayClause,
     BooleanClause,
+    Clause,
     CombinedCategoriesClause,
     DateListClause,
     DateRangeClause,
     DateTimeRangeClause,
     FlagArrayClause,
+    InvalidValuesError,
     NumericClause,
+    Selection,
     SelectorClause,
+    SelectorClauseMixin,
     SubSelectionClause,
     TableClause,
     TextClause,
+    _count_async,
     normalize_date_input,
     normalize_date_value,
     normalize_datetime_input,
@@ -305,6 +312,102 @@ def test_normalize_datetime_input():
     assert exc_info.value.args[0] == "Can't sneak numbers through inside a list"
 
 
+@pytest.fixture()
+def query_result():
+    return Mock(
+        counts=[
+            aa.Count(table_name="Bookings", count_value=250),
+            aa.Count(table_name="People", count_value=100),
+        ]
+    )
+
+
+@pytest.fixture()
+def patch_queries_api(mocker, query_result):
+    fake_controller = Mock()
+    fake_controller.queries_perform_query_count_synchronously.return_value = (
+        query_result
+    )
+    mocker.patch("apteco.query.aa.QueriesApi", return_value=fake_controller)
+    return fake_controller.queries_perform_query_count_synchronously
+
+
+@pytest.fixture()
+def fake_count_session():
+    return Mock(
+        base_url="https://example.com/OrbitAPI",
+        data_view="holidays_view",
+        system="holidays",
+        api_client=aa.ApiClient(),
+        system_info=Mock(build_date=datetime(2020, 2, 20, 20, 20, 20)),
+        count_cache=CountCache(),
+    )
+
+
+class TestSelection:
+    def test_selection(self, patch_queries_api, fake_count_session):
+        fake_count_session.count_cache = None
+        query = aa.Query(selection=aa.Selection(table_name="Bookings"))
+        selection = Selection(query, fake_count_session)
+        assert selection.count == 250
+        assert selection.table_name == "Bookings"
+        assert selection.get_count("People") == 100
+        patch_queries_api.assert_called_once_with(
+            data_view_name="holidays_view", system_name="holidays", query=query
+        )
+
+    def test_selection_cached(self, patch_queries_api, fake_count_session):
+        for _ in range(3):
+            query = aa.Query(selection=aa.Selection(table_name="Bookings"))
+            selection = Selection(query, fake_count_session)
+            assert selection.count == 250
+            assert selection.get_count("People") == 100
+        patch_queries_api.assert_called_once()
+        stats = fake_count_session.count_cache.stats
+        assert (stats.hits, stats.misses, stats.size) == (2, 1, 1)
+
+    def test_run_async(self, query_result):
+        fake_async_session = Mock(_post=AsyncMock(return_value=query_result))
+        query = aa.Query(selection=aa.Selection(table_name="Bookings"))
+        selection = asyncio.run(Selection.run_async(query, fake_async_session))
+        assert selection.count == 250
+        assert selection.table_name == "Bookings"
+        assert selection.get_count("People") == 100
+        fake_async_session._post.assert_awaited_once_with(
+            "Queries", "CountSync", query, "QueryResult"
+        )
+
+    def test_count_async(self, query_result):
+        fake_async_session = Mock(_post=AsyncMock(return_value=query_result))
+        clause = Mock()
+        clause._to_model_query.return_value = aa.Query(
+            selection=aa.Selection(table_name="Bookings")
+        )
+        assert asyncio.run(Clause.count_async(clause, fake_async_session)) == 250
+        (_, _, query, _) = fake_async_session._post.await_args.args
+        assert query == aa.Query(selection=aa.Selection(table_name="Bookings"))
+
+    def test_count_async_default_session(self, mocker, query_result):
+        fake_async_session = Mock(_post=AsyncMock(return_value=query_result))
+        patch_async_session = mocker.patch("apteco.query.AsyncSession")
+        patch_async_session.return_value.__aenter__.return_value = fake_async_session
+        clause = Mock(session="my_session")
+        clause._to_model_query.return_value = aa.Query(
+            selection=aa.Selection(table_name="Bookings")
+        )
+        assert asyncio.run(_count_async(clause)) == 250
+        patch_async_session.assert_called_once_with("my_session")
+        patch_async_session.return_value.__aexit__.assert_awaited_once()
+
+    def test_selection_cached_different_queries(
+        self, patch_queries_api, fake_count_session
+    ):
+        for table_name in ["Bookings", "People", "Bookings"]:
+            query = aa.Query(selection=aa.Selection(table_name=table_name))
+            Selection(query, fake_count_session)
+        assert patch_queries_api.call_count == 2
+
+
 @pytest.fixture()
 def fake_bookings_table():
     fake = Mock()
@@ -381,6 +484,44 @@ class TestSelectorClause:
         )
 
 
+class TestVerifyValues:
+    @pytest.fixture()
+    def patch_get_selector_values(self, mocker):
+        values = SelectorValues(
+            [
+                aa.VarCode(code="01", description="France"),
+                aa.VarCode(code="02", description="Germany"),
+                aa.VarCode(code="03", description="USA"),
+            ]
+        )
+        return mocker.patch("apteco.query.get_selector_values", return_value=values)
+
+    def test_codes(self, patch_get_selector_values):
+        result = SelectorClauseMixin._verify_values(["03", "01"], "boDest", "session")
+        assert result == ["01", "03"]
+        patch_get_selector_values.assert_called_once_with("session", "boDest")
+
+    def test_descriptions(self, patch_get_selector_values):
+        result = SelectorClauseMixin._verify_values(
+            ["USA", "France"], "boDest", "session"
+        )
+        assert result == ["01", "03"]
+
+    def test_mixed(self, patch_get_selector_values):
+        with pytest.raises(InvalidValuesError) as exc_info:
+            SelectorClauseMixin._verify_values(["01", "USA"], "boDest", "session")
+        assert exc_info.value.args[0] == (
+            "Cannot mix codes and descriptions in selector values list."
+        )
+
+    def test_invalid_code(self, patch_get_selector_values):
+        with pytest.raises(InvalidValuesError) as exc_info:
+            SelectorClauseMixin._verify_values(["01", "99"], "boDest", "session")
+        assert exc_info.value.args[0] == (
+            "1 invalid code(s) detected in selector values list:\n'99'"
+        )
+
+
 class TestCombinedCategoriesClause:
     def test_combined_categories_clause_init(self, fake_bookings_table):
         fake_continent_var = Mock()
@@ -1202,6 +1343,222 @@ class TestTableClause:
         subclause._to_model_clause.assert_called_once_with()
 
 
+class TestCanonicalize:
+    @pytest.fixture()
+    def destination(self, fake_bookings_table):
+        fake = Mock(table=fake_bookings_table)
+        fake.configure_mock(name="boDest")
+        return fake
+
+    @pytest.fixture()
+    def cost(self, fake_bookings_table):
+        fake = Mock(table=fake_bookings_table)
+        fake.configure_mock(name="boCost")
+        return fake
+
+    @staticmethod
+    def boolean(operation, *operands, label=None):
+        return BooleanClause(operands[0].table, operation, list(operands), label=label)
+
+    def test_leaf_unchanged(self, destination):
+        clause = SelectorClause(destination, ["01"])
+        assert clause._canonicalize() is clause
+
+    def test_flatten_and_merge(self, destination, cost):
+        france = SelectorClause(destination, ["01"])
+        germany = SelectorClause(destination, ["02", "01"])
+        cheap = NumericClause(cost, ["<100"])
+        usa = SelectorClause(destination, ["03"])
+        clause = (france | germany) | (cheap | usa)
+        result = clause._canonicalize()
+        assert isinstance(result, BooleanClause)
+        assert result.operation == "OR"
+        assert len(result.operands) == 2
+        merged, numeric = result.operands
+        assert merged.values == ["01", "02", "03"]
+        assert merged.include is True
+        assert numeric is cheap
+        assert clause.operands[0].operands == [france, germany]  # not modified
+
+    def test_merge_excluded_under_and(self, destination):
+        not_france = SelectorClause(destination, ["01"], include=False)
+        not_germany = SelectorClause(destination, ["02"], include=False)
+        result = (not_france & not_germany)._canonicalize()
+        assert isinstance(result, SelectorClause)
+        assert result.values == ["01", "02"]
+        assert result.include is False
+
+    def test_no_merge_included_under_and(self, destination):
+        france = SelectorClause(destination, ["01"])
+        germany = SelectorClause(destination, ["02"])
+        clause = france & germany
+        assert clause._canonicalize() is clause
+
+    def test_no_merge_labelled(self, destination):
+        france = SelectorClause(destination, ["01"], label="France")
+        germany = SelectorClause(destination, ["02"])
+        clause = france | germany
+        assert clause._canonicalize() is clause
+
+    def test_remove_duplicates(self, destination, cost):
+        france = SelectorClause(destination, ["01"])
+        cheap_1 = NumericClause(cost, ["<100"])
+        cheap_2 = NumericClause(cost, ["<100"])
+        result = self.boolean("AND", france, cheap_1, cheap_2)._canonicalize()
+        assert result.operands == [france, cheap_1]
+        assert (cheap_1 & cheap_2)._canonicalize() is cheap_1
+
+    def test_labelled_boolean_kept(self, destination, cost):
+        france = SelectorClause(destination, ["01"])
+        cheap = NumericClause(cost, ["<100"])
+        inner = self.boolean("AND", france, cheap, label="Cheap France")
+        clause = self.boolean("AND", inner, cheap)
+        result = clause._canonicalize()
+        assert result is clause
+        single = self.boolean("AND", france, france, label="Just France")
+        assert single._canonicalize() is single
+
+    def test_double_negation(self, destination):
+        france = SelectorClause(destination, ["01"])
+        assert (~~france)._canonicalize() is france
+        labelled = BooleanClause(france.table, "NOT", [~france], label="Not not")
+        assert labelled._canonicalize() is labelled
+
+    def test_table_change_chain(
+        self, destination, fake_bookings_table, fake_people_table
+    ):
+        france = SelectorClause(destination, ["01"])
+        people = TableClause(fake_people_table, "ANY", france)
+        bookings = TableClause(fake_bookings_table, "THE", people)
+        people_again = TableClause(fake_people_table, "ANY", bookings)
+        assert people_again._canonicalize() is people
+        bookings_again = TableClause(fake_bookings_table, "THE", people_again)
+        result = bookings_again._canonicalize()
+        assert result.operation == "THE"
+        assert result.table is fake_bookings_table
+        assert result.operand is people
+        assert bookings._canonicalize() is bookings
+
+    def test_table_change_chain_labelled(
+        self, destination, fake_bookings_table, fake_people_table
+    ):
+        france = SelectorClause(destination, ["01"])
+        people = TableClause(fake_people_table, "ANY", france)
+        bookings = TableClause(fake_bookings_table, "THE", people, label="Bookings")
+        people_again = TableClause(fake_people_table, "ANY", bookings)
+        assert people_again._canonicalize() is people_again
+
+    def test_to_model_selection_canonicalized(self, destination):
+        france = SelectorClause(destination, ["01"])
+        germany = SelectorClause(destination, ["02"])
+        selection = (france | germany)._to_model_selection()
+        expected = SelectorClause(destination, ["01", "02"])._to_model_clause()
+        assert selection.rule.clause == expected
+
+
+class TestClauseMemoization:
+    @pytest.fixture()
+    def france(self, fake_bookings_table):
+        destination = Mock(table=fake_bookings_table)
+        destination.configure_mock(name="boDest")
+        return SelectorClause(destination, ["01"], session="my_session")
+
+    def test_immutable(self, france):
+        with pytest.raises(AttributeError) as exc_info:
+            france.values = ["02"]
+        assert exc_info.value.args[0] == (
+            "Cannot change 'values': clauses are immutable once created."
+        )
+        with pytest.raises(AttributeError) as exc_info:
+            del france.label
+        assert exc_info.value.args[0] == (
+            "Cannot delete 'label': clauses are immutable once created."
+        )
+        assert france.values == ["01"]
+
+    def test_models_memoized(self, france):
+        selection = france._to_model_selection()
+        assert france._to_model_selection() is selection
+        assert france._to_model_query().selection is selection
+        assert selection.rule.clause is france._to_model_clause()
+
+    def test_models_reused_by_other_clauses(self, france, fake_bookings_table):
+        cost = Mock(table=fake_bookings_table)
+        cost.configure_mock(name="boCost")
+        cheap = NumericClause(cost, ["<100"])
+        both = BooleanClause(fake_bookings_table, "AND", [france, cheap])
+        operand_models = both._to_model_selection().rule.clause.logic.operands
+        assert operand_models[0] is france._to_model_clause()
+        sample = france.sample(10)
+        assert sample._to_model_selection().rule.clause is france._to_model_clause()
+
+    def test_count_reuses_query(self, mocker, france):
+        patch_selection = mocker.patch("apteco.query.Selection")
+        france.count()
+        france.count()
+        first_query = patch_selection.call_args_list[0].args[0]
+        second_query = patch_selection.call_args_list[1].args[0]
+        assert first_query is second_query
+        assert first_query.selection is france._to_model_selection()
+
+
+class TestClauseFingerprint:
+    @pytest.fixture()
+    def destination(self, fake_bookings_table):
+        fake = Mock(table=fake_bookings_table)
+        fake.configure_mock(name="boDest")
+        return fake
+
+    def test_equal_structure(self, destination):
+        clause_1 = SelectorClause(destination, ["01", "02"], session="session 1")
+        clause_2 = SelectorClause(destination, ["01", "02"], session="session 2")
+        assert clause_1 is not clause_2
+        assert clause_1 == clause_2
+        assert hash(clause_1) == hash(clause_2)
+        assert len({clause_1, clause_2}) == 1
+        assert clause_1._fingerprint() == clause_2._fingerprint()
+        assert len(clause_1._fingerprint()) == 64
+
+    @pytest.mark.parametrize(
+        "values, kwargs",
+        [
+            (["02", "01"], {}),
+            (["01", "02"], {"include": False}),
+            (["01", "02"], {"label": "France or Germany"}),
+        ],
+    )
+    def test_different_structure(self, destination, values, kwargs):
+        clause = SelectorClause(destination, ["01", "02"])
+        other = SelectorClause(destination, values, **kwargs)
+        assert clause != other
+        assert clause._fingerprint() != other._fingerprint()
+
+    def test_different_type(self, destination):
+        selector = SelectorClause(destination, ["01"])
+        assert selector != NumericClause(destination, ["01"])
+        assert selector != "01"
+
+    def test_nested_clauses(self, destination, fake_bookings_table):
+        def build():
+            france = SelectorClause(destination, ["01"])
+            germany = SelectorClause(destination, ["02"])
+            return france, BooleanClause(fake_bookings_table, "OR", [france, ~germany])
+
+        france_1, clause_1 = build()
+        france_2, clause_2 = build()
+        assert clause_1 == clause_2
+        assert "_memo_fingerprint" in vars(france_1)  # child fingerprint reused
+        assert clause_1 != BooleanClause(
+            fake_bookings_table, "AND", list(clause_1.operands)
+        )
+
+    def test_limit_clauses(self, destination):
+        france = SelectorClause(destination, ["01"])
+        assert france.sample(10) == SelectorClause(destination, ["01"]).sample(10)
+        assert france.sample(10) != france.sample(20)
+        assert france.sample(frac=Fraction(1, 3)) == france.sample(frac=Fraction(2, 6))
+
+
 class TestSubSelectionClause:
     def test_sub_selection_clause_init(self):
         fake_selection = Mock()
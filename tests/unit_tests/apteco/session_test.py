@@ -1,6 +1,7 @@
 import getpass
 import json
 import logging
+from datetime import datetime
 from json import JSONDecodeError
 import unittest.mock
 from unittest.mock import call
@@ -9,6 +10,8 @@ import apteco_api as aa
 import pytest
 
 import apteco.session
+from apteco.cache import CachedMetadata, CountCache, MetadataCache, VarCodeCache
+from apteco.connection import ConnectionOptions
 from apteco.exceptions import (
     ApiResultsError,
     DeserializeError,
@@ -17,6 +20,11 @@ from apteco.exceptions import (
 )
 from apteco.session import (
     NOT_ASSIGNED,
+    NOT_LOADED,
+    SNAPSHOT_VERSION,
+    CountResult,
+    Credentials,
+    FastStatsSystem,
     InitializeTablesAlgorithm,
     InitializeVariablesAlgorithm,
     Session,
@@ -239,9 +247,9 @@ def test_create_session_with_credentials(
     assert session_example.tables is fake_tables_with_master_table
     assert session_example.master_table == "fake master table"
     patch_fetch_system_info.assert_called_once_with()
-    patch_initialize_tables_algo.assert_called_once_with(session_example)
+    patch_initialize_tables_algo.assert_called_once_with(session_example, None)
     patch_initialize_variables_algo.assert_called_once_with(
-        session_example, "fake tables no vars"
+        session_example, "fake tables no vars", None
     )
     patch_tables_accessor.assert_called_once_with("fake tables")
     patch_variables_accessor.assert_called_once_with("fake variables")
@@ -274,15 +282,311 @@ class TestSession:
         patch_create_client.assert_called_once_with()
         assert session_example.system == "solar system"
         patch_fetch_system_info.assert_called_once_with()
-        patch_initialize_tables_algo.assert_called_once_with(session_example)
+        patch_initialize_tables_algo.assert_called_once_with(session_example, None)
         patch_initialize_variables_algo.assert_called_once_with(
-            session_example, "fake tables no vars"
+            session_example, "fake tables no vars", None
         )
         patch_tables_accessor.assert_called_once_with("fake tables")
         patch_variables_accessor.assert_called_once_with("fake variables")
         assert session_example.tables is fake_tables_with_master_table
         assert session_example.variables == "fake variables accessor"
         assert session_example.master_table == "fake master table"
+        assert session_example.metadata_cache is None
+
+    def test_session_init_with_metadata_cache_hit(
+        self,
+        mocker,
+        fake_credentials_with_attrs,
+        patch_unpack_credentials,
+        patch_create_client,
+        patch_fetch_system_info,
+        patch_initialize_tables_algo,
+        patch_initialize_variables_algo,
+        patch_tables_accessor,
+        patch_variables_accessor,
+    ):
+        fake_cache = mocker.Mock(spec=MetadataCache)
+        fake_cache.load.return_value = CachedMetadata(
+            "tables from the cache", "variables from the cache"
+        )
+        session_example = Session(
+            fake_credentials_with_attrs, "solar system", metadata_cache=fake_cache
+        )
+        assert session_example.metadata_cache is fake_cache
+        fake_cache.load.assert_called_once_with(session_example)
+        patch_initialize_tables_algo.assert_called_once_with(
+            session_example, "tables from the cache"
+        )
+        patch_initialize_variables_algo.assert_called_once_with(
+            session_example, "fake tables no vars", "variables from the cache"
+        )
+        fake_cache.save.assert_not_called()
+
+    def test_session_init_with_metadata_cache_miss(
+        self,
+        mocker,
+        fake_credentials_with_attrs,
+        patch_unpack_credentials,
+        patch_create_client,
+        patch_fetch_system_info,
+        patch_initialize_tables_algo,
+        patch_initialize_variables_algo,
+        patch_tables_accessor,
+        patch_variables_accessor,
+    ):
+        fake_cache = mocker.Mock(spec=MetadataCache)
+        fake_cache.load.return_value = None
+        patch_initialize_tables_algo.return_value.raw_tables = "fetched tables"
+        patch_initialize_variables_algo.return_value.raw_variables = "fetched vars"
+        session_example = Session(
+            fake_credentials_with_attrs, "solar system", metadata_cache=fake_cache
+        )
+        patch_initialize_tables_algo.assert_called_once_with(session_example, None)
+        patch_initialize_variables_algo.assert_called_once_with(
+            session_example, "fake tables no vars", None
+        )
+        fake_cache.save.assert_called_once_with(
+            session_example, "fetched tables", "fetched vars"
+        )
+
+    def test_set_fetch_options(self, mocker):
+        session_example = mocker.Mock()
+        Session._set_fetch_options(session_example, 500, 8)
+        assert session_example.variables_per_page == 500
+        assert session_example.max_workers == 8
+
+    @pytest.mark.parametrize(
+        "variables_per_page, max_workers, bad_option",
+        [
+            (0, 4, "variables_per_page"),
+            (12.5, 4, "variables_per_page"),
+            (1000, -1, "max_workers"),
+            (1000, True, "max_workers"),
+        ],
+    )
+    def test_set_fetch_options_bad_values(
+        self, mocker, variables_per_page, max_workers, bad_option
+    ):
+        with pytest.raises(ValueError) as exc_info:
+            Session._set_fetch_options(mocker.Mock(), variables_per_page, max_workers)
+        assert (
+            exc_info.value.args[0] == f"{bad_option} must be an integer greater than 0"
+        )
+
+    def test_set_metadata_cache_from_path(self, mocker, tmp_path):
+        session_example = mocker.Mock()
+        Session._set_metadata_cache(session_example, tmp_path)
+        assert isinstance(session_example.metadata_cache, MetadataCache)
+        assert session_example.metadata_cache.directory == tmp_path
+
+    @pytest.mark.parametrize("count_cache", [None, False])
+    def test_set_count_cache_none(self, mocker, count_cache):
+        session_example = mocker.Mock()
+        Session._set_count_cache(session_example, count_cache)
+        assert session_example.count_cache is None
+
+    def test_set_count_cache_true(self, mocker):
+        session_example = mocker.Mock()
+        Session._set_count_cache(session_example, True)
+        assert isinstance(session_example.count_cache, CountCache)
+        assert session_example.count_cache.maxsize == 1024
+
+    def test_set_count_cache_instance(self, mocker):
+        session_example = mocker.Mock()
+        count_cache = CountCache(maxsize=10)
+        Session._set_count_cache(session_example, count_cache)
+        assert session_example.count_cache is count_cache
+
+    def test_set_count_cache_bad_value(self, mocker):
+        session_example = mocker.Mock()
+        with pytest.raises(ValueError) as exc_info:
+            Session._set_count_cache(session_example, 100)
+        assert exc_info.value.args[0] == (
+            "count_cache must be a CountCache, True, False or None"
+        )
+
+    @pytest.mark.parametrize("var_code_cache", [None, False])
+    def test_set_var_code_cache_none(self, mocker, var_code_cache):
+        session_example = mocker.Mock()
+        Session._set_var_code_cache(session_example, var_code_cache)
+        assert session_example.var_code_cache is None
+
+    def test_set_var_code_cache_true(self, mocker):
+        session_example = mocker.Mock()
+        Session._set_var_code_cache(session_example, True)
+        assert isinstance(session_example.var_code_cache, VarCodeCache)
+        assert session_example.var_code_cache.max_codes == 1_000_000
+
+    def test_set_var_code_cache_instance(self, mocker):
+        session_example = mocker.Mock()
+        var_code_cache = VarCodeCache(max_codes=10)
+        Session._set_var_code_cache(session_example, var_code_cache)
+        assert session_example.var_code_cache is var_code_cache
+
+    def test_set_var_code_cache_bad_value(self, mocker):
+        session_example = mocker.Mock()
+        with pytest.raises(ValueError) as exc_info:
+            Session._set_var_code_cache(session_example, "yes")
+        assert exc_info.value.args[0] == (
+            "var_code_cache must be a VarCodeCache, True, False or None"
+        )
+
+    def test_session_init_lazy_variables(
+        self,
+        mocker,
+        fake_credentials_with_attrs,
+        patch_unpack_credentials,
+        patch_create_client,
+        patch_fetch_system_info,
+        patch_initialize_tables_algo,
+        patch_initialize_variables_algo,
+        patch_tables_accessor,
+        patch_variables_accessor,
+    ):
+        patch_defer_variables = mocker.patch.object(
+            Session, "_defer_variables", return_value="fake tables not loaded"
+        )
+        patch_load_all_variables = mocker.patch.object(Session, "_load_all_variables")
+        session_example = Session(
+            fake_credentials_with_attrs, "solar system", lazy_variables=True
+        )
+        assert session_example.lazy_variables is True
+        patch_defer_variables.assert_called_once_with("fake tables no vars", None)
+        patch_initialize_variables_algo.assert_not_called()
+        patch_tables_accessor.assert_called_once_with("fake tables not loaded")
+        assert session_example._variables is NOT_LOADED
+        patch_load_all_variables.assert_not_called()
+        session_example.variables
+        patch_load_all_variables.assert_called_once_with()
+
+    def test_session_init_lazy_variables_with_metadata_cache(
+        self,
+        mocker,
+        fake_credentials_with_attrs,
+        patch_unpack_credentials,
+        patch_create_client,
+        patch_fetch_system_info,
+        patch_initialize_tables_algo,
+        patch_tables_accessor,
+    ):
+        mocker.patch.object(Session, "_load_cached_metadata", return_value=(None, None))
+        mocker.patch.object(
+            Session, "_defer_variables", return_value="fake tables not loaded"
+        )
+        session_example = Session(
+            fake_credentials_with_attrs,
+            "solar system",
+            metadata_cache=MetadataCache("cache dir"),
+            lazy_variables=True,
+        )
+        raw_tables = patch_initialize_tables_algo.return_value.raw_tables
+        assert session_example._unsaved_metadata == (raw_tables, {})
+
+    def test_defer_variables(self, mocker):
+        session_example = mocker.Mock()
+        fake_customers = mocker.Mock()
+        fake_purchases = mocker.Mock()
+        fake_raw_variables = [
+            mocker.Mock(table_name="Customers"),
+            mocker.Mock(table_name="Purchases"),
+            mocker.Mock(table_name="Customers"),
+        ]
+        tables = Session._defer_variables(
+            session_example,
+            {"Customers": fake_customers, "Purchases": fake_purchases},
+            fake_raw_variables,
+        )
+        assert tables == [fake_customers, fake_purchases]
+        assert fake_customers.variables is NOT_LOADED
+        assert fake_purchases.variables is NOT_LOADED
+        assert session_example._raw_variables_lookup == {
+            "Customers": [fake_raw_variables[0], fake_raw_variables[2]],
+            "Purchases": [fake_raw_variables[1]],
+        }
+
+    def test_defer_variables_nothing_cached(self, mocker):
+        session_example = mocker.Mock()
+        fake_customers = mocker.Mock()
+        Session._defer_variables(session_example, {"Customers": fake_customers}, None)
+        assert session_example._raw_variables_lookup is None
+        assert session_example._unsaved_metadata is None
+        assert fake_customers.variables is NOT_LOADED
+
+    def test_load_table_variables_from_api(
+        self, mocker, patch_initialize_variables_algo
+    ):
+        session_example = mocker.MagicMock(_raw_variables_lookup=None)
+        fake_table = mocker.Mock(_variables=NOT_LOADED)
+        fake_table.name = "Purchases"
+        Session._load_table_variables(session_example, fake_table)
+        patch_initialize_variables_algo.assert_called_once_with(
+            session_example, {"Purchases": fake_table}, table_name="Purchases"
+        )
+        patch_initialize_variables_algo.return_value.run.assert_called_once_with()
+        session_example._add_unsaved_variables.assert_called_once_with(
+            "Purchases", patch_initialize_variables_algo.return_value.raw_variables
+        )
+
+    def test_load_table_variables_from_cached(
+        self, mocker, patch_initialize_variables_algo
+    ):
+        session_example = mocker.MagicMock(
+            _raw_variables_lookup={"Purchases": ["purchases var 1", "purchases var 2"]}
+        )
+        fake_table = mocker.Mock(_variables=NOT_LOADED)
+        fake_table.name = "Purchases"
+        Session._load_table_variables(session_example, fake_table)
+        patch_initialize_variables_algo.assert_called_once_with(
+            session_example,
+            {"Purchases": fake_table},
+            ["purchases var 1", "purchases var 2"],
+        )
+        session_example._add_unsaved_variables.assert_not_called()
+
+    def test_load_table_variables_already_loaded(
+        self, mocker, patch_initialize_variables_algo
+    ):
+        session_example = mocker.MagicMock(_raw_variables_lookup=None)
+        fake_table = mocker.Mock(_variables="already got them")
+        Session._load_table_variables(session_example, fake_table)
+        patch_initialize_variables_algo.assert_not_called()
+
+    def test_add_unsaved_variables(self, mocker):
+        fake_customers = mocker.Mock()
+        fake_customers.name = "Customers"
+        fake_purchases = mocker.Mock()
+        fake_purchases.name = "Purchases"
+        session_example = mocker.Mock(
+            _unsaved_metadata=([fake_customers, fake_purchases], {})
+        )
+        Session._add_unsaved_variables(session_example, "Purchases", ["purch var"])
+        session_example._save_cached_metadata.assert_not_called()
+        Session._add_unsaved_variables(
+            session_example, "Customers", ["cust var 1", "cust var 2"]
+        )
+        session_example._save_cached_metadata.assert_called_once_with(
+            [fake_customers, fake_purchases],
+            ["cust var 1", "cust var 2", "purch var"],
+        )
+        assert session_example._unsaved_metadata is None
+
+    def test_add_unsaved_variables_no_metadata_cache(self, mocker):
+        session_example = mocker.Mock(_unsaved_metadata=None)
+        Session._add_unsaved_variables(session_example, "Purchases", ["purch var"])
+        session_example._save_cached_metadata.assert_not_called()
+
+    def test_load_all_variables(self, mocker, patch_variables_accessor):
+        session_example = mocker.MagicMock(
+            _variables=NOT_LOADED,
+            tables=[
+                mocker.Mock(variables=["cust var 1", "cust var 2"]),
+                mocker.Mock(variables=["purch var"]),
+            ],
+        )
+        Session._load_all_variables(session_example)
+        (variables_arg,), _ = patch_variables_accessor.call_args
+        assert list(variables_arg) == ["cust var 1", "cust var 2", "purch var"]
+        assert session_example._variables == "fake variables accessor"
 
     def test_unpack_credentials(self, mocker, fake_credentials_with_attrs):
         session_example = mocker.Mock()
@@ -296,8 +600,13 @@ class TestSession:
     def test_create_client(
         self, mocker, fake_config, patch_config, fake_client, patch_client
     ):
+        patch_configure_api_client = mocker.patch(
+            "apteco.connection.configure_api_client"
+        )
         session_example = mocker.Mock(
-            base_url="back to base", access_token="token gesture"
+            base_url="back to base",
+            access_token="token gesture",
+            connection_options="connection options",
         )
         Session._create_client(session_example)
         patch_config.assert_called_once_with()
@@ -307,6 +616,170 @@ class TestSession:
         assert session_example._config == fake_config
         patch_client.assert_called_once_with(configuration=fake_config)
         assert session_example.api_client == fake_client
+        patch_configure_api_client.assert_called_once_with(
+            fake_client, "connection options"
+        )
+
+    def test_set_connection_options(self, mocker):
+        session_example = mocker.Mock()
+        Session._set_connection_options(session_example, 20, False, (3.5, 60))
+        assert session_example.connection_options == ConnectionOptions(
+            pool_maxsize=20, keep_alive=False, timeout=(3.5, 60)
+        )
+
+    def test_set_connection_options_bad_value(self, mocker):
+        session_example = mocker.Mock()
+        with pytest.raises(ValueError) as exc_info:
+            Session._set_connection_options(session_example, 0)
+        assert exc_info.value.args[0] == (
+            "pool_maxsize must be an integer greater than 0"
+        )
+
+    @pytest.fixture()
+    def fake_count_clauses(self, mocker):
+        def make_clause(table_name):
+            clause = mocker.Mock()
+            clause._to_model_query.return_value = aa.Query(
+                selection=aa.Selection(table_name=table_name, ancestor_counts=True)
+            )
+            return clause
+
+        return [make_clause(t) for t in ["Products", "Clients", "Products"]]
+
+    @pytest.fixture()
+    def patch_selection(self, mocker):
+        def fake_selection(query, session):
+            table_name = query.selection.table_name
+            if table_name == "Broken":
+                raise ApiResultsError("the API is having a bad day")
+            counts = [mocker.Mock(table_name=table_name, count=30)]
+            if table_name == "Products":
+                counts.append(mocker.Mock(table_name="Clients", count=10))
+            return mocker.Mock(count=30, counts=counts)
+
+        return mocker.patch("apteco.session.Selection", side_effect=fake_selection)
+
+    def test_count_many(self, mocker, fake_count_clauses, patch_selection):
+        session_example = mocker.Mock(api_client=aa.ApiClient(), max_workers=4)
+        results = Session.count_many(session_example, fake_count_clauses)
+        assert [r.clause for r in results] == fake_count_clauses
+        assert results[0] == CountResult(
+            fake_count_clauses[0], 30, {"Products": 30, "Clients": 10}, None
+        )
+        assert results[1] == CountResult(
+            fake_count_clauses[1], 30, {"Clients": 30}, None
+        )
+        assert results[2].counts == {"Products": 30, "Clients": 10}
+        assert patch_selection.call_count == 2  # duplicate only counted once
+        for call_args in patch_selection.call_args_list:
+            assert call_args.args[1] is session_example
+
+    def test_count_many_with_failures(
+        self, mocker, fake_count_clauses, patch_selection
+    ):
+        broken_clause = mocker.Mock()
+        broken_clause._to_model_query.return_value = aa.Query(
+            selection=aa.Selection(table_name="Broken")
+        )
+        invalid_clause = mocker.Mock()
+        invalid_clause._to_model_query.side_effect = ValueError("bad clause")
+        clauses = [broken_clause, fake_count_clauses[0], invalid_clause]
+        session_example = mocker.Mock(api_client=aa.ApiClient(), max_workers=4)
+        results = Session.count_many(session_example, clauses, max_workers=1)
+        assert [r.clause for r in results] == clauses
+        assert results[0].count is None
+        assert results[0].counts is None
+        assert isinstance(results[0].error, ApiResultsError)
+        assert results[1].count == 30
+        assert results[1].error is None
+        assert isinstance(results[2].error, ValueError)
+        assert patch_selection.call_count == 2
+
+    def test_count_many_empty(self, mocker, patch_selection):
+        session_example = mocker.Mock(api_client=aa.ApiClient(), max_workers=4)
+        assert Session.count_many(session_example, []) == []
+        patch_selection.assert_not_called()
+
+    @pytest.mark.parametrize("max_workers", [0, 2.5, True])
+    def test_count_many_bad_max_workers(self, mocker, max_workers):
+        session_example = mocker.Mock()
+        with pytest.raises(ValueError) as exc_info:
+            Session.count_many(session_example, [], max_workers=max_workers)
+        assert exc_info.value.args[0] == "max_workers must be an integer greater than 0"
+
+    @pytest.fixture()
+    def fake_lazy_objects(self, mocker):
+        def make_object(table_name, pending=True):
+            request = None
+            if table_name is not None:
+                request = aa.Query(selection=aa.Selection(table_name=table_name))
+            fetch = mocker.Mock(return_value=("data for " + str(table_name),))
+            return mocker.Mock(pending=pending, _request=request, _fetch=fetch)
+
+        return [
+            make_object("Products"),
+            make_object("Clients"),
+            make_object("Products"),
+            make_object(None),
+            make_object("Clients", pending=False),
+        ]
+
+    def test_execute(self, mocker, fake_lazy_objects):
+        session_example = mocker.Mock(api_client=aa.ApiClient(), max_workers=4)
+        results = Session.execute(session_example, iter(fake_lazy_objects))
+        assert results == fake_lazy_objects
+        products_1, clients, products_2, unbuilt, fetched = fake_lazy_objects
+        assert products_1._fetch.call_count + products_2._fetch.call_count == 1
+        clients._fetch.assert_called_once_with()
+        unbuilt._fetch.assert_called_once_with()
+        fetched._fetch.assert_not_called()
+        for obj in (products_1, products_2):
+            obj._set_result.assert_called_once_with(("data for Products",))
+        clients._set_result.assert_called_once_with(("data for Clients",))
+        unbuilt._set_result.assert_called_once_with(("data for None",))
+        fetched._set_result.assert_not_called()
+
+    def test_execute_with_failure(self, mocker, fake_lazy_objects):
+        broken = mocker.Mock(
+            pending=True,
+            _request=aa.Query(selection=aa.Selection(table_name="Broken")),
+            _fetch=mocker.Mock(side_effect=ApiResultsError("bad request")),
+        )
+        session_example = mocker.Mock(api_client=aa.ApiClient(), max_workers=4)
+        with pytest.raises(ApiResultsError) as exc_info:
+            Session.execute(session_example, [broken] + fake_lazy_objects, 1)
+        assert exc_info.value.args[0] == "bad request"
+        broken._set_result.assert_not_called()
+        for obj in fake_lazy_objects[:4]:
+            obj._set_result.assert_called_once()
+
+    def test_execute_nothing_pending(self, mocker, fake_lazy_objects):
+        session_example = mocker.Mock(api_client=aa.ApiClient(), max_workers=4)
+        assert Session.execute(session_example, []) == []
+        fetched = fake_lazy_objects[-1]
+        assert Session.execute(session_example, [fetched]) == [fetched]
+        fetched._fetch.assert_not_called()
+
+    @pytest.mark.parametrize("max_workers", [0, 2.5, True])
+    def test_execute_bad_max_workers(self, mocker, max_workers):
+        session_example = mocker.Mock()
+        with pytest.raises(ValueError) as exc_info:
+            Session.execute(session_example, [], max_workers=max_workers)
+        assert exc_info.value.args[0] == "max_workers must be an integer greater than 0"
+
+    def test_close(self, mocker):
+        patch_close_api_client = mocker.patch("apteco.connection.close_api_client")
+        session_example = mocker.Mock(api_client="client with open connections")
+        Session.close(session_example)
+        patch_close_api_client.assert_called_once_with("client with open connections")
+
+    def test_context_manager(self, mocker):
+        patch_close = mocker.patch.object(Session, "close")
+        session_example = Session.__new__(Session)
+        with session_example as s:
+            assert s is session_example
+            patch_close.assert_not_called()
+        patch_close.assert_called_once_with()
 
     def test_fetch_system_info(self, mocker, fake_session_with_client):
         fake_faststats_system_response = mocker.Mock(
@@ -391,6 +864,158 @@ class TestSession:
             "The following parameter(s) were missing from 'User' object: 'surname'"
         )
 
+    def test_to_dict_full(
+        self, fake_session_with_attrs, serialized_session, fake_user_with_asdict
+    ):
+        fake_session_with_attrs._to_snapshot.return_value = "snap, crackle & pop"
+        dict_example = Session._to_dict(fake_session_with_attrs, full=True)
+        assert dict_example == {**serialized_session, "snapshot": "snap, crackle & pop"}
+
+    def test_from_dict_with_snapshot(self, mocker, serialized_session):
+        patch_restore_snapshot = mocker.patch.object(Session, "_restore_snapshot")
+        serialized_session["user"] = {
+            "username": "user-per to the throne",
+            "first_name": "Hugh",
+            "surname": "Zur",
+            "email_address": "hugh.zur@example.com",
+        }
+        serialized_session["snapshot"] = "snap, crackle & pop"
+        result = Session._from_dict(serialized_session, True)
+        assert isinstance(result, Session)
+        assert result.session_id == "0246813579"
+        assert result.system == "solar system"
+        assert result.api_client.configuration is result._config
+        patch_restore_snapshot.assert_called_once_with("snap, crackle & pop", True)
+
+    def test_serialize_deserialize_full(
+        self, mocker, ins_aa_sel_var_gender, ins_aa_num_var_prem, ins_aa_dat_var_payrcvd
+    ):
+        patch_systems_api = mocker.patch("apteco.session.aa.FastStatsSystemsApi")
+        raw_tables = [
+            aa.Table(
+                name=name,
+                singular_display_name=name.lower()[:-1],
+                plural_display_name=name.lower(),
+                is_default_table=parent == "",
+                is_people_table=parent == "",
+                total_records=total,
+                child_relationship_name="has" if parent else "",
+                parent_relationship_name="belongs to" if parent else "",
+                has_child_tables=has_children,
+                parent_table=parent,
+            )
+            for name, total, has_children, parent in [
+                ("Clients", 1000, True, ""),
+                ("Products", 3000, True, "Clients"),
+                ("Payments", 9000, False, "Products"),
+            ]
+        ]
+        original = Session.__new__(Session)
+        original._unpack_credentials(
+            Credentials(
+                "baseless assumptions",
+                "a room with a view",
+                "0246813579",
+                "token of my gratitude",
+                User("ewes urn aim", "Hugh", "Zur", "hugh.zur@example.com"),
+            )
+        )
+        original._set_fetch_options(1000, 4)
+        original._set_connection_options()
+        original._create_client()
+        original.system = "solar system"
+        original.system_info = FastStatsSystem(
+            "solar system", "our system", datetime(2020, 2, 20, 20, 20, 20), "view"
+        )
+        original._set_metadata_cache(None)
+        original.lazy_variables = False
+        original._initialize_metadata(
+            raw_tables,
+            [ins_aa_sel_var_gender, ins_aa_num_var_prem, ins_aa_dat_var_payrcvd],
+        )
+        restored = Session.deserialize(original.serialize(full=True))
+        patch_systems_api.assert_not_called()
+        assert restored.access_token == "token of my gratitude"
+        assert restored.user == original.user
+        assert restored.system_info == original.system_info
+        assert restored.master_table.name == "Clients"
+        assert restored.tables["Payments"].parent is restored.tables["Products"]
+        assert restored.variables["pmDate"].table is restored.tables["Payments"]
+        assert restored.variables["prPrem"].currency_symbol == "£"
+        assert restored._to_snapshot() == original._to_snapshot()
+        assert restored.count_cache is None
+        assert isinstance(restored.var_code_cache, VarCodeCache)
+        assert restored.lazy_variables is False
+
+        count_cache = CountCache()
+        restored_with_settings = Session.deserialize(
+            original.serialize(full=True),
+            count_cache=count_cache,
+            var_code_cache=None,
+            max_workers=8,
+            lazy_variables=True,
+            pool_maxsize=16,
+            timeout=30,
+        )
+        assert restored_with_settings.count_cache is count_cache
+        assert restored_with_settings.var_code_cache is None
+        assert restored_with_settings.max_workers == 8
+        assert restored_with_settings.lazy_variables is True
+        assert restored_with_settings.connection_options.pool_maxsize == 16
+        assert restored_with_settings.connection_options.timeout == 30
+        payments_variables = restored_with_settings.tables["Payments"].variables
+        assert [v.name for v in payments_variables] == [
+            v.name for v in original.tables["Payments"].variables
+        ]
+
+    def test_restore_snapshot_missing_data(self, mocker):
+        session_example = mocker.Mock()
+        with pytest.raises(DeserializeError) as exc_info:
+            Session._restore_snapshot(
+                session_example,
+                {"version": SNAPSHOT_VERSION, "tables": [], "variables": []},
+            )
+        assert exc_info.value.args[0] == (
+            "Data missing from session snapshot: no 'system_info' found."
+        )
+        session_example._initialize_metadata.assert_not_called()
+
+    def test_restore_snapshot_bad_version(self, mocker):
+        session_example = mocker.Mock()
+        with pytest.raises(DeserializeError) as exc_info:
+            Session._restore_snapshot(session_example, {"version": 99})
+        assert exc_info.value.args[0] == (
+            "Session snapshot has unsupported version: 99"
+        )
+
+    def test_check_build_date(self, mocker):
+        session_example = mocker.Mock(
+            system_info=mocker.Mock(build_date=datetime(2020, 2, 20))
+        )
+
+        def fake_fetch_system_info():
+            session_example.system_info = mocker.Mock(build_date=datetime(2020, 2, 20))
+
+        session_example._fetch_system_info.side_effect = fake_fetch_system_info
+        Session._check_build_date(session_example)
+        session_example._fetch_system_info.assert_called_once_with()
+
+    def test_check_build_date_rebuilt(self, mocker):
+        session_example = mocker.Mock(
+            system_info=mocker.Mock(build_date=datetime(2020, 2, 20))
+        )
+
+        def fake_fetch_system_info():
+            session_example.system_info = mocker.Mock(build_date=datetime(2021, 1, 1))
+
+        session_example._fetch_system_info.side_effect = fake_fetch_system_info
+        with pytest.raises(DeserializeError) as exc_info:
+            Session._check_build_date(session_example)
+        assert exc_info.value.args[0] == (
+            "The FastStats system has been rebuilt since the session was serialized"
+            " (build date was 2020-02-20 00:00:00, now 2021-01-01 00:00:00)."
+        )
+
     def test_serialize(self, fake_session_with_to_dict, patch_json_dumps):
         result = Session.serialize(fake_session_with_to_dict)
         patch_json_dumps.assert_called_once_with("I'm a session dictionary")
@@ -399,7 +1024,60 @@ class TestSession:
     def test_deserialize(self, patch_json_loads, patch_session_from_dict):
         result = Session.deserialize("cereal eyes-d session")
         patch_json_loads.assert_called_once_with("cereal eyes-d session")
-        patch_session_from_dict.assert_called_once_with("Loads of Jason")
+        patch_session_from_dict.assert_called_once_with(
+            "Loads of Jason",
+            False,
+            count_cache=None,
+            var_code_cache=True,
+            variables_per_page=1000,
+            max_workers=4,
+            lazy_variables=False,
+            pool_maxsize=None,
+            keep_alive=True,
+            timeout=None,
+            reuse_tls_context=True,
+        )
+        assert result == "Court of Session"
+
+    def test_deserialize_check_build_date(
+        self, patch_json_loads, patch_session_from_dict
+    ):
+        result = Session.deserialize("cereal eyes-d session", check_build_date=True)
+        patch_session_from_dict.assert_called_once_with(
+            "Loads of Jason",
+            True,
+            count_cache=None,
+            var_code_cache=True,
+            variables_per_page=1000,
+            max_workers=4,
+            lazy_variables=False,
+            pool_maxsize=None,
+            keep_alive=True,
+            timeout=None,
+            reuse_tls_context=True,
+        )
+        assert result == "Court of Session"
+
+    def test_deserialize_with_settings(self, patch_json_loads, patch_session_from_dict):
+        result = Session.deserialize(
+            "cereal eyes-d session",
+            count_cache="count cache",
+            var_code_cache=None,
+            lazy_variables=True,
+        )
+        patch_session_from_dict.assert_called_once_with(
+            "Loads of Jason",
+            False,
+            count_cache="count cache",
+            var_code_cache=None,
+            variables_per_page=1000,
+            max_workers=4,
+            lazy_variables=True,
+            pool_maxsize=None,
+            keep_alive=True,
+            timeout=None,
+            reuse_tls_context=True,
+        )
         assert result == "Court of Session"
 
     def test_deserialize_with_bad_json(self, patch_json_loads_raise_json_decode_error):
@@ -547,11 +1225,39 @@ class TestLogin:
         )
         assert session is fake_session_empty
         patch_simple_login_algo.assert_called_once_with(
-            "https://marketing.example.com/AptecoAPI/", "a_room_with_a_view"
+            "https://marketing.example.com/AptecoAPI/",
+            "a_room_with_a_view",
+            ConnectionOptions(),
         )
         fake_simple_login_algo.run.assert_called_once_with("JDoe", "my s3cr3t pa55w0rd")
         patch_session.assert_called_once_with("fake credentials", "systemic_change")
 
+    def test_login_with_password_connection_options(
+        self,
+        patch_simple_login_algo,
+        patch_session,
+        fake_simple_login_algo,
+        fake_session_empty,
+    ):
+        session = login_with_password(
+            "https://marketing.example.com/AptecoAPI/",
+            "a_room_with_a_view",
+            "systemic_change",
+            "JDoe",
+            "my s3cr3t pa55w0rd",
+            timeout=30,
+            max_workers=8,
+        )
+        assert session is fake_session_empty
+        patch_simple_login_algo.assert_called_once_with(
+            "https://marketing.example.com/AptecoAPI/",
+            "a_room_with_a_view",
+            ConnectionOptions(timeout=30),
+        )
+        patch_session.assert_called_once_with(
+            "fake credentials", "systemic_change", timeout=30, max_workers=8
+        )
+
     def test_get_password(self, patch_getpass_getpass):
         result = _get_password("This should appear on the console")
         assert result == "password typed into console"
@@ -602,7 +1308,7 @@ def fake_simple_login_algo_with_credentials(
 
 @pytest.fixture()
 def fake_simple_login_algo_with_base_url(mocker):
-    return mocker.Mock(base_url="basic instinct")
+    return mocker.Mock(base_url="basic instinct", connection_options=None)
 
 
 @pytest.fixture()
@@ -686,6 +1392,7 @@ class TestSimpleLoginAlgorithm:
         )
         assert simple_login_algo_example.base_url == "https://api-here.example.com"
         assert simple_login_algo_example.data_view == "scenic viewpoint"
+        assert simple_login_algo_example.connection_options is None
 
     def test_run(
         self,
@@ -726,6 +1433,24 @@ class TestSimpleLoginAlgorithm:
             == "you've made the API client"
         )
 
+    def test_create_unauthorized_client_with_connection_options(
+        self,
+        mocker,
+        fake_simple_login_algo_with_base_url,
+        patch_aa_configuration,
+        patch_aa_api_client,
+    ):
+        patch_configure_api_client = mocker.patch(
+            "apteco.connection.configure_api_client"
+        )
+        fake_simple_login_algo_with_base_url.connection_options = "options"
+        SimpleLoginAlgorithm._create_unauthorized_client(
+            fake_simple_login_algo_with_base_url
+        )
+        patch_configure_api_client.assert_called_once_with(
+            "you've made the API client", "options"
+        )
+
     def test_simple_login(
         self,
         fake_simple_login_algo_with_bu_dv_ac,
@@ -770,6 +1495,8 @@ def fake_session_with_client(mocker):
         data_view="dataView for the session",
         system="system for the session",
         api_client="API client for the session",
+        variables_per_page=250,
+        max_workers=3,
     )
 
 
@@ -875,6 +1602,20 @@ class TestInitializeTablesAlgorithm:
         assert initialize_tables_algo_example.system == "system for the session"
         assert initialize_tables_algo_example.api_client == "API client for the session"
         assert initialize_tables_algo_example.session is fake_session_with_client
+        assert initialize_tables_algo_example.raw_tables is None
+
+    def test_initialize_tables_algo_init_with_raw_tables(
+        self, fake_session_with_client
+    ):
+        initialize_tables_algo_example = InitializeTablesAlgorithm(
+            fake_session_with_client, ["tables", "from", "the", "cache"]
+        )
+        assert initialize_tables_algo_example.raw_tables == [
+            "tables",
+            "from",
+            "the",
+            "cache",
+        ]
 
     def test_initialize_tables_algo_run(self, mocker):
         fake_get_raw_tables = mocker.Mock()
@@ -887,11 +1628,13 @@ class TestInitializeTablesAlgorithm:
         )
         fake_check_all_tables_in_tree = mocker.Mock()
         fake_check_all_relations_assigned = mocker.Mock()
+        fake_index_relations = mocker.Mock()
         fake_master_table = mocker.Mock()
         fake_master_table.configure_mock(name="jack of all tables master of none")
         fake_initialize_tables_algo = mocker.Mock(
             master_table=fake_master_table,
             tables_lookup="the tables have turned",
+            raw_tables=None,
             _get_raw_tables=fake_get_raw_tables,
             _identify_children=fake_identify_children,
             _create_tables=fake_create_tables,
@@ -900,6 +1643,7 @@ class TestInitializeTablesAlgorithm:
             _assign_ancestors_and_descendants=fake_assign_ancestors_and_descendants,
             _check_all_tables_in_tree=fake_check_all_tables_in_tree,
             _check_all_relations_assigned=fake_check_all_relations_assigned,
+            _index_relations=fake_index_relations,
         )
         result = InitializeTablesAlgorithm.run(fake_initialize_tables_algo)
         fake_get_raw_tables.assert_called_once_with()
@@ -912,8 +1656,24 @@ class TestInitializeTablesAlgorithm:
         )
         fake_check_all_tables_in_tree.assert_called_once_with("forest of tables")
         fake_check_all_relations_assigned.assert_called_once_with()
+        fake_index_relations.assert_called_once_with()
         assert result == ("the tables have turned", "jack of all tables master of none")
 
+    def test_initialize_tables_algo_run_with_raw_tables(self, mocker):
+        fake_get_raw_tables = mocker.Mock()
+        fake_master_table = mocker.Mock()
+        fake_master_table.configure_mock(name="master of the cache")
+        fake_initialize_tables_algo = mocker.Mock(
+            master_table=fake_master_table,
+            tables_lookup="tables from the cache",
+            raw_tables=["cached", "tables"],
+            _get_raw_tables=fake_get_raw_tables,
+        )
+        result = InitializeTablesAlgorithm.run(fake_initialize_tables_algo)
+        fake_get_raw_tables.assert_not_called()
+        fake_initialize_tables_algo._identify_children.assert_called_once_with()
+        assert result == ("tables from the cache", "master of the cache")
+
     def test_get_raw_tables(self, mocker):
         fake_initialize_tables_algo = mocker.Mock(
             api_client="a potential client",
@@ -1243,6 +2003,19 @@ class TestInitializeTablesAlgorithm:
             " and 3 table(s) did not occur at all."
         )
 
+    def test_index_relations(self, mocker):
+        patch_table_relations = mocker.patch(
+            "apteco.session.TableRelations", return_value="all related"
+        )
+        fake_tables = [mocker.Mock(), mocker.Mock(), mocker.Mock()]
+        fake_initialize_tables_algo = mocker.Mock(
+            master_table=fake_tables[0],
+            tables_lookup={f"t{i}": table for i, table in enumerate(fake_tables)},
+        )
+        InitializeTablesAlgorithm._index_relations(fake_initialize_tables_algo)
+        patch_table_relations.assert_called_once_with(fake_tables[0])
+        assert all(table._relations == "all related" for table in fake_tables)
+
     def test_check_all_relations_assigned(self, mocker):
         fake_initialize_tables_algo = mocker.Mock()
         fake_table1 = mocker.Mock()
@@ -1344,9 +2117,12 @@ class TestInitializeVariablesAlgorithm:
         assert initialize_vars_algo_example.system == "system for the session"
         assert initialize_vars_algo_example.api_client == "API client for the session"
         assert initialize_vars_algo_example.session is fake_session_with_client
+        assert initialize_vars_algo_example.variables_per_page == 250
+        assert initialize_vars_algo_example.max_workers == 3
         assert (
             initialize_vars_algo_example.tables_lookup is fake_tables_without_variables
         )
+        assert initialize_vars_algo_example.raw_variables is None
 
     def test_initialize_variables_algo_run(self, mocker):
         fake_tables_lookup = mocker.Mock()
@@ -1359,6 +2135,7 @@ class TestInitializeVariablesAlgorithm:
         fake_initialize_vars_algo = mocker.Mock(
             variables="Wind: Variable, mainly east to northeast",
             tables_lookup=fake_tables_lookup,
+            raw_variables=None,
             _get_raw_variables=fake_get_raw_variables,
             _create_variables=fake_create_variables,
             _identify_variables=fake_identify_variables,
@@ -1376,12 +2153,29 @@ class TestInitializeVariablesAlgorithm:
             ["table an amendment"],
         )
 
+    def test_initialize_variables_algo_run_with_raw_variables(self, mocker):
+        fake_tables_lookup = mocker.Mock()
+        fake_tables_lookup.values.return_value = ["table from the cache"]
+        fake_get_raw_variables = mocker.Mock()
+        fake_initialize_vars_algo = mocker.Mock(
+            variables="variables from the cache",
+            tables_lookup=fake_tables_lookup,
+            raw_variables=["cached", "variables"],
+            _get_raw_variables=fake_get_raw_variables,
+        )
+        result = InitializeVariablesAlgorithm.run(fake_initialize_vars_algo)
+        fake_get_raw_variables.assert_not_called()
+        fake_initialize_vars_algo._create_variables.assert_called_once_with()
+        assert result == ("variables from the cache", ["table from the cache"])
+
     def test_get_raw_variables(self, mocker):
-        fake_results1 = mocker.Mock(list=["var0"], offset=0, count=7, total_count=17)
-        fake_results2 = mocker.Mock(list=["var7"], offset=7, count=7, total_count=17)
-        fake_results3 = mocker.Mock(list=["var14"], offset=14, count=3, total_count=17)
+        fake_results = {
+            0: mocker.Mock(list=["var0"], offset=0, count=7, total_count=17),
+            7: mocker.Mock(list=["var7"], offset=7, count=7, total_count=17),
+            14: mocker.Mock(list=["var14"], offset=14, count=3, total_count=17),
+        }
         fake_get_variables = mocker.Mock(
-            side_effect=[fake_results1, fake_results2, fake_results3]
+            side_effect=lambda data_view, system, count, offset: fake_results[offset]
         )
         fake_systems_controller = mocker.Mock(
             fast_stats_systems_get_fast_stats_variables=fake_get_variables
@@ -1395,19 +2189,121 @@ class TestInitializeVariablesAlgorithm:
             api_client="Client Eastwood",
             data_view="Doris Day-ta",
             system="My System's Keeper",
+            variables_per_page=7,
+            max_workers=2,
+            table_name=None,
             _check_variable_results_consistency=fake_check_variable_results_consistency,
         )
-        InitializeVariablesAlgorithm._get_raw_variables(fake_initialize_vars_algo, 7)
+        InitializeVariablesAlgorithm._get_raw_variables(fake_initialize_vars_algo)
         patch_aa_faststats_systems_api.assert_called_once_with("Client Eastwood")
         get_variables_calls = [
             mocker.call("Doris Day-ta", "My System's Keeper", count=7, offset=0),
             mocker.call("Doris Day-ta", "My System's Keeper", count=7, offset=7),
             mocker.call("Doris Day-ta", "My System's Keeper", count=7, offset=14),
         ]
-        fake_get_variables.assert_has_calls(get_variables_calls)
+        fake_get_variables.assert_has_calls(get_variables_calls, any_order=True)
+        assert fake_get_variables.call_count == 3
         assert fake_initialize_vars_algo.raw_variables == ["var0", "var7", "var14"]
         fake_check_variable_results_consistency.assert_called_once_with(17)
 
+    def test_get_raw_variables_smaller_pages_than_requested(self, mocker):
+        fake_results = {
+            0: mocker.Mock(list=["var0", "var1"], offset=0, count=2, total_count=5),
+            2: mocker.Mock(list=["var2", "var3"], offset=2, count=2, total_count=5),
+            4: mocker.Mock(list=["var4"], offset=4, count=1, total_count=5),
+        }
+        fake_get_variables = mocker.Mock(
+            side_effect=lambda data_view, system, count, offset: fake_results[offset]
+        )
+        mocker.patch(
+            "apteco.session.aa.FastStatsSystemsApi",
+            return_value=mocker.Mock(
+                fast_stats_systems_get_fast_stats_variables=fake_get_variables
+            ),
+        )
+        fake_initialize_vars_algo = mocker.Mock(
+            variables_per_page=1000, max_workers=4, table_name=None
+        )
+        InitializeVariablesAlgorithm._get_raw_variables(fake_initialize_vars_algo)
+        assert fake_get_variables.call_count == 3
+        assert fake_initialize_vars_algo.raw_variables == [
+            "var0",
+            "var1",
+            "var2",
+            "var3",
+            "var4",
+        ]
+        fake_check_consistency = (
+            fake_initialize_vars_algo._check_variable_results_consistency
+        )
+        fake_check_consistency.assert_called_once_with(5)
+
+    def test_get_raw_variables_single_page(self, mocker):
+        fake_results = mocker.Mock(
+            list=["var0", "var1"], offset=0, count=2, total_count=2
+        )
+        fake_get_variables = mocker.Mock(return_value=fake_results)
+        mocker.patch(
+            "apteco.session.aa.FastStatsSystemsApi",
+            return_value=mocker.Mock(
+                fast_stats_systems_get_fast_stats_variables=fake_get_variables
+            ),
+        )
+        fake_initialize_vars_algo = mocker.Mock(
+            variables_per_page=1000, max_workers=4, table_name=None
+        )
+        InitializeVariablesAlgorithm._get_raw_variables(fake_initialize_vars_algo)
+        fake_get_variables.assert_called_once_with(
+            fake_initialize_vars_algo.data_view,
+            fake_initialize_vars_algo.system,
+            count=1000,
+            offset=0,
+        )
+        assert fake_initialize_vars_algo.raw_variables == ["var0", "var1"]
+
+    def test_get_raw_variables_for_one_table(self, mocker):
+        fake_results = mocker.Mock(list=["var0"], offset=0, count=1, total_count=1)
+        fake_get_variables = mocker.Mock(return_value=fake_results)
+        mocker.patch(
+            "apteco.session.aa.FastStatsSystemsApi",
+            return_value=mocker.Mock(
+                fast_stats_systems_get_fast_stats_variables=fake_get_variables
+            ),
+        )
+        fake_initialize_vars_algo = mocker.Mock(
+            variables_per_page=1000, max_workers=4, table_name="Purchases"
+        )
+        InitializeVariablesAlgorithm._get_raw_variables(fake_initialize_vars_algo)
+        fake_get_variables.assert_called_once_with(
+            fake_initialize_vars_algo.data_view,
+            fake_initialize_vars_algo.system,
+            count=1000,
+            offset=0,
+            filter="TableName == 'Purchases'",
+        )
+        assert fake_initialize_vars_algo.raw_variables == ["var0"]
+
+    def test_get_raw_variables_for_table_name_with_quotes(self, mocker):
+        fake_results = mocker.Mock(list=["var0"], offset=0, count=1, total_count=1)
+        fake_get_variables = mocker.Mock(return_value=fake_results)
+        mocker.patch(
+            "apteco.session.aa.FastStatsSystemsApi",
+            return_value=mocker.Mock(
+                fast_stats_systems_get_fast_stats_variables=fake_get_variables
+            ),
+        )
+        fake_initialize_vars_algo = mocker.Mock(
+            variables_per_page=1000, max_workers=4, table_name="Owner's Pets"
+        )
+        InitializeVariablesAlgorithm._get_raw_variables(fake_initialize_vars_algo)
+        fake_get_variables.assert_called_once_with(
+            fake_initialize_vars_algo.data_view,
+            fake_initialize_vars_algo.system,
+            count=1000,
+            offset=0,
+            filter="TableName == 'Owner''s Pets'",
+        )
+
     def test_check_variable_results_consistency(self, mocker):
         fake_initialize_vars_algo = mocker.MagicMock()
         fake_initialize_vars_algo.raw_variables.__len__.return_value = 12345
@@ -3,7 +3,8 @@ from unittest.mock import Mock
 import apteco_api as aa
 import pytest
 
-from apteco.tables import Table
+from apteco.session import InitializeTablesAlgorithm
+from apteco.tables import NOT_LOADED, Table, TableRelations
 
 
 @pytest.fixture()
@@ -90,6 +91,61 @@ class TestTable:
         assert table_example.descendants is fake_descendant_tables
         assert table_example.variables is fake_variables
         assert table_example.session == "court of session"
+        assert table_example.table is table_example
+        assert table_example._name == "what's in a name"
+        assert not hasattr(table_example, "__dict__")
+
+    def test_variables_not_loaded(self, fake_variables):
+        fake_session = Mock()
+        table_example = Table.__new__(Table)
+        table_example.session = fake_session
+        table_example.variables = NOT_LOADED
+
+        def fake_load_table_variables(table):
+            table.variables = fake_variables
+
+        fake_session._load_table_variables.side_effect = fake_load_table_variables
+        assert table_example.variables is fake_variables
+        assert table_example.variables is fake_variables
+        fake_session._load_table_variables.assert_called_once_with(table_example)
+
+    def test_to_model_table(self):
+        table_example = Table(
+            "Purchases",
+            "purchase",
+            "purchases",
+            False,
+            False,
+            987_654,
+            "bought",
+            "bought by",
+            False,
+            "Customers",
+            Mock(),
+            [],
+            [Mock()],
+            [],
+            NOT_LOADED,
+        )
+        assert table_example._to_model_table() == aa.Table(
+            name="Purchases",
+            singular_display_name="purchase",
+            plural_display_name="purchases",
+            is_default_table=False,
+            is_people_table=False,
+            total_records=987_654,
+            child_relationship_name="bought",
+            parent_relationship_name="bought by",
+            has_child_tables=False,
+            parent_table="Customers",
+        )
+
+    def test_to_model_selection(self):
+        table_example = Table.__new__(Table)
+        table_example.name = "Purchases"
+        assert table_example._to_model_selection() == aa.Selection(
+            table_name="Purchases", ancestor_counts=True
+        )
 
     def test_to_model_measure(self, rtl_table_purchases, rtl_table_customers):
         expected_measures_model = aa.Measure(
@@ -103,3 +159,114 @@ class TestTable:
             Table._to_model_measure(rtl_table_purchases, rtl_table_customers)
             == expected_measures_model
         )
+
+
+@pytest.fixture()
+def indexed_tables():
+    """Tables built by the session algorithm, with a relationship index.
+
+    Customers
+    ├── Households -- (no children)
+    ├── Purchases
+    │   ├── Items
+    │   │   └── Returns
+    │   └── Payments
+    └── Communications
+        └── Responses
+
+    """
+    tree = [
+        ("Customers", ""),
+        ("Households", "Customers"),
+        ("Purchases", "Customers"),
+        ("Items", "Purchases"),
+        ("Returns", "Items"),
+        ("Payments", "Purchases"),
+        ("Communications", "Customers"),
+        ("Responses", "Communications"),
+    ]
+    raw_tables = [
+        aa.Table(
+            name=name,
+            singular_display_name=name.lower(),
+            plural_display_name=name.lower(),
+            is_default_table=parent == "",
+            is_people_table=parent == "",
+            total_records=1000,
+            child_relationship_name="has",
+            parent_relationship_name="belongs to",
+            has_child_tables=any(p == name for _, p in tree),
+            parent_table=parent,
+        )
+        for name, parent in tree
+    ]
+    tables_lookup, _ = InitializeTablesAlgorithm(Mock(), raw_tables).run()
+    return tables_lookup
+
+
+class TestTableRelations:
+    def test_tables_share_index(self, indexed_tables):
+        relations = indexed_tables["Customers"]._relations
+        assert isinstance(relations, TableRelations)
+        assert all(t._relations is relations for t in indexed_tables.values())
+
+    def test_relations_match_ancestor_lists(self, indexed_tables):
+        tables = list(indexed_tables.values())
+        pairs = [(t1, t2) for t1 in tables for t2 in tables]
+        indexed_results = [
+            (
+                t1.is_ancestor(t2),
+                t1.is_descendant(t2),
+                t1.is_related(t2),
+                t1.is_ancestor(t2, allow_same=True),
+                t1.is_related(t2, allow_same=True),
+                t1.nearest_common_ancestor(t2),
+            )
+            for t1, t2 in pairs
+        ]
+        for table in indexed_tables.values():
+            del table._relations
+        list_results = [
+            (
+                t1.is_ancestor(t2),
+                t1.is_descendant(t2),
+                t1.is_related(t2),
+                t1.is_ancestor(t2, allow_same=True),
+                t1.is_related(t2, allow_same=True),
+                t1.nearest_common_ancestor(t2),
+            )
+            for t1, t2 in pairs
+        ]
+        assert indexed_results == list_results
+
+    @pytest.mark.parametrize(
+        "name1, name2, expected",
+        [
+            ("Returns", "Payments", "Purchases"),
+            ("Returns", "Responses", "Customers"),
+            ("Households", "Items", "Customers"),
+            ("Items", "Returns", "Purchases"),
+            ("Returns", "Items", "Purchases"),
+            ("Payments", "Payments", "Purchases"),
+        ],
+    )
+    def test_nearest_common_ancestor(self, indexed_tables, name1, name2, expected):
+        table1, table2 = indexed_tables[name1], indexed_tables[name2]
+        assert table1.nearest_common_ancestor(table2) is indexed_tables[expected]
+
+    def test_nearest_common_ancestor_master_table(self, indexed_tables):
+        customers = indexed_tables["Customers"]
+        assert customers.nearest_common_ancestor(indexed_tables["Items"]) is None
+        assert customers.nearest_common_ancestor(customers) is None
+
+    def test_index_lookups(self, indexed_tables):
+        relations = indexed_tables["Customers"]._relations
+        assert relations.is_ancestor("Purchases", "Returns") is True
+        assert relations.is_ancestor("Returns", "Purchases") is False
+        assert relations.is_ancestor("Items", "Payments") is False
+        assert relations.is_ancestor("Items", "Items") is False
+        assert relations.nearest_common_ancestor("Returns", "Payments").name == (
+            "Purchases"
+        )
+        assert relations.nearest_common_ancestor("Items", "Returns").name == "Items"
+        assert relations.nearest_common_ancestor("Items", "Items").name == "Items"
@@ -1,9 +1,13 @@
+from unittest.mock import Mock
+
 import pytest
 
 from apteco.common import VariableType
 from apteco.query import NumericClause, TextClause
+from apteco.tables import Table
 from apteco.variables import (
     ArrayVariable,
+    DateAccessor,
     DateTimeVariable,
     DateVariable,
     FlagArrayVariable,
@@ -38,6 +42,9 @@ def test_selector_variable_init(ins_aa_sel_var_gender, ins_table_clnts, ins_sess
     assert selector_variable.var_code_min_count == 123_456
     assert selector_variable.var_code_max_count == 234_567
     assert selector_variable.var_code_order == "Nominal"
+    assert selector_variable.selector_type == "SingleValue"
+    assert selector_variable.sub_type == "Categorical"
+    assert selector_variable.combined_from is None
     assert selector_variable.name == "clGender"
     assert selector_variable.description == "Gender"
     assert selector_variable._model_type == "Selector"
@@ -50,6 +57,16 @@ def test_selector_variable_init(ins_aa_sel_var_gender, ins_table_clnts, ins_sess
     assert selector_variable.session is ins_session
 
 
+def test_selector_variable_values(mocker):
+    patch_get_selector_values = mocker.patch(
+        "apteco.variables.get_selector_values", return_value="selector values"
+    )
+    fake_selector_variable = Mock(session="my session")
+    fake_selector_variable.configure_mock(name="clGender")
+    assert SelectorVariable.values.fget(fake_selector_variable) == "selector values"
+    patch_get_selector_values.assert_called_once_with("my session", "clGender")
+
+
 class TestNumericVariable:
     def test_numeric_variable_init(
         self, ins_aa_num_var_prem, ins_table_prods, ins_session
@@ -684,3 +701,75 @@ def test_reference_variable_init(ins_aa_ref_var_payid, ins_table_pmnts, ins_sess
     assert reference_variable.is_exportable is True
     assert reference_variable.is_virtual is False
     assert reference_variable.session is ins_session
+
+
+@pytest.mark.parametrize(
+    "raw_variable_fixture, variable_class",
+    [
+        ("ins_aa_sel_var_gender", SelectorVariable),
+        ("ins_aa_num_var_prem", NumericVariable),
+        ("ins_aa_text_var_addr", TextVariable),
+        ("ins_aa_arr_var_prexco", ArrayVariable),
+        ("ins_aa_flarr_var_tags", FlagArrayVariable),
+        ("ins_aa_dat_var_payrcvd", DateVariable),
+        ("ins_aa_dtme_var_timesnt", DateTimeVariable),
+        ("ins_aa_ref_var_payid", ReferenceVariable),
+    ],
+)
+def test_to_model_variable(request, raw_variable_fixture, variable_class, ins_session):
+    v = request.getfixturevalue(raw_variable_fixture)
+    table = Mock(spec=Table)
+    table.configure_mock(name=v.table_name)
+    variable = variable_class(
+        name=v.name,
+        description=v.description,
+        type=v.type,
+        folder_name=v.folder_name,
+        table=table,
+        is_selectable=v.is_selectable,
+        is_browsable=v.is_browsable,
+        is_exportable=v.is_exportable,
+        is_virtual=v.is_virtual,
+        selector_info=v.selector_info,
+        numeric_info=v.numeric_info,
+        text_info=v.text_info,
+        reference_info=v.reference_info,
+        session=ins_session,
+    )
+    assert variable._to_model_variable() == v
+
+
+def test_date_accessors_created_on_first_access(
+    ins_aa_dat_var_payrcvd, ins_table_pmnts, ins_session
+):
+    v = ins_aa_dat_var_payrcvd
+    date_variable = DateVariable(
+        name=v.name,
+        description=v.description,
+        type=v.type,
+        folder_name=v.folder_name,
+        table=ins_table_pmnts,
+        is_selectable=v.is_selectable,
+        is_browsable=v.is_browsable,
+        is_exportable=v.is_exportable,
+        is_virtual=v.is_virtual,
+        selector_info=v.selector_info,
+        numeric_info=v.numeric_info,
+        text_info=v.text_info,
+        reference_info=v.reference_info,
+        session=ins_session,
+    )
+    assert not hasattr(date_variable, "_month")
+    month = date_variable.month
+    assert isinstance(month, DateAccessor)
+    assert date_variable.month is month
+    assert month.banding == "Months"
+    assert month.name == "pmDate_Month"
+    assert month.description == "Payment received (Month)"
+    assert month.type == VariableType.BANDED_DATE
+    assert month.table is ins_table_pmnts
+    assert date_variable.year.banding == "Years"
+    assert date_variable.quarter.banding == "Quarters"
+    assert date_variable.day.banding == "Day"
+    assert not hasattr(date_variable, "__dict__")
+    assert not hasattr(month, "__dict__")